@@ -0,0 +1,207 @@
+import numpy as np
+import torch
+from scipy.linalg import eig
+from torch.optim import Optimizer
+
+from deepqmc.utils.torch_utils import batch_jacobian
+
+
+class LinearMethod(Optimizer):
+
+    def __init__(self, params, wf, tau=1., diag_shift=1E-3,
+                 overlap_shift=1E-8, xi=0.5, max_update=1.,
+                 chunk_size=None):
+        """Linear method optimizer (Toulouse & Umrigar, JCP 126, 084102).
+
+        Builds the hamiltonian and overlap matrices in the space spanned by
+        the current wave function and its parameter derivatives from the local
+        energies, O_k = dln|psi|/dp_k and dEl/dp_k of one sample set, and
+        solves the associated generalized eigenvalue problem.
+
+        Arguments:
+            params {iterable} -- parameters to optimize
+            wf {WaveFunction} -- wave function object
+
+        Keyword Arguments:
+            tau {float} -- scaling of the update (default: {1.})
+            diag_shift {float} -- shift added to the diagonal of H
+                                  to stabilize the update (default: {1E-3})
+            overlap_shift {float} -- shift added to the diagonal of S
+                                     to regularize the overlap (default: {1E-8})
+            xi {float} -- normalization of the derivatives used to rescale
+                          the update, 0 < xi < 1 (default: {0.5})
+            max_update {float} -- largest norm of the update for an eigenvector
+                                  to be considered (default: {1.})
+            chunk_size {int} -- number of walkers per chunk to compute the
+                                derivatives, if None all the walkers at once
+                                (default: {None})
+        """
+
+        defaults = dict(tau=tau)
+        super(LinearMethod, self).__init__(params, defaults)
+
+        self.wf = wf
+        self.diag_shift = diag_shift
+        self.overlap_shift = overlap_shift
+        self.xi = xi
+        self.max_update = max_update
+        self.chunk_size = chunk_size
+
+        # the solver must pass the positions to step()
+        self.lpos_needed = True
+
+        # eigenvalue selected at the last step
+        self.eigenvalue = None
+
+    def step(self, pos, eloc=None):
+        """Performs a single linear method step.
+
+        Arguments:
+            pos {torch.tensor} -- positions of the walkers
+
+        Keyword Arguments:
+            eloc {torch.tensor} -- local energies of the walkers (e.g. the ones
+                                   of the loss) used in the matrices, if None
+                                   the ones computed with their derivatives
+                                   (default: {None})
+        """
+
+        params, taus = [], []
+        for group in self.param_groups:
+            for p in group['params']:
+                if p.requires_grad:
+                    params.append(p)
+                    taus.append(group['tau'])
+
+        el, O, dEl = self.get_derivatives(pos, params)
+        if eloc is not None:
+            el = eloc.detach().view(-1).to(el)
+        H, S = self.get_matrices(el, O, dEl)
+        delta = self.solve(H, S)
+
+        # update the parameters
+        istart = 0
+        with torch.no_grad():
+            for p, tau in zip(params, taus):
+                n = p.numel()
+                p.add_(tau * delta[istart:istart + n].view_as(p).to(p))
+                istart += n
+
+    def get_derivatives(self, pos, params):
+        """Computes the local energies and their parameter derivatives
+        as well as the log derivatives of the wave function.
+
+        Arguments:
+            pos {torch.tensor} -- positions of the walkers
+            params {list} -- parameters
+
+        Returns:
+            tuple -- El [nwalkers], O [nwalkers, nparam], dEl [nwalkers, nparam]
+        """
+
+        nwalkers = pos.shape[0]
+        chunk_size = self.chunk_size or nwalkers
+
+        eloc, O, dEl = [], [], []
+        with torch.enable_grad():
+            for istart in range(0, nwalkers, chunk_size):
+
+                p = pos[istart:istart + chunk_size]
+
+                psi = self.wf(p).view(-1)
+                O.append(batch_jacobian(psi, params) /
+                         psi.detach().unsqueeze(1))
+
+                el = self.wf.local_energy(p).view(-1)
+                dEl.append(batch_jacobian(el, params))
+                eloc.append(el.detach())
+
+        return torch.cat(eloc), torch.cat(O), torch.cat(dEl)
+
+    def get_matrices(self, eloc, O, dEl):
+        """Assembles the hamiltonian and overlap matrices in the basis
+        (psi, dpsi/dp_1 , ..., dpsi/dp_n) with centered derivatives.
+
+        Arguments:
+            eloc {torch.tensor} -- local energies [nwalkers]
+            O {torch.tensor} -- log derivatives [nwalkers, nparam]
+            dEl {torch.tensor} -- local energy derivatives [nwalkers, nparam]
+
+        Returns:
+            tuple -- H, S [nparam+1, nparam+1]
+        """
+
+        nwalkers, nparam = O.shape
+        O = O - O.mean(0)
+        e0 = eloc.mean()
+        el = eloc.unsqueeze(1)
+
+        H = torch.zeros(nparam + 1, nparam + 1,
+                        dtype=O.dtype, device=O.device)
+        S = torch.zeros(nparam + 1, nparam + 1,
+                        dtype=O.dtype, device=O.device)
+
+        H[0, 0] = e0
+        H[1:, 0] = (O * (el - e0)).mean(0)
+        H[0, 1:] = (O * (el - e0)).mean(0) + dEl.mean(0)
+        H[1:, 1:] = (O * el).t() @ O / nwalkers + O.t() @ dEl / nwalkers
+
+        S[0, 0] = 1.
+        S[1:, 1:] = O.t() @ O / nwalkers
+
+        eye = torch.eye(nparam, dtype=O.dtype, device=O.device)
+        H[1:, 1:] += self.diag_shift * eye
+        S[1:, 1:] += self.overlap_shift * eye
+
+        return H, S
+
+    def solve(self, H, S):
+        """Solves the generalized eigenvalue problem and returns the update.
+
+        Arguments:
+            H {torch.tensor} -- hamiltonian matrix
+            S {torch.tensor} -- overlap matrix
+
+        Returns:
+            torch.tensor -- parameter update
+        """
+
+        H_ = H.detach().cpu().numpy()
+        S_ = S.detach().cpu().numpy()
+        evals, evecs = eig(H_, S_)
+
+        # discard eigenvectors orthogonal to the current wave function
+        evals = evals.real
+        c0 = evecs[0, :].real
+        valid = np.abs(c0) > 1E-12
+        updates = np.zeros_like(evecs.real)
+        updates[:, valid] = evecs[:, valid].real / c0[valid]
+        norms = np.linalg.norm(updates[1:, :], axis=0)
+
+        # lowest eigenvalue with a reasonable update
+        candidates = np.where(valid & (norms < self.max_update))[0]
+        if len(candidates) == 0:
+            candidates = [np.argmax(np.abs(c0))]
+        isel = candidates[np.argmin(evals[candidates])]
+        self.eigenvalue = evals[isel]
+
+        dp = torch.tensor(updates[1:, isel], dtype=H.dtype, device=H.device)
+        return self._normalize_update(dp, S[1:, 1:])
+
+    def _normalize_update(self, dp, S):
+        """Rescale the update following the xi normalization of the
+        centered derivatives (eq. 23 of Toulouse & Umrigar):
+        dp / (1 + (1 - xi) q / ((1 - xi) + xi D)) with q = dp S dp and
+        D = sqrt(1 + q). xi = 1 keeps the update, xi = 0 divides it by 1 + q.
+
+        Arguments:
+            dp {torch.tensor} -- raw update
+            S {torch.tensor} -- overlap of the derivatives
+
+        Returns:
+            torch.tensor -- normalized update
+        """
+        q = dp @ S @ dp
+        D = torch.sqrt(1. + q)
+        denom = 1. + (1. - self.xi) * q / (1. - self.xi + self.xi * D)
+        return dp / denom
@@ -0,0 +1,182 @@
+import torch
+from torch.optim import Optimizer
+
+from deepqmc.utils.torch_utils import batch_jacobian
+
+
+class StochasticReconfiguration(Optimizer):
+
+    def __init__(self, params, wf, tau=0.01, diag_shift=1E-3,
+                 maxiter=100, tol=1E-8, chunk_size=None,
+                 distributed=False):
+        """Stochastic reconfiguration (natural gradient) optimizer.
+
+        Solves (S + eps I) delta = -g with a conjugate gradient where the
+        overlap matrix S_kl = <O_k O_l> - <O_k><O_l>, O_k = dln|psi|/dp_k,
+        is never formed and only accessed through products with O.
+
+        Arguments:
+            params {iterable} -- parameters to optimize
+            wf {WaveFunction} -- wave function object
+
+        Keyword Arguments:
+            tau {float} -- step size of the update (default: {0.01})
+            diag_shift {float} -- shift eps of the diagonal of S (default: {1E-3})
+            maxiter {int} -- maximum number of CG iterations (default: {100})
+            tol {float} -- tolerance on the CG residual (default: {1E-8})
+            chunk_size {int} -- number of walkers per chunk to compute O
+                                if None all the walkers at once (default: {None})
+            distributed {bool} -- reduce the averages across the
+                                  horovod ranks, set by the horovod
+                                  solver (default: {False})
+        """
+
+        defaults = dict(tau=tau)
+        super(StochasticReconfiguration, self).__init__(params, defaults)
+
+        self.wf = wf
+        self.diag_shift = diag_shift
+        self.maxiter = maxiter
+        self.tol = tol
+        self.chunk_size = chunk_size
+        self.distributed = distributed
+
+        # the solver must pass the positions to step()
+        self.lpos_needed = True
+
+        # number of CG iterations of the last step
+        self.cg_niter = 0
+
+        if self.distributed:
+            import horovod.torch as hvd
+            self.hvd = hvd
+
+    def step(self, pos, eloc=None):
+        """Performs a single SR step.
+
+        Arguments:
+            pos {torch.tensor} -- positions of the walkers
+
+        Keyword Arguments:
+            eloc {torch.tensor} -- local energies of the walkers already
+                                   computed for the loss, computed if None
+                                   (default: {None})
+        """
+
+        params, taus = [], []
+        for group in self.param_groups:
+            for p in group['params']:
+                if p.requires_grad:
+                    params.append(p)
+                    taus.append(group['tau'])
+
+        # local energies and log derivatives
+        if eloc is None:
+            eloc = self.wf.local_energy(pos)
+        eloc = eloc.detach().view(-1)
+        O = self.get_log_derivatives(pos, params)
+
+        # center the data
+        O = O - self._mean(O, 'sr.omean')
+        eloc = eloc - self._mean(eloc, 'sr.emean')
+
+        # energy gradient g_k = 2 < (El - <El>) (O_k - <O_k>) >
+        grad = 2. * self._mean(O * eloc.unsqueeze(1), 'sr.grad')
+
+        # natural gradient
+        delta = self.conjugate_gradient(O, -grad)
+
+        # update the parameters
+        istart = 0
+        with torch.no_grad():
+            for p, tau in zip(params, taus):
+                n = p.numel()
+                p.add_(tau * delta[istart:istart + n].view_as(p))
+                istart += n
+
+    def get_log_derivatives(self, pos, params):
+        """Computes O_k = dln|psi|/dp_k for all the walkers.
+
+        Arguments:
+            pos {torch.tensor} -- positions of the walkers
+            params {list} -- parameters
+
+        Returns:
+            torch.tensor -- O matrix [nwalkers, nparam]
+        """
+
+        nwalkers = pos.shape[0]
+        chunk_size = self.chunk_size or nwalkers
+
+        O = []
+        with torch.enable_grad():
+            for istart in range(0, nwalkers, chunk_size):
+                psi = self.wf(pos[istart:istart + chunk_size]).view(-1)
+                jac = batch_jacobian(psi, params)
+                O.append(jac / psi.detach().unsqueeze(1))
+
+        return torch.cat(O)
+
+    def conjugate_gradient(self, O, b):
+        """Solves (S + eps I) x = b with a matrix free conjugate gradient.
+
+        Arguments:
+            O {torch.tensor} -- centered O matrix [nwalkers, nparam]
+            b {torch.tensor} -- right hand side [nparam]
+
+        Returns:
+            torch.tensor -- solution [nparam]
+        """
+
+        x = torch.zeros_like(b)
+        r = b.clone()
+        p = r.clone()
+        rs = r @ r
+
+        self.cg_niter = 0
+        for _ in range(self.maxiter):
+
+            if torch.sqrt(rs) < self.tol:
+                break
+
+            Sp = self._overlap_product(O, p)
+            alpha = rs / (p @ Sp)
+            x += alpha * p
+            r -= alpha * Sp
+
+            rs_new = r @ r
+            p = r + (rs_new / rs) * p
+            rs = rs_new
+            self.cg_niter += 1
+
+        return x
+
+    def _overlap_product(self, O, v):
+        """Computes (S + eps I) v using only products with O.
+
+        Arguments:
+            O {torch.tensor} -- centered O matrix [nwalkers, nparam]
+            v {torch.tensor} -- vector [nparam]
+
+        Returns:
+            torch.tensor -- (S + eps I) v
+        """
+        Sv = O.t() @ (O @ v) / O.shape[0]
+        if self.distributed:
+            Sv = self.hvd.allreduce(Sv, name='sr.sv')
+        return Sv + self.diag_shift * v
+
+    def _mean(self, x, name):
+        """Mean over the walkers (and the ranks if distributed).
+
+        Arguments:
+            x {torch.tensor} -- data [nwalkers, ...]
+            name {str} -- name of the reduction
+
+        Returns:
+            torch.tensor -- mean over the first axis
+        """
+        x = x.mean(0)
+        if self.distributed:
+            x = self.hvd.allreduce(x, name=name)
+        return x
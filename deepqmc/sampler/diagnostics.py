@@ -0,0 +1,76 @@
+import torch
+
+
+def mser(trace, batch=5, min_batches=5):
+    """Truncation point of the MSER-m rule. The initial transient
+    removed is the one minimizing the squared standard error of
+    the mean of the remaining batch means.
+
+    Args:
+        trace (torch.tensor): observable along the sampling [nstep]
+        batch (int, optional): size of the batches. Defaults to 5.
+        min_batches (int, optional): minimum number of batches left
+                                     after the truncation. Defaults to 5.
+
+    Returns:
+        int: number of steps to discard. The trace is considered as
+             equilibrated only if it is smaller than half of its length.
+    """
+
+    # the truncation must be able to fall in the second half
+    nbatch = trace.shape[0] // batch
+    if nbatch < 2 * min_batches:
+        return trace.shape[0]
+
+    y = trace[:nbatch * batch].double().view(nbatch, batch).mean(1)
+
+    # sums of the last k batch means for all the truncations
+    s1 = torch.flip(torch.cumsum(torch.flip(y, [0]), 0), [0])
+    s2 = torch.flip(torch.cumsum(torch.flip(y**2, [0]), 0), [0])
+    k = torch.arange(nbatch, 0, -1, dtype=y.dtype, device=y.device)
+
+    stat = (s2 - s1**2 / k) / k**2
+    return batch * torch.argmin(stat[:nbatch - min_batches + 1]).item()
+
+
+def integrated_autocorrelation_time(trace, c=5.):
+    """Integrated autocorrelation time 1 + 2 sum_t rho(t) of the
+    walkers, with the autocorrelation function averaged over the
+    walkers and the self-consistent window of Sokal.
+
+    The walkers sample the same distribution and the fluctuations are
+    taken around the mean of all of them, which avoids the underestimation
+    due to the mean of each walker on traces of a few autocorrelation
+    times.
+
+    Args:
+        trace (torch.tensor): observable along the sampling [nstep, nwalkers]
+        c (float, optional): the sum is truncated at the first lag
+                             larger than c times the estimate.
+                             Defaults to 5.
+
+    Returns:
+        float: autocorrelation time in number of steps
+    """
+
+    if trace.dim() == 1:
+        trace = trace.view(-1, 1)
+
+    nstep = trace.shape[0]
+    x = trace.double() - trace.double().mean()
+
+    # autocorrelation function through the fft
+    fx = torch.fft.rfft(x, n=2 * nstep, dim=0)
+    acf = torch.fft.irfft(fx * fx.conj(), n=2 * nstep, dim=0)[:nstep]
+    acf = acf.mean(1)
+
+    # walkers frozen during the whole trace
+    if acf[0] <= 0:
+        return float(nstep)
+
+    tau = 2. * torch.cumsum(acf / acf[0], 0) - 1.
+    window = torch.arange(nstep, dtype=tau.dtype, device=tau.device) \
+        >= c * tau
+    if window.any():
+        return tau[window.nonzero()[0, 0]].item()
+    return tau[-1].item()
@@ -1,16 +1,16 @@
 from deepqmc.sampler.sampler_base import SamplerBase
+from deepqmc.wavefunction.wf_base import WaveFunction
 from tqdm import tqdm
 import torch
 from torch.autograd import Variable, grad
-from torch.distributions import MultivariateNormal
-import numpy as np
 
 
 class GeneralizedMetropolis(SamplerBase):
 
     def __init__(self, nwalkers=100, nstep=1000, step_size=3,
                  nelec=1, ndim=1,
-                 init={'type': 'uniform', 'min': -5, 'max': 5}):
+                 init={'type': 'uniform', 'min': -5, 'max': 5},
+                 move={'type': 'one-elec', 'proba': 'normal'}):
         """Metroplis Hasting sampler
 
         Args:
@@ -20,54 +20,77 @@ class GeneralizedMetropolis(SamplerBase):
         """
 
         SamplerBase.__init__(self, nwalkers, nstep,
-                             step_size, nelec, ndim, init)
+                             step_size, nelec, ndim, init, move)
 
     def generate(self, pdf, ntherm=10, ndecor=100, pos=None,
-                 with_tqdm=True):
+                 with_tqdm=True, stream=False):
         """Generate a series of point using MC sampling
 
         Args:
             pdf (callable): probability distribution function to be sampled
             ntherm (int, optional): number of step before thermalization.
-                                    Defaults to 10.
+                                    'auto' to detect the equilibration
+                                    (see monitoring). Defaults to 10.
             ndecor (int, optional): number of steps for decorrelation.
-                                    Defaults to 50.
+                                    'auto' to use the autocorrelation
+                                    time. Defaults to 50.
             pos (torch.tensor, optional): position to start with.
                                           Defaults to None.
             with_tqdm (bool, optional): tqdm progress bar. Defaults to True.
+            stream (bool, optional): return a generator yielding the
+                                     positions of the walkers after each
+                                     decorrelation interval instead of
+                                     all the positions. Defaults to False.
 
         Returns:
             torch.tensor: positions of the walkers
         """
-        with torch.no_grad():
 
-            if ntherm < 0:
-                ntherm = self.nstep + ntherm
+        ntherm = self._check_ntherm(ntherm)
+
+        blocks = self._generate(pdf, ntherm, ndecor, pos, with_tqdm)
+        if stream:
+            return blocks
+        return self._collect(blocks, ntherm, ndecor)
+
+    def _generate(self, pdf, ntherm, ndecor, pos, with_tqdm):
+        """Generator of the positions of the walkers
+        after each decorrelation interval (see generate)."""
+
+        with torch.no_grad():
 
             self.walkers.initialize(pos=pos)
 
             xi = self.walkers.pos.clone()
             xi.requires_grad = True
 
-            rhoi = pdf(xi)
-            drifti = self.get_drift(pdf, xi)
+            # the moves start from the current positions
+            self.walkers.pos = xi
+
+            rhoi, drifti = self.get_pdf_drift(pdf, xi)
 
             rhoi[rhoi == 0] = 1E-16
-            pos, rate, idecor = [], 0, 0
+            rate, idecor = 0, 0
+
+            self._init_step_size()
+            ntherm, ndecor = self._init_diagnostics(ntherm, ndecor)
+
+        if with_tqdm:
+            rng = tqdm(range(self.nstep))
+        else:
+            rng = range(self.nstep)
 
-            if with_tqdm:
-                rng = tqdm(range(self.nstep))
-            else:
-                rng = range(self.nstep)
+        for istep in rng:
 
-            for istep in rng:
+            # the generator must not leave the grad disabled
+            # for the consumer between two yields
+            with torch.no_grad():
 
                 # new positions
                 xf = self.move(drifti)
 
                 # new function
-                rhof = pdf(xf)
-                driftf = self.get_drift(pdf, xf)
+                rhof, driftf = self.get_pdf_drift(pdf, xf)
                 rhof[rhof == 0.] = 1E-16
 
                 # transtions
@@ -80,6 +103,7 @@ class GeneralizedMetropolis(SamplerBase):
 
                 # acceptance rate
                 rate += index.byte().sum().float() / self.nwalkers
+                self._count_acceptance(index)
 
                 # update position/function value
                 xi[index, :] = xf[index, :]
@@ -88,18 +112,40 @@ class GeneralizedMetropolis(SamplerBase):
 
                 drifti[index, :] = driftf[index, :]
 
-                if (istep >= ntherm):
-                    if (idecor % ndecor == 0):
-                        pos.append(xi.clone().detach())
-                    idecor += 1
-
-            if with_tqdm:
-                print(
-                    "Acceptance rate %1.3f %%" %
-                    (rate / self.nstep * 100))
-
-            self.walkers.pos.data = xi.data
-        return torch.cat(pos)
+                # recycle the stuck walkers
+                stuck = self._update_status(index)
+                if stuck is not None:
+                    new_pos, donor = self._recycle(stuck)
+                    xi[stuck] = new_pos
+                    if donor is not None:
+                        rhoi[stuck] = rhoi[donor]
+                        drifti[stuck] = drifti[donor]
+                    else:
+                        rho, drift = self.get_pdf_drift(pdf, new_pos)
+                        rhoi[stuck] = rho
+                        drifti[stuck] = drift
+                    rhoi[rhoi == 0] = 1E-16
+
+                # adapt the step size during the thermalization
+                if istep < ntherm:
+                    self._adapt_step_size(index)
+
+                if self.diagnostics.record:
+                    ntherm, ndecor = self._monitor(
+                        istep, torch.log(rhoi), ntherm, ndecor)
+
+            if (istep >= ntherm):
+                if (idecor % ndecor == 0):
+                    yield self._sample_block(xi)
+                idecor += 1
+
+        if with_tqdm:
+            print(
+                "Acceptance rate %1.3f %%" %
+                (rate / self.nstep * 100))
+            self._print_diagnostics()
+
+        self.walkers.pos.data = xi.data
 
     def move(self, drift):
         """Move electron one at a time in a vectorized way.
@@ -130,17 +176,40 @@ class GeneralizedMetropolis(SamplerBase):
         d = drift.view(self.nwalkers,
                        self.nelec, self.ndim)
 
-        mv = MultivariateNormal(torch.zeros(self.ndim), np.sqrt(
-            self.step_size) * torch.eye(self.ndim))
+        # normal move of variance sqrt(step_size)
+        mv = torch.randn(self.nwalkers, self.ndim)
 
         return self.step_size * d[range(self.nwalkers), index, :] \
-            + mv.sample((self.nwalkers, 1)).squeeze()
+            + self.step_size**0.25 * mv
 
     def trans(self, xf, xi, drifti):
-        a = (xf - xi - drifti * self.step_size).norm(dim=1)
-        return torch.exp(- 0.5 * a / self.step_size)
+        step_size = self._step_size_per_walker()
+        a = (xf - xi - drifti * step_size).norm(dim=1)
+        return torch.exp(- 0.5 * a / step_size.view(-1))
+
+    def _step_size_per_walker(self):
+        """Step size broadcastable to the walkers [nwalkers, 1]."""
+        if isinstance(self.step_size, torch.Tensor):
+            return self.step_size.view(-1, 1)
+        return torch.tensor([[self.step_size]])
+
+    def get_pdf_drift(self, pdf, x):
+        """Compute the density and the drift in a single pass
+
+        If the pdf is the pdf method of a wave function, its evaluate()
+        method is used to get psi and grad log|psi| together.
+
+        Args:
+            pdf (callable): probability distribution function to be sampled
+            x (torch.tensor): positions of the walkers
+
+        Returns:
+            torch.tensor, torch.tensor: density and drift
+        """
+        if getattr(pdf, '__func__', None) is WaveFunction.pdf:
+            res = pdf.__self__.evaluate(x, want=['psi', 'drift'])
+            return (res.psi**2).reshape(-1), res.drift
 
-    def get_drift(self, pdf, x):
         with torch.enable_grad():
 
             x.requires_grad = True
@@ -149,7 +218,7 @@ class GeneralizedMetropolis(SamplerBase):
             grad_rho = grad(rho, x,
                             grad_outputs=z,
                             only_inputs=True)[0]
-            return 0.5 * grad_rho / rho
+            return rho.detach().reshape(-1), 0.5 * grad_rho / rho.detach()
 
     def _accept(self, P):
         """accept the move or not
@@ -1,70 +1,134 @@
 import torch
+import numpy as np
 from tqdm import tqdm
-from torch.autograd import Variable
+from torch.autograd import grad
 from deepqmc.sampler.sampler_base import SamplerBase
+from deepqmc.wavefunction.wf_base import WaveFunction
 
 
 class Hamiltonian(SamplerBase):
 
     def __init__(self, nwalkers=100, nstep=100, nelec=1, ndim=3,
-                 step_size=0.1, init={'min': -2, 'max': 2}, L=10):
+                 step_size=0.1, init={'min': -2, 'max': 2}, L=10,
+                 max_L=None):
         ''' HMC SAMPLER
         Args:
-            f (func) : function to sample
-            nstep (int) : number of mc step
             nwalkers (int) : number of walkers
-            eps (float) : size of the mc step
-            boudnary (float) : boudnary of the space
+            nstep (int) : number of mc step
+            nelec (int) : number of electrons
+            ndim (int) : number of dimension per electron
+            step_size (float) : initial step size of the leapfrog
+            init (dict) : method/data to initialize the walkers
+            L (int) : initial number of leapfrog steps per trajectory
+            max_L (int) : maximum number of leapfrog steps when the
+                          step size is adapted (default 4 L)
         '''
 
         SamplerBase.__init__(self, nwalkers, nstep,
                              step_size, nelec, ndim, init, None)
         self.traj_length = L
+        self.max_traj_length = max_L or 4 * L
+
+        # length of the trajectories kept during the adaptation
+        self.traj_time = step_size * L
+
+        # dual averaging of the step size of each walker
+        self.adaptive_step_size(target=0.65, per_walker=True)
+
+    def adaptive_step_size(self, target=0.65, per_walker=True, gain=0.05,
+                           t0=10, kappa=0.75):
+        '''Configure the dual averaging of the step size during the
+        thermalization (Hoffman and Gelman, 2014). The number of
+        leapfrog steps follows the step size to keep the length of the
+        trajectories and the adapted step size is frozen during the
+        production steps.
+
+        Args:
+            target (float) : target acceptance probability. If None the
+                             step size is fixed (default 0.65)
+            per_walker (bool) : adapt the step size of each walker
+                                independently (default True)
+            gain (float) : gain gamma of the dual averaging (default 0.05)
+            t0 (float) : stabilization of the first iterations (default 10)
+            kappa (float) : decay of the averaging weights (default 0.75)
+        '''
+
+        SamplerBase.adaptive_step_size(self, target=target,
+                                       per_walker=per_walker, gain=gain)
+        self.adapt.t0 = t0
+        self.adapt.kappa = kappa
+
+    def generate(self, pdf, ntherm=10, ndecor=10,
+                 with_tqdm=True, pos=None, stream=False):
+        '''perform a HMC sampling of the pdf
+        Args:
+            pdf (callable) : density to sample. The log density of its
+                             wave function is used if available
+            ntherm (int) : number of thermalization steps or 'auto'
+            ndecor (int) : number of decorrelation steps or 'auto'
+            with_tqdm (bool) : tqdm progress bar
+            pos (torch.tensor) : initial positions of the walkers
+            stream (bool) : return a generator yielding the positions of
+                            the walkers after each decorrelation interval
+        Returns:
+            X (list) : positions of the walkers
+        '''
+
+        ntherm = self._check_ntherm(ntherm)
+
+        blocks = self._generate(pdf, ntherm, ndecor, with_tqdm, pos)
+        if stream:
+            return blocks
+        return self._collect(blocks, ntherm, ndecor)
 
     @staticmethod
-    def get_grad(func, inp):
-        '''Compute the gradient of a function
-        wrt the value of its input
+    def get_log_pdf(pdf):
+        '''log of the density, from the wave function if the density
+        is its pdf method to avoid the underflow of the density
 
         Args:
-            func : function to get the gradient of
-            inp : input
+            pdf (callable) : density
         Returns:
-            grad : gradient of the func wrt the input
+            callable : log density
         '''
+        if getattr(pdf, '__func__', None) is WaveFunction.pdf:
+            return pdf.__self__.log_pdf
 
-        inp.requires_grad = True
-        val = func(inp)
-        z = Variable(torch.ones(val.shape))
-        val.backward(z)
-        fgrad = inp.grad.data
-        inp.grad.data.zero_()
-        inp.requires_grad = False
-        return fgrad
+        tiny = torch.finfo(torch.get_default_dtype()).tiny
+        return lambda x: torch.log(pdf(x).clamp_min(tiny)).reshape(-1)
 
     @staticmethod
-    def log_func(func):
-        return lambda x: -torch.log(func(x))
+    def log_pdf_grad(log_pdf, pos):
+        '''log density and its gradient in a single pass
 
-    def generate(self, pdf, ntherm=10, ndecor=10,
-                 with_tqdm=True, pos=None):
-        '''perform a HMC sampling of the pdf
+        Args:
+            log_pdf (callable) : log density
+            pos (torch.tensor) : positions of the walkers
         Returns:
-            X (list) : positions of the walkers
+            torch.tensor, torch.tensor : log density and gradient
         '''
+        with torch.enable_grad():
+            pos = pos.detach().requires_grad_()
+            val = log_pdf(pos).reshape(-1)
+            dval = grad(val.sum(), pos)[0]
+        return val.detach(), dval.detach()
+
+    def _generate(self, pdf, ntherm, ndecor, with_tqdm, pos):
+        '''Generator of the positions of the walkers
+        after each decorrelation interval (see generate)'''
 
-        if ntherm < 0:
-            ntherm = self.nstep + ntherm
+        log_pdf = self.get_log_pdf(pdf)
 
-        self.walkers.initialize(pos=pos)
-        self.walkers.pos = self.walkers.pos.clone()
+        with torch.no_grad():
 
-        # get the logpdf function
-        logpdf = self.log_func(pdf)
+            self.walkers.initialize(pos=pos)
+            self.walkers.pos = self.walkers.pos.detach().clone()
 
-        pos = []
-        rate = 0
-        idecor = 0
+            logp, dlogp = self.log_pdf_grad(log_pdf, self.walkers.pos)
+
+            self._init_step_size()
+            ntherm, ndecor = self._init_diagnostics(ntherm, ndecor)
+            rate, idecor, frozen = 0, 0, False
 
         if with_tqdm:
             rng = tqdm(range(self.nstep))
@@ -73,69 +137,185 @@ class Hamiltonian(SamplerBase):
 
         for istep in rng:
 
-            # move the walkers
-            self.walkers.pos, _r = self._step(
-                logpdf, self.get_grad, self.step_size, self.traj_length,
-                self.walkers.pos)
-            rate += _r
+            # the generator must not leave the grad disabled
+            # for the consumer between two yields
+            with torch.no_grad():
+
+                # freeze the adapted step size
+                if istep >= ntherm and not frozen:
+                    self._freeze_step_size()
+                    frozen = True
+
+                step_size, nleap = self._trajectory()
+
+                # move the walkers
+                pos, logpn, dlogpn, proba = self._step(
+                    log_pdf, self.walkers.pos, logp, dlogp,
+                    step_size, nleap)
+
+                # accept the moves
+                index = torch.rand_like(proba) < proba
+                rate += index.double().mean().item()
+                self._count_acceptance(index)
+
+                self.walkers.pos[index] = pos[index]
+                logp[index] = logpn[index]
+                dlogp[index] = dlogpn[index]
+
+                # adapt the step size during the thermalization
+                if istep < ntherm:
+                    self._adapt_step_size(proba)
+
+                # recycle the stuck walkers
+                stuck = self._update_status(index)
+                if stuck is not None:
+                    new_pos, donor = self._recycle(stuck)
+                    self.walkers.pos[stuck] = new_pos
+                    if donor is not None:
+                        logp[stuck] = logp[donor]
+                        dlogp[stuck] = dlogp[donor]
+                    else:
+                        logp[stuck], dlogp[stuck] = self.log_pdf_grad(
+                            log_pdf, new_pos)
+
+                if self.diagnostics.record:
+                    ntherm, ndecor = self._monitor(
+                        istep, logp, ntherm, ndecor)
 
-            # store
             if (istep >= ntherm):
                 if (idecor % ndecor == 0):
-                    pos.append(self.walkers.pos.detach())
+                    yield self._sample_block(self.walkers.pos)
                 idecor += 1
 
-        # print stats
-        print("Acceptance rate %1.3f %%" % (rate / self.nstep * 100))
-        return torch.cat(pos)
+        # the thermalization lasted the whole sampling
+        if not frozen:
+            self._freeze_step_size()
+
+        if with_tqdm:
+            print("Acceptance rate %1.3f %%" % (rate / self.nstep * 100))
+            self._print_diagnostics()
+
+    def _step(self, log_pdf, pos, logp, dlogp, step_size, nleap):
+        '''Leapfrog trajectories of all the walkers in a single batch
 
-    @staticmethod
-    def _step(U, get_grad, epsilon, L, qinit):
-        '''Propagates all the walkers over on traj
         Args:
-            pdf (callable): the target dist
-            get_grad (callable) : get the value of the target dist gradient
-            epsilon (float) : step size
-            L (int) : number of steps in the traj
-            qinit (array) : initial positon of the walkers
+            log_pdf (callable) : log density
+            pos (torch.tensor) : initial positions of the walkers
+            logp (torch.tensor) : log density at pos
+            dlogp (torch.tensor) : gradient of the log density at pos
+            step_size (torch.tensor) : step size of each walker [nwalkers, 1]
+            nleap (torch.tensor) : number of leapfrog steps of each walker
         Returns:
-            q : new positions of the walkers
-            rate : accept rate
+            torch.tensor : final positions, log density and gradient
+                           of the trajectories and acceptance probability
         '''
 
-        # init the momentum
-        q = qinit.clone()
-        p = torch.randn(q.shape)
+        q = pos.clone()
+        p = torch.randn_like(q)
+        logq, dlogq = logp.clone(), dlogp.clone()
 
-        # initial energy terms
-        Einit = U(q) + 0.5 * (p**2).sum(1)
+        # initial energy
+        Einit = -logp + 0.5 * (p**2).sum(1)
 
         # half step in momentum space
-        p -= 0.5 * epsilon * get_grad(U, q)
+        p += 0.5 * step_size * dlogq
 
-        # full steps in q and p space
-        for iL in range(L - 1):
-            q = q + epsilon * p
-            p -= 0.5 * epsilon * get_grad(U, q)
+        # the trajectories of the walkers with fewer steps stop earlier
+        for ileap in range(int(nleap.max())):
 
-        # last full step in pos space
-        q = q + epsilon * p
+            active = ileap < nleap
+            move = active.unsqueeze(-1)
 
-        # half step in momentum space
-        p -= 0.5 * epsilon * get_grad(U, q)
+            q = torch.where(move, q + step_size * p, q)
+            logqn, dlogqn = self.log_pdf_grad(log_pdf, q)
+            logq = torch.where(active, logqn, logq)
+            dlogq = torch.where(move, dlogqn, dlogq)
+
+            # full step in momentum space but half step at the end
+            scale = torch.where(ileap == nleap - 1,
+                                torch.full_like(step_size.view(-1), 0.5),
+                                torch.ones_like(step_size.view(-1)))
+            p = torch.where(move, p + (scale.unsqueeze(-1) * step_size)
+                            * dlogq, p)
 
-        # negate momentum
-        p = -p
+        # final energy
+        Enew = -logq + 0.5 * (p**2).sum(1)
 
-        # current energy term
-        Enew = U(q) + 0.5 * (p**2).sum(1)
+        # metropolis acceptance probability
+        proba = torch.exp(torch.clamp(Einit - Enew, max=0.))
+        proba = torch.where(torch.isfinite(Enew), proba,
+                            torch.zeros_like(proba))
 
-        # metropolix accept/reject
-        eps = torch.rand(Enew.shape)
-        cond = (torch.exp(Einit - Enew) < eps).view(-1)
-        q[cond] = qinit[cond]
+        return q, logq, dlogq, proba
+
+    def _init_step_size(self):
+        '''Reset the dual averaging at the beginning of the sampling.'''
+
+        SamplerBase._init_step_size(self)
+
+        step = torch.as_tensor(self.step_size, device=self.device,
+                               dtype=torch.get_default_dtype())
+        self.step_size = step.reshape(-1, 1).clone()
+
+        if self.adapt.target is not None:
+            self.adapt.mu = torch.log(10. * self.step_size)
+            self.adapt.hbar = torch.zeros_like(self.step_size)
+            self.adapt.log_step_bar = torch.log(self.step_size)
+
+    def _adapt_step_size(self, proba):
+        '''Dual averaging update of the step size toward
+        the target acceptance probability.
+
+        Args:
+            proba (torch.tensor) : acceptance probability of the walkers
+        '''
+
+        if self.adapt.target is None:
+            return
+
+        proba = proba.view(-1, 1).to(self.step_size)
+        if not self.adapt.per_walker:
+            proba = proba.mean(0, keepdim=True)
+
+        adapt = self.adapt
+        adapt.count += 1
+        m, t0 = adapt.count, adapt.t0
+
+        adapt.hbar = (1. - 1. / (m + t0)) * adapt.hbar \
+            + (adapt.target - proba) / (m + t0)
+        log_step = adapt.mu - np.sqrt(m) / adapt.gain * adapt.hbar
+
+        eta = m**(-adapt.kappa)
+        adapt.log_step_bar = eta * log_step + \
+            (1. - eta) * adapt.log_step_bar
+
+        self.step_size = torch.exp(log_step)
+
+    def _freeze_step_size(self):
+        '''Use the averaged step size for the production steps.'''
+
+        if self.adapt.target is None or self.adapt.count == 0:
+            return
+
+        self.step_size = torch.exp(self.adapt.log_step_bar)
+        if not self.adapt.per_walker:
+            self.step_size = self.step_size.item()
+
+    def _trajectory(self):
+        '''Step size and number of leapfrog steps of the walkers
+
+        Returns:
+            torch.tensor, torch.tensor : step size [nwalkers, 1] and
+                                         number of steps [nwalkers]
+        '''
 
-        # comute the accept rate
-        rate = cond.sum().float() / cond.shape[0]
+        step_size = torch.as_tensor(
+            self.step_size, device=self.device,
+            dtype=torch.get_default_dtype()).reshape(-1, 1)
+        if step_size.shape[0] != self.nwalkers:
+            step_size = step_size.mean(0, keepdim=True)
+        step_size = step_size.expand(self.nwalkers, 1)
 
-        return q, rate
+        nleap = torch.round(self.traj_time / step_size.view(-1))
+        nleap = nleap.clamp(1, self.max_traj_length).long()
+        return step_size, nleap
@@ -1,8 +1,8 @@
 from deepqmc.sampler.sampler_base import SamplerBase
+from deepqmc.wavefunction.wf_base import WaveFunction
 from tqdm import tqdm
 import torch
-from torch.distributions import MultivariateNormal
-from time import time
+import numpy as np
 
 
 class Metropolis(SamplerBase):
@@ -46,6 +46,18 @@ class Metropolis(SamplerBase):
                                                         through single elec
                                                         moves
                                     'proba' : 'uniform', 'normal'
+                                    'scale' : 'nucleus' scales the move of
+                                              each electron by u/(1+u)
+                                              with u = min Z_I |r-R_I|
+                                              (optional, Z_I = 1 unless
+                                              'atom_num' is given)
+                                    'atom_coords', 'atom_num' : positions
+                                              and charges of the nuclei for
+                                              'scale' (see Molecule.domain)
+                                    'ntry' : number of candidates of the
+                                             multiple-try Metropolis
+                                             moves, evaluated in a single
+                                             batch (optional, default 1)
                                     Defaults to {'type': 'one-elec',
                                                  'proba': 'uniform'}.
         """
@@ -61,12 +73,6 @@ class Metropolis(SamplerBase):
             print('Metroplis : Set uniform trial move probability')
             self.movedict['proba'] = 'uniform'
 
-        if self.movedict['proba'] == 'normal':
-            _sigma = self.step_size / \
-                (2 * torch.sqrt(2 * torch.log(torch.tensor(2.))))
-            self.multiVariate = MultivariateNormal(
-                torch.zeros(self.ndim), _sigma * torch.eye(self.ndim))
-
         self._move_per_iter = 1
         if self.movedict['type'] not in [
                 'one-elec', 'all-elec', 'all-elec-iter']:
@@ -79,67 +85,128 @@ class Metropolis(SamplerBase):
         else:
             self.fixed_id_elec_list = [None]
 
+        # nucleus-aware scale of the moves
+        self.nuclear_scale = self.movedict.get('scale', None) == 'nucleus'
+        if self.nuclear_scale:
+            if self.ndim != 3 or 'atom_coords' not in self.movedict:
+                raise ValueError(
+                    "'scale': 'nucleus' requires ndim=3 and 'atom_coords'")
+            dtype = torch.get_default_dtype()
+            self.atom_coords = torch.as_tensor(
+                self.movedict['atom_coords'], dtype=dtype).view(-1, 3)
+            self.atom_num = torch.as_tensor(
+                self.movedict.get('atom_num', [1.] * len(self.atom_coords)),
+                dtype=dtype)
+
+        # multiple-try moves
+        self.ntry = int(self.movedict.get('ntry', 1))
+        if self.ntry < 1:
+            raise ValueError("'ntry' in move should be at least 1")
+        if self.ntry > 1 and self.nuclear_scale:
+            raise ValueError(
+                "'ntry' requires a symmetric move without 'scale'")
+
     def generate(self, pdf, ntherm=10, ndecor=100, pos=None,
-                 with_tqdm=True):
+                 with_tqdm=True, stream=False):
         """Generate a series of point using MC sampling
 
         Args:
             pdf (callable): probability distribution function to be sampled
             ntherm (int, optional): number of step before thermalization.
-                                    Defaults to 10.
+                                    'auto' to detect the equilibration
+                                    (see monitoring). Defaults to 10.
             ndecor (int, optional): number of steps for decorrelation.
-                                    Defaults to 50.
+                                    'auto' to use the autocorrelation
+                                    time. Defaults to 50.
             pos (torch.tensor, optional): position to start with.
                                           Defaults to None.
             with_tqdm (bool, optional): tqdm progress bar. Defaults to True.
+            stream (bool, optional): return a generator yielding the
+                                     positions of the walkers after each
+                                     decorrelation interval instead of
+                                     all the positions. Defaults to False.
 
         Returns:
             torch.tensor: positions of the walkers
         """
 
+        if self.cuda:
+            self.walkers.cuda = True
+            self.device = torch.device('cuda')
+
+        ntherm = self._check_ntherm(ntherm)
+
+        blocks = self._generate(pdf, ntherm, ndecor, pos, with_tqdm)
+        if stream:
+            return blocks
+        return self._collect(blocks, ntherm, ndecor)
+
+    def _generate(self, pdf, ntherm, ndecor, pos, with_tqdm):
+        """Generator of the positions of the walkers
+        after each decorrelation interval (see generate)."""
+
         _type_ = torch.get_default_dtype()
         if _type_ == torch.float32:
             eps = 1E-7
         elif _type_ == torch.float64:
             eps = 1E-16
 
-        if self.cuda:
-            self.walkers.cuda = True
-            self.device = torch.device('cuda')
-
-        if ntherm >= self.nstep:
-            raise ValueError('Thermalisation longer than trajectory')
-
         with torch.no_grad():
 
-            if ntherm < 0:
-                ntherm = self.nstep + ntherm
-
             self.walkers.initialize(pos=pos)
 
             fx = pdf(self.walkers.pos)
 
             fx[fx == 0] = eps
-            pos, rate, idecor = [], 0, 0
+            rate, idecor = 0, 0
 
-            if with_tqdm:
-                rng = tqdm(range(self.nstep))
-            else:
-                rng = range(self.nstep)
+            # approximate density screening the moves
+            screen = self._screening_pdf(pdf)
+            if screen is not None:
+                gx = screen(self.walkers.pos)
+                gx[gx == 0] = eps
 
-            for istep in rng:
+            self._init_step_size()
+            ntherm, ndecor = self._init_diagnostics(ntherm, ndecor)
 
-                for id_elec in self.fixed_id_elec_list:
+        if with_tqdm:
+            rng = tqdm(range(self.nstep))
+        else:
+            rng = range(self.nstep)
+
+        for istep in rng:
 
-                    t0 = time()
-                    # new positions
-                    Xn = self.move(pdf, id_elec)
+            # the generator must not leave the grad disabled
+            # for the consumer between two yields
+            with torch.no_grad():
 
-                    # new function
-                    t0_pdf = time()
-                    fxn = pdf(Xn)
-                    fxn[fxn == 0.] = eps
-                    df = fxn / fx
+                moved = torch.zeros(self.nwalkers, dtype=torch.bool,
+                                    device=self.walkers.pos.device)
+
+                for id_elec in self.fixed_id_elec_list:
+
+                    if self.ntry > 1:
+                        Xn, fxn, df = self._multiple_try(
+                            pdf, fx, id_elec, eps)
+
+                    else:
+                        # new positions
+                        Xn = self.move(pdf, id_elec)
+
+                        # asymmetric proposal
+                        hastings = 1.
+                        if self.nuclear_scale:
+                            hastings = self._hastings_ratio(
+                                self.walkers.pos, Xn)
+
+                        # new function
+                        if screen is None:
+                            fxn = pdf(Xn)
+                            fxn[fxn == 0.] = eps
+                            df = fxn / fx * hastings
+                        else:
+                            fxn, gxn, df = self._delayed_acceptance(
+                                pdf, screen, Xn, fx, gx, hastings, eps)
 
                     # accept the moves
                     index = self._accept(df)
@@ -147,79 +214,286 @@ class Metropolis(SamplerBase):
                     # acceptance rate
                     rate += index.byte().sum().float().to('cpu') / \
                         (self.nwalkers * self._move_per_iter)
+                    self._count_acceptance(index)
 
                     # update position/function value
                     self.walkers.pos[index, :] = Xn[index, :]
                     fx[index] = fxn[index]
                     fx[fx == 0] = eps
-
-                if (istep >= ntherm):
-                    if (idecor % ndecor == 0):
-                        pos.append(self.walkers.pos.to('cpu').clone())
-                    idecor += 1
-
-            if with_tqdm:
-                print(
-                    "Acceptance rate %1.3f %%" %
-                    (rate / self.nstep * 100))
-
-        return torch.cat(pos)
-
-    def move(self, pdf, id_elec):
+                    if screen is not None:
+                        gx[index] = gxn[index]
+                    moved |= index
+
+                    # adapt the step size during the thermalization
+                    if istep < ntherm:
+                        self._adapt_step_size(index)
+
+                # recycle the stuck walkers
+                stuck = self._update_status(moved)
+                if stuck is not None:
+                    new_pos, donor = self._recycle(stuck)
+                    self.walkers.pos[stuck] = new_pos
+                    fx[stuck] = fx[donor] if donor is not None \
+                        else pdf(new_pos)
+                    fx[fx == 0] = eps
+                    if screen is not None:
+                        gx[stuck] = gx[donor] if donor is not None \
+                            else screen(new_pos)
+                        gx[gx == 0] = eps
+
+                if self.diagnostics.record:
+                    ntherm, ndecor = self._monitor(
+                        istep, torch.log(fx), ntherm, ndecor)
+
+            if (istep >= ntherm):
+                if (idecor % ndecor == 0):
+                    yield self._sample_block(self.walkers.pos)
+                idecor += 1
+
+        if with_tqdm:
+            print(
+                "Acceptance rate %1.3f %%" %
+                (rate / self.nstep * 100))
+            self._print_diagnostics()
+
+    def move(self, pdf, id_elec, pos=None):
         """Move electron one at a time in a vectorized way.
 
         Args:
             pdf (callable): function to sample
             id_elec (int): index f the electron to move
+            pos (torch.tensor, optional): positions to move, a multiple of
+                                          the walkers stacked along the
+                                          first dimension. Defaults to
+                                          the positions of the walkers.
 
         Returns:
             torch.tensor: new positions of the walkers
         """
+        if pos is None:
+            pos = self.walkers.pos
+        nbatch = pos.shape[0]
+
         if self.nelec == 1 or self.movedict['type'] == 'all-elec':
-            return self.walkers.pos + self._move(self.nelec)
+            displacement = self._move(self.nelec, nbatch)
+            if self.nuclear_scale:
+                displacement = (displacement.view(
+                    self.nwalkers, self.nelec, self.ndim) *
+                    self._nuclear_scale(self.walkers.pos)).view(
+                    self.nwalkers, self.nelec * self.ndim)
+            return pos + displacement
 
         else:
 
             # clone and reshape data : Nwlaker, Nelec, Ndim
-            new_pos = self.walkers.pos.clone()
-            new_pos = new_pos.view(self.nwalkers,
-                                   self.nelec, self.ndim)
+            new_pos = pos.clone()
+            new_pos = new_pos.view(nbatch, self.nelec, self.ndim)
 
             # get indexes
             if id_elec is None:
-                index = torch.LongTensor(self.nwalkers).random_(
+                index = torch.LongTensor(nbatch).random_(
                     0, self.nelec)
             else:
-                index = torch.LongTensor(self.nwalkers).fill_(id_elec)
+                index = torch.LongTensor(nbatch).fill_(id_elec)
 
             # change selected data
-            new_pos[range(self.nwalkers), index,
-                    :] += self._move(1)
+            displacement = self._move(1, nbatch)
+            if self.nuclear_scale:
+                displacement = displacement * self._nuclear_scale(
+                    self.walkers.pos)[range(self.nwalkers), index]
+            new_pos[range(nbatch), index,
+                    :] += displacement
 
-            return new_pos.view(self.nwalkers, self.nelec * self.ndim)
+            return new_pos.view(nbatch, self.nelec * self.ndim)
 
-    def _move(self, num_elec):
+    def _move(self, num_elec, nbatch=None):
         """Return a random array of length size between
         [-step_size,step_size]
 
         Args:
-            step_size (float): boundary of the array
-            size (int): number of points in the array
+            num_elec (int): number of electrons to move
+            nbatch (int, optional): number of positions, a multiple of the
+                                    number of walkers. Defaults to nwalkers.
 
         Returns:
             torch.tensor: random array
         """
+        if nbatch is None:
+            nbatch = self.nwalkers
+
+        # step size of each position
+        step_size = self.step_size
+        if isinstance(step_size, torch.Tensor) and \
+                step_size.shape[0] != nbatch:
+            step_size = step_size.repeat(nbatch // step_size.shape[0], 1)
+
         if self.movedict['proba'] == 'uniform':
             d = torch.rand(
-                (self.nwalkers, num_elec, self.ndim), device=self.device).view(
-                self.nwalkers, num_elec * self.ndim)
-            return self.step_size * (2. * d - 1.)
+                (nbatch, num_elec, self.ndim), device=self.device).view(
+                nbatch, num_elec * self.ndim)
+            return step_size * (2. * d - 1.)
+
+        elif self.movedict['proba'] == 'normal':
+            displacement = torch.randn(
+                (nbatch, num_elec * self.ndim), device=self.device)
+            return self._normal_variance(step_size)**0.5 * displacement
+
+    def _normal_variance(self, step_size=None):
+        """Variance step_size / (2 sqrt(2 ln 2)) of each
+        coordinate for the normal moves."""
+        if step_size is None:
+            step_size = self.step_size
+        return step_size / (2 * np.sqrt(2 * np.log(2.)))
+
+    def _screening_pdf(self, pdf):
+        """Approximate density of the wave function whose pdf is sampled
+        (see WaveFunction.screening_pdf). The multiple-try moves always
+        use the exact density.
+
+        Args:
+            pdf (callable): probability distribution function to be sampled
+
+        Returns:
+            callable: screening density or None
+        """
+        if self.ntry > 1 or \
+                getattr(pdf, '__func__', None) is not WaveFunction.pdf:
+            return None
+        return pdf.__self__.screening_pdf()
+
+    def _delayed_acceptance(self, pdf, screen, Xn, fx, gx, hastings, eps):
+        """Two stage acceptance of the moves (Christen & Fox, J. Comput.
+        Graph. Stat. 14, 795 (2005)). The moves are first accepted with the
+        screening density g, then the exact density f is computed for the
+        moves that passed and they are accepted with the ratio
+        f(x') g(x) / (f(x) g(x')). The product of the two probabilities
+        verifies the detailed balance of f.
+
+        Args:
+            pdf (callable): probability distribution function to be sampled
+            screen (callable): screening density
+            Xn (torch.tensor): proposed positions
+            fx (torch.tensor): density at the current positions
+            gx (torch.tensor): screening density at the current positions
+            hastings (torch.tensor): ratio of the proposal densities
+            eps (float): smallest value of the densities
+
+        Returns:
+            torch.tensor, torch.tensor, torch.tensor: density and screening
+            density at the proposed positions, probability of the second
+            stage (negative for the moves rejected by the first one)
+        """
+        gxn = screen(Xn)
+        gxn[gxn == 0.] = eps
+        first = self._accept(gxn / gx * hastings)
+
+        fxn = fx.clone()
+        P = -torch.ones_like(fx)
+        if first.any():
+            f = pdf(Xn[first])
+            f[f == 0.] = eps
+            fxn[first] = f
+            P[first] = (f / fx[first]) / (gxn[first] / gx[first])
+
+        return fxn, gxn, P
+
+    def _multiple_try(self, pdf, fx, id_elec, eps):
+        """Multiple-try Metropolis move (Liu, Liang and Wong, 2000).
+
+        ntry candidates are proposed for each walker and evaluated in a
+        single batch. One of them is selected with a probability
+        proportional to its density and accepted with the ratio of the
+        densities of all the candidates and of a reference set drawn
+        around the selected candidate.
+
+        Args:
+            pdf (callable): function to sample
+            fx (torch.tensor): density of the walkers
+            id_elec (int): index of the electron to move
+            eps (float): floor of the density
+
+        Returns:
+            torch.tensor, torch.tensor, torch.tensor: selected positions,
+                                                      their density and
+                                                      acceptance ratio
+        """
+
+        nwalkers, ntry = self.nwalkers, self.ntry
+        walkers = torch.arange(nwalkers)
+
+        # candidates of all the walkers in a single batch
+        Y = self.move(pdf, id_elec, pos=self.walkers.pos.repeat(ntry, 1))
+        wy = pdf(Y).view(ntry, nwalkers)
+        wy[wy == 0.] = eps
+
+        # selection by importance weights
+        iy = torch.multinomial((wy / wy.sum(0)).t(), 1).view(-1)
+        y = Y.view(ntry, nwalkers, -1)[iy, walkers]
+        fy = wy[iy, walkers]
+
+        # reference set around the selected candidates
+        X = self.move(pdf, id_elec, pos=y.repeat(ntry - 1, 1))
+        wx = pdf(X).view(ntry - 1, nwalkers)
+        wx[wx == 0.] = eps
+
+        df = wy.sum(0) / (wx.sum(0) + fx.view(-1))
+        return y, fy.view_as(fx), df.view_as(fx)
+
+    def _nuclear_scale(self, pos):
+        """Scale of the moves of each electron, u/(1+u) with u the
+        distance to the closest nucleus weighted by atom_num.
+
+        Args:
+            pos (torch.tensor): positions of the walkers [nwalkers, nelec*ndim]
+
+        Returns:
+            torch.tensor: scales [nwalkers, nelec, 1]
+        """
+        xyz = pos.view(self.nwalkers, self.nelec, 1, self.ndim)
+        atom_coords = self.atom_coords.to(pos.device)
+        atom_num = self.atom_num.to(pos.device)
+        u = (atom_num * (xyz - atom_coords).norm(dim=-1)).min(-1)[0]
+        return (u / (1. + u)).unsqueeze(-1)
+
+    def _hastings_ratio(self, pos, new_pos):
+        """Ratio T(new_pos -> pos) / T(pos -> new_pos) of the
+        proposal scaled by _nuclear_scale.
+
+        The unmoved electrons have the same scale in both directions
+        and do not contribute to the ratio.
+
+        Args:
+            pos (torch.tensor): positions of the walkers [nwalkers, nelec*ndim]
+            new_pos (torch.tensor): proposed positions [nwalkers, nelec*ndim]
+
+        Returns:
+            torch.tensor: ratio of the transition probabilities [nwalkers]
+        """
+        scale = self._nuclear_scale(pos)
+        new_scale = self._nuclear_scale(new_pos)
+        delta = (new_pos - pos).view(self.nwalkers, self.nelec, self.ndim)
+
+        # normalization of the proposal of each electron
+        log_ratio = self.ndim * torch.log(scale / new_scale).squeeze(-1)
+
+        step_size = self.step_size
+        if isinstance(step_size, torch.Tensor):
+            step_size = step_size.view(-1, 1, 1)
+
+        if self.movedict['proba'] == 'uniform':
+            # the reverse move must be within the box of new_pos
+            inside = (delta.abs() <= step_size * new_scale).all(-1)
+            log_ratio = log_ratio.masked_fill(~inside, -float('inf'))
 
         elif self.movedict['proba'] == 'normal':
-            displacement = self.multiVariate.sample(
-                (self.nwalkers, num_elec)).to(self.device)
-            return displacement.view(
-                self.nwalkers, num_elec * self.ndim)
+            var = self._normal_variance()
+            if isinstance(var, torch.Tensor):
+                var = var.view(-1, 1)
+            d2 = (delta**2).sum(-1)
+            log_ratio = log_ratio - 0.5 * d2 / var * (
+                1. / new_scale.squeeze(-1)**2 - 1. / scale.squeeze(-1)**2)
+
+        return torch.exp(log_ratio.sum(-1))
 
     def _accept(self, P):
         """accept the move or not
@@ -0,0 +1,367 @@
+import traceback
+from types import SimpleNamespace
+
+import numpy as np
+import torch
+import torch.multiprocessing as mp
+
+from deepqmc.sampler.sampler_base import SamplerBase
+
+
+class ParallelSampler(SamplerBase):
+
+    def __init__(self, sampler, nprocs=None, seed=None):
+        """Distribute the walkers of a sampler over a pool of processes.
+
+        The processes are forked at the first sampling and hold a copy
+        of the sampler and of the pdf. If the pdf is a method of a
+        torch module (e.g. wf.pdf) its parameters are moved to shared
+        memory so that the in-place updates of the optimizer are seen by
+        the processes without copy. The processes then clear the caches
+        derived from the parameters (see _clear_caches). The pool is forked
+        again when a parameter is replaced (e.g. by the pruning of the
+        determinants).
+
+        Each process uses an independent random stream spawned from seed
+        and the samples are gathered in a shared buffer with the same
+        layout as the one of the sampler. The states of the streams are
+        returned after each sampling and saved by state_dict.
+
+        Args:
+            sampler (SamplerBase): sampler to distribute
+            nprocs (int, optional): number of processes. Defaults to
+                                    the number of threads of torch.
+            seed (int, optional): seed of the random streams. Defaults
+                                  to a seed drawn from the torch RNG.
+        """
+
+        SamplerBase.__init__(self, sampler.nwalkers, sampler.nstep,
+                             sampler.step_size, sampler.nelec,
+                             sampler.ndim, sampler.walkers.init_domain,
+                             sampler.movedict)
+
+        self.sampler = sampler
+        self.nprocs = nprocs or torch.get_num_threads()
+
+        if seed is None:
+            seed = torch.randint(2**31, (1,)).item()
+        self.seed_sequence = np.random.SeedSequence(seed)
+        self.rng_states = [None] * self.nprocs
+
+        self.pool = None
+
+    def generate(self, pdf, ntherm=10, ndecor=100, pos=None,
+                 with_tqdm=True, stream=False):
+        """Generate a series of point using the processes
+
+        Args:
+            pdf (callable): probability distribution function to be sampled
+            ntherm (int, optional): number of step before thermalization.
+                                    Defaults to 10.
+            ndecor (int, optional): number of steps for decorrelation.
+                                    Defaults to 100.
+            pos (torch.tensor, optional): position to start with.
+                                          Defaults to None.
+            with_tqdm (bool, optional): not used, the processes run
+                                        without progress bar.
+                                        Defaults to True.
+            stream (bool, optional): return a generator yielding the
+                                     positions after each decorrelation
+                                     interval. The positions are still
+                                     gathered before. Defaults to False.
+
+        Returns:
+            torch.tensor: positions of the walkers
+        """
+
+        if self.cuda:
+            raise ValueError('ParallelSampler only runs on cpu')
+
+        ntherm = self._check_ntherm(ntherm)
+        self._start(pdf)
+
+        # distribute the walkers
+        shards = [s for s in np.array_split(np.arange(self.nwalkers),
+                                            self.nprocs) if len(s) > 0]
+
+        # shared buffer of the samples, unless the number of samples of
+        # the processes is unknown
+        size = self.get_sampling_size(ntherm, ndecor)
+        if self.sampler.recycle.exclude_age is not None:
+            size = None
+        buffer = None
+        if size is not None:
+            buffer = torch.empty(
+                size, self.nelec * self.ndim).share_memory_()
+
+        for rank, shard in enumerate(shards):
+            task = SimpleNamespace()
+            task.nstep = self.nstep
+            task.ntherm = ntherm
+            task.ndecor = ndecor
+            task.nwalkers = len(shard)
+            task.step_size = self._shard(self.step_size, shard)
+            task.pos = self._shard(pos, shard)
+            task.buffer = buffer
+            task.columns = (shard[0], shard[-1] + 1, self.nwalkers)
+            task.versions = self._versions(self.pool.signature)
+            task.rng_state = self.rng_states[rank]
+            self.pool.tasks[rank].put(task)
+
+        results = [None] * len(shards)
+        for _ in shards:
+            rank, res = self.pool.results.get()
+            if isinstance(res, str):
+                raise RuntimeError('Sampling process %d failed\n%s'
+                                   % (rank, res))
+            results[rank] = res
+            self.rng_states[rank] = res.rng_state
+
+        # state of the walkers
+        self.walkers.pos = torch.cat([r.pos for r in results])
+        self.step_size = self._gather_step_size(
+            [r.step_size for r in results], shards)
+        self.diagnostics = [r.diagnostics for r in results]
+
+        if buffer is None:
+            samples = [r.samples for r in results]
+            buffer = torch.cat(samples)
+        else:
+            samples = buffer.split(self.nwalkers)
+
+        if stream:
+            return iter(samples)
+        return buffer
+
+    def state_dict(self):
+        """State of the chain, of the seed sequence and of the random
+        streams of the processes.
+
+        Returns:
+            dict -- state of the sampler
+        """
+        state = SamplerBase.state_dict(self)
+        seq = self.seed_sequence
+        state['seed_sequence'] = (seq.entropy, tuple(seq.spawn_key),
+                                  seq.n_children_spawned)
+        state['process_rng_states'] = list(self.rng_states)
+        return state
+
+    def load_state_dict(self, state):
+        """Restore the state of the chain. The processes continue their
+        random streams at the next sampling if their number is the same.
+
+        Arguments:
+            state {dict} -- state of the sampler (see state_dict)
+        """
+        SamplerBase.load_state_dict(self, state)
+
+        if 'seed_sequence' in state:
+            entropy, spawn_key, nspawned = state['seed_sequence']
+            self.seed_sequence = np.random.SeedSequence(
+                entropy, spawn_key=spawn_key, n_children_spawned=nspawned)
+
+        rng_states = state.get('process_rng_states', [])
+        if len(rng_states) == self.nprocs:
+            self.rng_states = list(rng_states)
+        else:
+            self.rng_states = [None] * self.nprocs
+
+    def close(self):
+        """Terminate the processes."""
+
+        if self.pool is None:
+            return
+
+        for tasks in self.pool.tasks:
+            tasks.put(None)
+        for proc in self.pool.procs:
+            proc.join(timeout=5)
+            if proc.is_alive():
+                proc.terminate()
+        self.pool = None
+
+    def __del__(self):
+        try:
+            self.close()
+        except Exception:
+            pass
+
+    def _start(self, pdf):
+        """Fork the processes if the pool does not exist or if the pdf
+        or the parameters of its module have changed.
+
+        Args:
+            pdf (callable): probability distribution function to be sampled
+        """
+
+        module = getattr(pdf, '__self__', None)
+        if not isinstance(module, torch.nn.Module):
+            module = None
+
+        if module is not None:
+            module.share_memory()
+
+        signature = self._signature(module)
+        if self.pool is not None:
+            if self.pool.pdf == pdf and \
+                    self._same_signature(self.pool.signature, signature):
+                return
+            self.close()
+
+        ctx = mp.get_context('fork')
+        nthreads = max(1, torch.get_num_threads() // self.nprocs)
+
+        self.pool = SimpleNamespace()
+        self.pool.pdf = pdf
+        self.pool.signature = signature
+        self.pool.tasks = [ctx.SimpleQueue() for _ in range(self.nprocs)]
+        self.pool.results = ctx.SimpleQueue()
+        self.pool.procs = []
+
+        for rank, seed in enumerate(self.seed_sequence.spawn(self.nprocs)):
+            proc = ctx.Process(
+                target=_worker, daemon=True,
+                args=(rank, self.sampler, pdf, seed.generate_state(1)[0],
+                      nthreads, self.pool.tasks[rank], self.pool.results))
+            proc.start()
+            self.pool.procs.append(proc)
+
+    @staticmethod
+    def _signature(module):
+        """Tensors of a module and their storages. The signature changes
+        when a tensor is replaced but not by the in-place updates. It
+        keeps the tensors alive so that their address is not reused."""
+        if module is None:
+            return None
+        return [(name, t, t.untyped_storage(), t.data_ptr(), tuple(t.shape))
+                for name, t in module.state_dict(keep_vars=True).items()]
+
+    @staticmethod
+    def _versions(signature):
+        """Versions of the tensors of a signature, bumped by the in-place
+        updates of this process only."""
+        if signature is None:
+            return None
+        return tuple(t._version for _, t, _, _, _ in signature)
+
+    @staticmethod
+    def _same_signature(sig1, sig2):
+        """Compare two signatures"""
+        if sig1 is None or sig2 is None:
+            return sig1 is sig2
+        return len(sig1) == len(sig2) and all(
+            n1 == n2 and t1 is t2 and p1 == p2 and s1 == s2
+            for (n1, t1, _, p1, s1), (n2, t2, _, p2, s2) in zip(sig1, sig2))
+
+    def _shard(self, data, shard):
+        """Rows of the walkers of a process"""
+        if isinstance(data, torch.Tensor) and data.dim() > 0 and \
+                data.shape[0] == self.nwalkers:
+            return data[shard[0]:shard[-1] + 1].clone()
+        return data
+
+    def _gather_step_size(self, step_sizes, shards):
+        """Step size of the walkers from the ones of the processes"""
+        if all(isinstance(s, torch.Tensor) and s.dim() > 0 and
+               s.shape[0] == len(shard)
+               for s, shard in zip(step_sizes, shards)):
+            return torch.cat(step_sizes)
+        return float(np.mean([float(s) for s in step_sizes]))
+
+
+def _worker(rank, sampler, pdf, seed, nthreads, tasks, results):
+    """Sampling loop of a process
+
+    Args:
+        rank (int): index of the process
+        sampler (SamplerBase): copy of the sampler
+        pdf (callable): probability distribution function to be sampled
+        seed (int): seed of the random stream
+        nthreads (int): number of threads of the process
+        tasks (SimpleQueue): tasks sent by the ParallelSampler
+        results (SimpleQueue): results returned to the ParallelSampler
+    """
+
+    torch.set_num_threads(nthreads)
+    torch.manual_seed(int(seed))
+    np.random.seed(int(seed))
+
+    module = getattr(pdf, '__self__', None)
+    versions = None
+
+    while True:
+
+        task = tasks.get()
+        if task is None:
+            break
+
+        try:
+            if task.versions != versions:
+                _clear_caches(module)
+                versions = task.versions
+
+            if task.rng_state is not None:
+                _set_rng_state(task.rng_state)
+
+            sampler.nstep = task.nstep
+            sampler.step_size = task.step_size
+            sampler.nwalkers = task.nwalkers
+            sampler.walkers.nwalkers = task.nwalkers
+
+            blocks = sampler.generate(
+                pdf, ntherm=task.ntherm, ndecor=task.ndecor,
+                pos=task.pos, with_tqdm=False, stream=True)
+
+            res = SimpleNamespace()
+            res.samples = None
+
+            if task.buffer is None:
+                res.samples = torch.cat(list(blocks)).share_memory_()
+            else:
+                start, end, nwalkers = task.columns
+                buffer = task.buffer.view(-1, nwalkers, task.buffer.shape[1])
+                for iblock, block in enumerate(blocks):
+                    buffer[iblock, start:end] = block
+
+            res.pos = sampler.walkers.pos.detach().clone()
+            res.step_size = sampler.step_size
+            res.diagnostics = getattr(sampler, 'diagnostics', None)
+            res.rng_state = _get_rng_state()
+            results.put((rank, res))
+
+        except Exception:
+            results.put((rank, traceback.format_exc()))
+
+
+def _clear_caches(module):
+    """Clear the caches of the submodules of a module (spline tables,
+    sparse weights, ...). They are keyed on the versions of the tensors,
+    which the in-place updates of the parent process do not bump in the
+    process that shares them.
+
+    Args:
+        module (torch.nn.Module): module of the pdf, if any
+    """
+    if not isinstance(module, torch.nn.Module):
+        return
+    for m in module.modules():
+        if hasattr(m, 'clear_cache'):
+            m.clear_cache()
+
+
+def _get_rng_state():
+    """States of the torch and numpy generators of a process, the numpy
+    state as tensor to be loaded with weights_only."""
+    name, keys, ipos, has_gauss, gauss = np.random.get_state()
+    return (torch.get_rng_state(),
+            (name, torch.from_numpy(keys.astype(np.int64)),
+             ipos, has_gauss, gauss))
+
+
+def _set_rng_state(state):
+    """Restore the states of the generators (see _get_rng_state)."""
+    torch_state, (name, keys, ipos, has_gauss, gauss) = state
+    torch.set_rng_state(torch_state)
+    np.random.set_state((name, keys.numpy().astype(np.uint32),
+                         ipos, has_gauss, gauss))
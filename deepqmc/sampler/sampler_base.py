@@ -1,5 +1,10 @@
+import warnings
 import torch
+import numpy as np
+from types import SimpleNamespace
 from deepqmc.sampler.walkers import Walkers
+from deepqmc.sampler.diagnostics import (
+    mser, integrated_autocorrelation_time)
 
 
 class SamplerBase(object):
@@ -29,5 +34,433 @@ class SamplerBase(object):
         self.walkers = Walkers(
             nwalkers=nwalkers, nelec=nelec, ndim=ndim, init=init)
 
+        # fixed step size
+        self.adaptive_step_size(target=None)
+
+        # detection of the equilibration for ntherm/ndecor='auto'
+        self.monitoring()
+
+        # acceptance of the moves over all the samplings
+        self.acceptance = SimpleNamespace(accepted=0, proposed=0)
+
+        # no recycling of the stuck walkers
+        self.recycling(max_age=None)
+
+    def recycling(self, max_age=100, source='walker', exclude_age=None):
+        """Configure the recycling of the stuck walkers, e.g. trapped
+        near a node or far from the molecule.
+
+        The number of consecutive steps without accepted move of each
+        walker is stored in walkers.status. The walkers reaching max_age
+        are moved to the position of a random walker that is not stuck
+        or to a new position of the initial domain. The number of
+        recycled and excluded walkers is stored in recycle.count and
+        recycle.excluded.
+
+        Keyword Arguments:
+            max_age {int} -- number of steps without move before recycling.
+                             If None no recycling (default: {100})
+            source {str} -- new positions of the stuck walkers, 'walker' or
+                            'init' (default: {'walker'})
+            exclude_age {int} -- the positions of the walkers without move
+                                 since exclude_age steps are not returned. If
+                                 None all positions are returned
+                                 (default: {None})
+        """
+
+        if source not in ['walker', 'init']:
+            raise ValueError("source must be 'walker' or 'init'")
+
+        self.recycle = SimpleNamespace()
+        self.recycle.max_age = max_age
+        self.recycle.source = source
+        self.recycle.exclude_age = exclude_age
+        self.recycle.count = 0
+        self.recycle.excluded = 0
+
+    def _update_status(self, moved):
+        """Update the number of steps without move of the walkers
+
+        Arguments:
+            moved {torch.tensor} -- walkers moved during the step [nwalkers]
+
+        Returns:
+            torch.tensor -- index of the walkers to recycle, None if none
+        """
+
+        status = self.walkers.status
+        status.add_(1).masked_fill_(moved.view(-1), 0)
+
+        if self.recycle.max_age is None:
+            return None
+
+        stuck = status >= self.recycle.max_age
+        if not stuck.any():
+            return None
+        return stuck.nonzero().view(-1)
+
+    def _recycle(self, stuck):
+        """New positions of the stuck walkers
+
+        Arguments:
+            stuck {torch.tensor} -- index of the stuck walkers
+
+        Returns:
+            torch.tensor, torch.tensor -- new positions and index of the
+                                          walkers they are copied from
+                                          (None for the initial domain)
+        """
+
+        healthy = (self.walkers.status < self.recycle.max_age).nonzero()
+        healthy = healthy.view(-1)
+
+        self.walkers.status[stuck] = 0
+        self.recycle.count += len(stuck)
+
+        if self.recycle.source == 'walker' and len(healthy) > 0:
+            donor = healthy[torch.randint(
+                len(healthy), (len(stuck),), device=healthy.device)]
+            return self.walkers.pos[donor].clone(), donor
+
+        pos = self.walkers.sample_domain(len(stuck))
+        return pos.to(self.walkers.pos), None
+
+    def _sample_block(self, pos):
+        """Positions of the walkers returned by the sampling
+
+        Arguments:
+            pos {torch.tensor} -- positions of the walkers [nwalkers, nelec*ndim]
+
+        Returns:
+            torch.tensor -- copy of the positions without the excluded walkers
+        """
+
+        pos = pos.detach()
+        if self.recycle.exclude_age is None:
+            return pos.clone()
+
+        keep = self.walkers.status < self.recycle.exclude_age
+        self.recycle.excluded += (~keep).sum().item()
+        return pos[keep]
+
+    def state_dict(self):
+        """State of the chain: positions, status and step sizes of the
+        walkers, acceptance of the moves and states of the random
+        generators.
+
+        Returns:
+            dict -- state of the sampler
+        """
+
+        pos = self.walkers.pos
+        if pos is not None:
+            pos = pos.detach().cpu().clone()
+
+        step_size = self.step_size
+        if isinstance(step_size, torch.Tensor):
+            step_size = step_size.detach().cpu().clone()
+
+        # numpy state as tensor to be loaded with weights_only
+        name, keys, ipos, has_gauss, gauss = np.random.get_state()
+
+        status = self.walkers.status
+        if status is not None:
+            status = status.cpu().clone()
+
+        return {'pos': pos,
+                'status': status,
+                'recycled': self.recycle.count,
+                'step_size': step_size,
+                'accepted': self.acceptance.accepted,
+                'proposed': self.acceptance.proposed,
+                'torch_rng_state': torch.get_rng_state(),
+                'numpy_rng_state': (name, torch.from_numpy(
+                    keys.astype(np.int64)), ipos, has_gauss, gauss)}
+
+    def load_state_dict(self, state):
+        """Restore the state of the chain. The next sampling starting
+        from the walkers (see SolverBase.initial_sampling) continues the
+        chain without thermalization.
+
+        Arguments:
+            state {dict} -- state of the sampler (see state_dict)
+        """
+
+        pos = state['pos']
+        if pos is not None:
+            pos = pos.to(self.device)
+        self.walkers.pos = pos
+
+        status = state.get('status', None)
+        if status is not None:
+            status = status.to(self.device)
+        self.walkers.status = status
+        self.recycle.count = state.get('recycled', 0)
+
+        step_size = state['step_size']
+        if isinstance(step_size, torch.Tensor):
+            step_size = step_size.to(self.device)
+        self.step_size = step_size
+
+        self.acceptance.accepted = state['accepted']
+        self.acceptance.proposed = state['proposed']
+
+        torch.set_rng_state(state['torch_rng_state'])
+        name, keys, ipos, has_gauss, gauss = state['numpy_rng_state']
+        np.random.set_state((name, keys.numpy().astype(np.uint32),
+                             ipos, has_gauss, gauss))
+
+    def _count_acceptance(self, accepted):
+        """Update the acceptance of the moves
+
+        Arguments:
+            accepted {torch.tensor} -- accepted moves of the walkers [nwalkers]
+        """
+        self.acceptance.accepted += accepted.sum().item()
+        self.acceptance.proposed += accepted.numel()
+
+    def adaptive_step_size(self, target=0.5, per_walker=False, gain=0.5):
+        """Configure the adaptation of the step size during the
+        thermalization. The step size is frozen during the production
+        steps to preserve the detailed balance and the final value is
+        stored in step_size.
+
+        Keyword Arguments:
+            target {float} -- target acceptance rate. If None the step size
+                              is fixed (default: {0.5})
+            per_walker {bool} -- adapt the step size of each walker
+                                 independently (default: {False})
+            gain {float} -- initial gain of the update of log(step_size)
+                            (default: {0.5})
+        """
+
+        self.adapt = SimpleNamespace()
+        self.adapt.target = target
+        self.adapt.per_walker = per_walker
+        self.adapt.gain = gain
+        self.adapt.count = 0
+
+    def monitoring(self, check_every=20, tau_factor=1., ntau=20):
+        """Configure the online detection of the thermalization and
+        decorrelation used when ntherm or ndecor is 'auto'.
+
+        The log of the pdf of the walkers is recorded at each step.
+        The thermalization stops when the MSER truncation point of
+        its walker average is in the first half of the trace. The
+        stride between the samples is then the integrated
+        autocorrelation time of the equilibrated part of the trace.
+        The results are stored in the diagnostics attribute.
+
+        Keyword Arguments:
+            check_every {int} -- number of steps between two tests of
+                                 the equilibration (default: {20})
+            tau_factor {float} -- stride in unit of the autocorrelation
+                                  time (default: {1.})
+            ntau {int} -- with ntherm='auto' and ndecor='auto' the
+                          thermalization lasts until the equilibrated
+                          trace is longer than ntau autocorrelation times
+                          to estimate them reliably (default: {20})
+        """
+
+        self.monitor = SimpleNamespace()
+        self.monitor.check_every = check_every
+        self.monitor.tau_factor = tau_factor
+        self.monitor.ntau = ntau
+
+    def _check_ntherm(self, ntherm):
+        """Check the number of thermalization steps
+
+        Arguments:
+            ntherm {int or str} -- number of steps for the thermalization
+
+        Returns:
+            int or str -- positive number of steps or 'auto'
+        """
+
+        if ntherm == 'auto':
+            return ntherm
+
+        if ntherm >= self.nstep:
+            raise ValueError('Thermalisation longer than trajectory')
+
+        if ntherm < 0:
+            ntherm = self.nstep + ntherm
+        return ntherm
+
+    def _init_diagnostics(self, ntherm, ndecor):
+        """Reset the diagnostics at the beginning of the sampling.
+
+        Arguments:
+            ntherm {int or str} -- number of steps for the thermalization
+            ndecor {int or str} -- number of steps for the decorrelation
+
+        Returns:
+            int, int -- number of steps for the thermalization and the
+                        decorrelation used until they are detected
+        """
+
+        diag = SimpleNamespace()
+        diag.auto_ntherm = ntherm == 'auto'
+        diag.auto_ndecor = ndecor == 'auto'
+
+        # the trace of the log pdf is only needed for the detection
+        diag.record = diag.auto_ntherm or diag.auto_ndecor
+        diag.log_pdf = torch.zeros(self.nstep, self.nwalkers,
+                                   device=self.device) \
+            if diag.record else None
+        diag.ntherm = None if diag.auto_ntherm else ntherm
+        diag.ndecor = None if diag.auto_ndecor else ndecor
+        diag.mser = None
+        diag.tau = None
+        self.diagnostics = diag
+
+        if diag.auto_ntherm:
+            ntherm = self.nstep
+        if diag.auto_ndecor:
+            ndecor = 1
+        return ntherm, ndecor
+
+    def _monitor(self, istep, log_pdf, ntherm, ndecor):
+        """Record the log of the pdf of the walkers and detect the
+        end of the thermalization and the decorrelation time. The
+        recording stops once both have been detected.
+
+        Arguments:
+            istep {int} -- index of the step
+            log_pdf {torch.tensor} -- log of the pdf of the walkers
+            ntherm {int} -- current number of steps for the thermalization
+            ndecor {int} -- current number of steps for the decorrelation
+
+        Returns:
+            int, int -- updated numbers of steps for the thermalization
+                        and the decorrelation
+        """
+
+        diag = self.diagnostics
+        if not diag.record:
+            return ntherm, ndecor
+
+        diag.log_pdf[istep] = log_pdf.view(-1)
+        nrec = istep + 1
+
+        if diag.auto_ntherm and diag.ntherm is None:
+            if nrec % self.monitor.check_every == 0 or nrec == self.nstep:
+
+                diag.mser = mser(diag.log_pdf[:nrec].mean(1))
+                equilibrated = 2 * diag.mser <= nrec
+
+                if equilibrated and diag.auto_ndecor:
+                    diag.tau = integrated_autocorrelation_time(
+                        diag.log_pdf[diag.mser:nrec])
+                    equilibrated = nrec - diag.mser >= \
+                        self.monitor.ntau * diag.tau
+
+                if equilibrated:
+                    ntherm = diag.ntherm = istep
+
+                elif nrec == self.nstep:
+                    warnings.warn('Equilibration not detected in %d steps, '
+                                  'only the last positions are returned'
+                                  % self.nstep)
+                    ntherm = diag.ntherm = istep
+
+        if diag.auto_ndecor and diag.ndecor is None and istep == ntherm:
+            if diag.tau is None:
+                if diag.mser is None:
+                    diag.mser = mser(diag.log_pdf[:nrec].mean(1))
+                start = min(diag.mser, nrec // 2)
+                diag.tau = integrated_autocorrelation_time(
+                    diag.log_pdf[start:nrec])
+            ndecor = diag.ndecor = max(
+                1, int(np.ceil(self.monitor.tau_factor * diag.tau)))
+
+        if diag.ntherm is not None and diag.ndecor is not None:
+            diag.log_pdf = diag.log_pdf[:nrec]
+            diag.record = False
+
+        return ntherm, ndecor
+
+    def _print_diagnostics(self):
+        """Print the detected thermalization and decorrelation."""
+        diag = self.diagnostics
+        if diag.auto_ntherm:
+            print("Thermalization %d steps" % diag.ntherm)
+        if diag.auto_ndecor:
+            print("Decorrelation %d steps (autocorrelation time %1.1f)"
+                  % (diag.ndecor, diag.tau))
+
+    def _init_step_size(self):
+        """Reset the adaptation of the step size at the
+        beginning of the sampling."""
+
+        self.adapt.count = 0
+        if self.adapt.target is not None and self.adapt.per_walker:
+            step = torch.as_tensor(self.step_size, device=self.device,
+                                   dtype=torch.get_default_dtype())
+            if step.numel() != self.nwalkers:
+                step = step.mean().expand(self.nwalkers)
+            self.step_size = step.reshape(-1, 1).clone()
+
+    def _adapt_step_size(self, accepted):
+        """Robbins-Monro update of the step size toward the
+        target acceptance rate.
+
+        Arguments:
+            accepted {torch.tensor} -- accepted moves of the walkers [nwalkers]
+        """
+
+        if self.adapt.target is None:
+            return
+
+        self.adapt.count += 1
+        gain = self.adapt.gain / np.sqrt(self.adapt.count)
+
+        if self.adapt.per_walker:
+            rate = accepted.to(self.step_size).view(-1, 1)
+            self.step_size *= torch.exp(gain * (rate - self.adapt.target))
+        else:
+            rate = accepted.float().mean().item()
+            self.step_size *= np.exp(gain * (rate - self.adapt.target))
+
     def generate(self, pdf):
         raise NotImplementedError()
+
+    def get_sampling_size(self, ntherm, ndecor):
+        """Number of positions returned by generate
+
+        Arguments:
+            ntherm {int} -- number of steps for the thermalization
+            ndecor {int} -- number of steps for the decorrelation
+
+        Returns:
+            int -- number of positions, None if ntherm or ndecor is 'auto'
+        """
+        if 'auto' in (ntherm, ndecor):
+            return None
+        if ntherm < 0:
+            ntherm = self.nstep + ntherm
+        return self.nwalkers * len(range(ntherm, self.nstep, ndecor))
+
+    def _collect(self, blocks, ntherm, ndecor):
+        """Gather the positions yielded during the sampling
+        in a single preallocated buffer.
+
+        Arguments:
+            blocks {iterable} -- positions of the walkers [nwalkers, nelec*ndim]
+            ntherm {int} -- number of steps for the thermalization
+            ndecor {int} -- number of steps for the decorrelation
+
+        Returns:
+            torch.tensor -- positions [nsamples, nelec*ndim]
+        """
+        size = self.get_sampling_size(ntherm, ndecor)
+        if size is None:
+            return torch.cat(list(blocks))
+
+        pos, nsample = None, 0
+        for block in blocks:
+            if pos is None:
+                pos = block.new_empty(size, block.shape[1])
+            pos[nsample:nsample + block.shape[0]] = block
+            nsample += block.shape[0]
+        return pos[:nsample]
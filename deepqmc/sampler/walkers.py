@@ -1,3 +1,5 @@
+import warnings
+
 import torch
 import numpy as np
 from torch.distributions import MultivariateNormal
@@ -22,6 +24,8 @@ class Walkers(object):
         self.init_domain = init
 
         self.pos = None
+
+        # number of consecutive steps without move of each walker
         self.status = None
 
         self.cuda = False
@@ -45,72 +49,112 @@ class Walkers(object):
         if pos is not None:
             if len(pos) > self.nwalkers:
                 pos = pos[-self.nwalkers:, :]
+
+            # the chain of the walkers continues
+            if self.pos is None or self.status is None or \
+                    pos.shape != self.pos.shape or \
+                    pos.data_ptr() != self.pos.data_ptr():
+                self.status = None
             self.pos = pos
 
         else:
+            self.pos = self.sample_domain(self.nwalkers)
+            self.status = None
 
-            if 'center' in self.init_domain.keys():
-                self.pos = self._init_center()
+        if self.status is None:
+            self.status = torch.zeros(len(self.pos), dtype=torch.long,
+                                      device=self.pos.device)
 
-            elif 'min' in self.init_domain.keys():
-                self.pos = self._init_uniform()
+    def sample_domain(self, nwalkers):
+        """Positions drawn in the initial domain
 
-            elif 'mean' in self.init_domain.keys():
-                self.pos = self._init_multivar()
+        Args:
+            nwalkers (int): number of positions
 
-            elif 'atom_coords' in self.init_domain.keys():
-                self.pos = self._init_atomic()
+        Raises:
+            ValueError: if the method is not recognized
 
-            else:
-                raise ValueError('Init walkers not recognized')
+        Returns:
+            torch.tensor: positions [nwalkers, nelec*ndim]
+        """
+
+        if 'center' in self.init_domain.keys():
+            return self._init_center(nwalkers)
+
+        elif 'min' in self.init_domain.keys():
+            return self._init_uniform(nwalkers)
+
+        elif 'mean' in self.init_domain.keys():
+            return self._init_multivar(nwalkers)
+
+        elif 'atom_coords' in self.init_domain.keys():
+            return self._init_atomic(nwalkers)
 
-    def _init_center(self):
+        elif 'orb_weights' in self.init_domain.keys():
+            return self._init_scf(nwalkers)
+
+        else:
+            raise ValueError('Init walkers not recognized')
+
+    def _init_center(self, nwalkers):
         """Initialize the walkers at the center of the molecule
 
+        Arguments:
+            nwalkers {int} -- number of walkers
+
         Returns:
             torch.tensor -- positions of the walkers
         """
         eps = 1E-6
         pos = -eps + 2 * eps * \
-            torch.rand(self.nwalkers, self.nelec * self.ndim)
+            torch.rand(nwalkers, self.nelec * self.ndim)
         return pos.type(
             torch.get_default_dtype()).to(
             device=self.device)
 
-    def _init_uniform(self):
+    def _init_uniform(self, nwalkers):
         """Initialize the walkers in a box covering the molecule
 
+        Arguments:
+            nwalkers {int} -- number of walkers
+
         Returns:
             torch.tensor -- positions of the walkers
         """
-        pos = torch.rand(self.nwalkers, self.nelec * self.ndim)
+        pos = torch.rand(nwalkers, self.nelec * self.ndim)
         pos *= (self.init_domain['max'] - self.init_domain['min'])
         pos += self.init_domain['min']
         return pos.type(
             torch.get_default_dtype()).to(
             device=self.device)
 
-    def _init_multivar(self):
+    def _init_multivar(self, nwalkers):
         """Initialize the walkers in a sphere covering the molecule
 
+        Arguments:
+            nwalkers {int} -- number of walkers
+
         Returns:
             torch.tensor -- positions of the walkers
         """
         multi = MultivariateNormal(
             torch.tensor(self.init_domain['mean']),
             torch.tensor(self.init_domain['sigma']))
-        pos = multi.sample((self.nwalkers, self.nelec)).type(
+        pos = multi.sample((nwalkers, self.nelec)).type(
             torch.get_default_dtype())
-        pos = pos.view(self.nwalkers, self.nelec * self.ndim)
+        pos = pos.view(nwalkers, self.nelec * self.ndim)
         return pos.to(device=self.device)
 
-    def _init_atomic(self):
+    def _init_atomic(self, nwalkers):
         """Initialize the walkers around the atoms
 
+        Arguments:
+            nwalkers {int} -- number of walkers
+
         Returns:
             torch.tensor -- positions of the walkers
         """
-        pos = torch.zeros(self.nwalkers, self.nelec * self.ndim)
+        pos = torch.zeros(nwalkers, self.nelec * self.ndim)
         idx_ref, nelec_tot = [], 0
 
         nelec_placed, natom = [], 0
@@ -119,7 +163,7 @@ class Walkers(object):
             nelec_tot += nelec
             natom += 1
 
-        for iw in range(self.nwalkers):
+        for iw in range(nwalkers):
 
             nelec_placed = [0] * natom
             idx = torch.tensor(idx_ref)
@@ -142,3 +186,102 @@ class Walkers(object):
 
             pos[iw, :] = xyz.view(-1)
         return pos
+
+    def _init_scf(self, nwalkers, max_rounds=100):
+        """Initialize the walkers from the densities of the SCF orbitals
+        (see Molecule.get_orbital_density). For each electron a term of
+        the positive part of the mixture of its orbital is drawn, then the
+        distance to its center from the exact radial density and an
+        isotropic direction. The positions are accepted with the ratio of
+        the mixture and of its positive part, for all the walkers at once.
+        The electrons still rejected after max_rounds are drawn from the
+        positive part.
+
+        Arguments:
+            nwalkers {int} -- number of walkers
+
+        Keyword Arguments:
+            max_rounds {int} -- maximum number of rejection rounds (default: {100})
+
+        Returns:
+            torch.tensor -- positions of the walkers
+        """
+        dtype = torch.get_default_dtype()
+        weights = torch.as_tensor(self.init_domain['orb_weights'], dtype=dtype)
+        wpos = weights.clamp(min=0)
+
+        coords = torch.as_tensor(self.init_domain['orb_coords'], dtype=dtype)
+        exp = torch.as_tensor(self.init_domain['orb_exp'], dtype=dtype)
+        power = torch.as_tensor(self.init_domain['orb_power'], dtype=dtype)
+
+        pos = torch.zeros(nwalkers, self.nelec, self.ndim)
+        todo = torch.ones(nwalkers, self.nelec, dtype=torch.bool)
+        nround = 0
+
+        while todo.any():
+
+            # electrons left to place
+            # -> (N, 2)
+            index = todo.nonzero()
+            ielec = index[:, 1]
+
+            # term of the mixture of each electron
+            iterm = torch.multinomial(wpos[ielec], 1).view(-1)
+
+            # radial density r^(2k+2) exp(-2 a r^m) : r^m follows a gamma law
+            k, rate = power[iterm], 2. * exp[iterm]
+            if self.init_domain['radial_type'] == 'gto':
+                r = torch.distributions.Gamma(k + 1.5, rate).sample().sqrt()
+            else:
+                r = torch.distributions.Gamma(2. * k + 3., rate).sample()
+
+            # isotropic directions
+            u = torch.randn(len(index), self.ndim)
+            u = u / u.norm(dim=-1, keepdim=True)
+            x = coords[iterm] + r.unsqueeze(-1) * u
+
+            # rejection of the negative part of the mixture
+            if nround < max_rounds:
+                rho = self._scf_term_density(x, coords, exp, power)
+                accept = torch.rand(len(index)) * \
+                    (rho * wpos[ielec]).sum(1) < (rho * weights[ielec]).sum(1)
+            else:
+                warnings.warn('%d electrons drawn from the positive part of '
+                              'their orbital density after %d rounds'
+                              % (len(index), max_rounds))
+                accept = torch.ones(len(index), dtype=torch.bool)
+            nround += 1
+
+            index = index[accept]
+            pos[index[:, 0], index[:, 1]] = x[accept]
+            todo[index[:, 0], index[:, 1]] = False
+
+        return pos.view(nwalkers, self.nelec * self.ndim).to(
+            device=self.device)
+
+    def _scf_term_density(self, x, coords, a, k):
+        """Normalized densities r^(2k) exp(-2 a r^m) of the terms of the
+        orbital mixtures
+
+        Arguments:
+            x {torch.tensor} -- positions (N, Ndim)
+            coords {torch.tensor} -- centers of the terms (Nterm, Ndim)
+            a {torch.tensor} -- exponents of the terms (Nterm)
+            k {torch.tensor} -- powers of r of the terms (Nterm)
+
+        Returns:
+            torch.tensor -- densities (N, Nterm)
+        """
+        r = (x.unsqueeze(1) - coords).norm(dim=-1)
+
+        # log of the integral of r^(2k+2) exp(-2 a r^m) over r
+        if self.init_domain['radial_type'] == 'gto':
+            log_norm = torch.lgamma(k + 1.5) - np.log(2.) - \
+                (k + 1.5) * torch.log(2. * a)
+            log_rho = torch.xlogy(2. * k, r) - 2. * a * r**2
+        else:
+            log_norm = torch.lgamma(2. * k + 3.) - \
+                (2. * k + 3.) * torch.log(2. * a)
+            log_rho = torch.xlogy(2. * k, r) - 2. * a * r
+
+        return torch.exp(log_rho - log_norm - np.log(4. * np.pi))
@@ -1,3 +1,4 @@
+from contextlib import nullcontext
 import torch
 from types import SimpleNamespace
 from tqdm import tqdm
@@ -39,6 +40,9 @@ class SolverBase(object):
                         resample_from_last=True,
                         resample_every=1)
 
+        # pruning of the CI expansion
+        self.pruning(threshold=None)
+
         # observalbe
         self.observable(['local_energy'])
 
@@ -80,6 +84,55 @@ class SolverBase(object):
         self.resample.resample_every = resample_every
         self.resample.tqdm = tqdm
 
+    def pruning(self, threshold=None, patience=1):
+        """Configure the pruning of the determinants during the optimization.
+
+        Keyword Arguments:
+            threshold {float} -- determinants with a CI weight below threshold
+                                 times the largest weight are pruned. If None
+                                 no pruning (default: {None})
+            patience {int} -- number of consecutive epochs below the threshold
+                              before pruning (default: {1})
+        """
+
+        self.prune = SimpleNamespace()
+        self.prune.threshold = threshold
+        self.prune.patience = patience
+        self.prune.count = None
+
+    def _prune_configurations(self):
+        """Remove the determinants whose CI weight stayed below
+        the threshold during patience epochs."""
+
+        if self.prune.threshold is None or \
+                not hasattr(self.wf, 'prune_configurations'):
+            return
+
+        weight = self.wf.fc.weight.detach().abs().view(-1)
+        below = (weight < self.prune.threshold * weight.max()).long()
+
+        if self.prune.count is None or \
+                self.prune.count.shape != below.shape:
+            self.prune.count = torch.zeros_like(below)
+        self.prune.count = (self.prune.count + 1) * below
+
+        keep = self.prune.count < self.prune.patience
+        if keep.all():
+            return
+
+        self.wf.prune_configurations(keep)
+        self.prune.count = self.prune.count[keep]
+
+        # the optimizer state of the ci coefficients is obsolete
+        self.opt.state.pop(self.wf.fc.weight, None)
+
+        # the precomputed ci data as well
+        if getattr(self, 'ci_cache', None) is not None:
+            self.ci_cache = {'data': None, 'batch': {}}
+
+        print('Pruned %d determinants, %d left' %
+              ((~keep).sum().item(), self.wf.nci))
+
     def configure(self, task='wf_opt', freeze=None):
         """Configure the solver
 
@@ -132,17 +185,43 @@ class SolverBase(object):
                         raise ValueError(
                             'Valid arguments for freeze are :', opt_freeze)
 
-    def initial_sampling(self, ntherm=-1, ndecor=100):
+    def initial_sampling(self, ntherm=-1, ndecor=100, resume=False):
         """Configure the initial sampling
 
         Keyword Arguments:
-            ntherm {int} -- Number of MC steps needed to termalize (default: {-1})
-            ndecor {int} -- number of MC step for decorelation (default: {100})
+            ntherm {int} -- Number of MC steps needed to termalize or 'auto'
+                            to detect the equilibration (default: {-1})
+            ndecor {int} -- number of MC step for decorelation or 'auto' to
+                            use the autocorrelation time (default: {100})
+            resume {bool} -- the samplings without initial positions continue
+                             the chain of the sampler (e.g. of a previous run,
+                             single point or checkpoint) without thermalization
+                             (default: {False})
         """
 
         self.initial_sample = SimpleNamespace()
         self.initial_sample.ntherm = ntherm
         self.initial_sample.ndecor = ndecor
+        self.initial_sample.resume = resume
+
+    def _resume_chain(self, ntherm, pos=None):
+        """Starting positions and thermalization of a sampling
+
+        Arguments:
+            ntherm {int} -- Number of MC step for thermalization
+
+        Keyword Arguments:
+            pos {torch.tensor} -- initial positions of the walkers (default: {None})
+
+        Returns:
+            int, torch.tensor -- thermalization and initial positions, the
+                                 last positions of the walkers without
+                                 thermalization if the chain is resumed
+        """
+        if pos is None and self.initial_sample.resume and \
+                self.sampler.walkers.pos is not None:
+            return 0, self.sampler.walkers.pos.detach()
+        return ntherm, pos
 
     def observable(self, obs):
         """define the observalbe we want to track
@@ -183,12 +262,65 @@ class SolverBase(object):
             torch.tensor -- positions of the walkers
         """
 
+        ntherm, pos = self._resume_chain(ntherm, pos)
         pos = self.sampler.generate(
             self.wf.pdf, ntherm=ntherm, ndecor=ndecor,
             with_tqdm=with_tqdm, pos=pos)
         pos.requires_grad = True
         return pos
 
+    def _stream_local_energy(self, ntherm=-1, ndecor=100, with_tqdm=True):
+        """Compute the local energies of the walkers after each
+        decorrelation interval of the sampling.
+
+        Keyword Arguments:
+            ntherm {int} -- Number of MC step for thermalization (default: {-1})
+            ndecor {int} -- Number of MC step for decorelation (default: {100})
+            with_tqdm {bool} -- use tqdm (default: {True})
+
+        Returns:
+            torch.tensor, torch.tensor -- last positions of the walkers
+                                          and local energies
+        """
+
+        ntherm, pos = self._resume_chain(ntherm)
+        blocks = self.sampler.generate(
+            self.wf.pdf, ntherm=ntherm, ndecor=ndecor,
+            with_tqdm=with_tqdm, pos=pos, stream=True)
+
+        size = self.sampler.get_sampling_size(ntherm, ndecor)
+        eloc = [] if size is None else torch.zeros(size, device=self.device)
+        nsample = 0
+        for pos in blocks:
+            pos = pos.to(self.device)
+            pos.requires_grad = True
+            el = self.wf.local_energy(pos).detach().view(-1)
+            if size is None:
+                eloc.append(el)
+            else:
+                eloc[nsample:nsample + el.shape[0]] = el
+            nsample += el.shape[0]
+
+        if size is None:
+            return pos, torch.cat(eloc)
+        return pos, eloc[:nsample]
+
+    def _stage_cache_batch(self, lpos, ibatch):
+        """Bind the stage cache of the wave function to the batch.
+
+        Arguments:
+            lpos {torch.tensor} -- positions of the walkers in the batch
+            ibatch {int} -- index of the batch
+
+        Returns:
+            context manager -- binding of the cache (no op without cache)
+        """
+        cache = getattr(self.wf, 'stage_cache', None)
+        if cache is None:
+            return nullcontext()
+        return cache.batch(lpos, self.dataloader.dataset.data,
+                           ibatch, self.wf.stage_signature())
+
     def _resample(self, n, nepoch, pos):
         """Resample
 
@@ -244,6 +376,14 @@ class SolverBase(object):
         if self.wf.cuda and pos.device.type == 'cpu':
             pos = pos.to(self.device)
 
+        # compute all the wave function quantities in one pass
+        want = [obs for obs in self.obs_dict.keys()
+                if obs in self.wf.evaluate_fields]
+        if local_energy is not None and 'local_energy' in want:
+            want.remove('local_energy')
+        if len(want) > 0:
+            res = self.wf.evaluate(pos, want=want)
+
         for obs in self.obs_dict.keys():
 
             # store local energy
@@ -269,6 +409,13 @@ class SolverBase(object):
                     self.obs_dict[obs +
                                   '.grad'].append(torch.zeros_like(p.data))
 
+            # store the quantities computed by evaluate
+            elif obs in want:
+                data = res.__dict__[obs]
+                if isinstance(data, torch.Tensor):
+                    data = data.cpu().detach().numpy()
+                self.obs_dict[obs].append(data)
+
             # store any other defined method
             elif hasattr(self.wf, obs):
                 func = self.wf.__getattribute__(obs)
@@ -340,7 +487,7 @@ class SolverBase(object):
 
     def single_point(self, pos=None, prt=True,
                      with_tqdm=True, ntherm=-1, ndecor=100,
-                     no_grad=True):
+                     no_grad=True, stream=False):
         """Performs a single point calculation
 
         Keyword Arguments:
@@ -350,6 +497,10 @@ class SolverBase(object):
             ntherm {int} -- number of MC steps for thermalisation (default: {-1})
             ndecor {int} -- number of MC step for decorelation (default: {100})
             no_grad {bool} -- compute gradient (default: {True})
+            stream {bool} -- compute the local energies of the walkers during
+                             the sampling instead of storing all the positions.
+                             Only the last positions are returned
+                             (default: {False})
 
         Returns:
             [type] -- [description]
@@ -357,19 +508,25 @@ class SolverBase(object):
 
         # check if we have to compute and store the grads
         _grad = torch.enable_grad()
-        if no_grad and self.wf.kinetic != 'auto':
+        if no_grad and self.wf.kinetic not in ['auto', 'hutchinson']:
             _grad = torch.no_grad()
 
         with _grad:
 
-            if pos is None:
-                pos = self.sample(ntherm=ntherm, ndecor=ndecor,
-                                  with_tqdm=with_tqdm)
+            if pos is None and stream:
+                pos, el = self._stream_local_energy(
+                    ntherm=ntherm, ndecor=ndecor, with_tqdm=with_tqdm)
+                e, s, err = el.mean(), el.var(), self.wf.sampling_error(el)
+
+            else:
+                if pos is None:
+                    pos = self.sample(ntherm=ntherm, ndecor=ndecor,
+                                      with_tqdm=with_tqdm)
 
-            if self.wf.cuda and pos.device.type == 'cpu':
-                pos = pos.to(self.device)
+                if self.wf.cuda and pos.device.type == 'cpu':
+                    pos = pos.to(self.device)
 
-            e, s, err = self.wf._energy_variance_error(pos)
+                e, s, err = self.wf._energy_variance_error(pos)
 
             if prt:
                 print('Energy   : ', e.detach().item(),
@@ -379,7 +536,8 @@ class SolverBase(object):
         return pos, e, s
 
     def save_checkpoint(self, epoch, loss, filename):
-        """Save a checkpoint file
+        """Save a checkpoint file, with the configurations kept by
+        the pruning of the CI expansion
 
         Arguments:
             epoch {int} -- epoch number
@@ -393,10 +551,41 @@ class SolverBase(object):
             'epoch': epoch,
             'model_state_dict': self.wf.state_dict(),
             'optimzier_state_dict': self.opt.state_dict(),
+            'sampler_state_dict': self.sampler.state_dict(),
+            'config_mask': getattr(self.wf, 'config_mask', None),
             'loss': loss
         }, filename)
         return loss
 
+    def load_checkpoint(self, filename):
+        """Load a checkpoint file. The configurations pruned in the
+        checkpoint are removed from the wave function before loading its
+        parameters. The chain of the sampler is resumed if the initial
+        sampling is configured with resume=True.
+
+        Arguments:
+            filename {str} -- name of the check point file
+
+        Returns:
+            int, float -- epoch and loss of the checkpoint
+        """
+        data = torch.load(filename)
+
+        mask = data.get('config_mask', None)
+        if mask is not None:
+            keep = mask[self.wf.config_mask]
+            if not keep.all():
+                self.wf.prune_configurations(keep)
+                self.prune.count = None
+                if getattr(self, 'ci_cache', None) is not None:
+                    self.ci_cache = {'data': None, 'batch': {}}
+
+        self.wf.load_state_dict(data['model_state_dict'])
+        self.opt.load_state_dict(data['optimzier_state_dict'])
+        if 'sampler_state_dict' in data:
+            self.sampler.load_state_dict(data['sampler_state_dict'])
+        return data['epoch'], data['loss']
+
     def _append_observable(self, key, data):
         """Append a new data point to observable key.
 
@@ -438,15 +627,19 @@ class SolverBase(object):
                 else:
                     print(p)
 
-    def optimization_step(self, lpos):
+    def optimization_step(self, lpos, eloc=None):
         """Performs one optimization step
 
         Arguments:
             lpos {torch.tensor} -- positions of the walkers
+
+        Keyword Arguments:
+            eloc {torch.tensor} -- local energies of the walkers computed
+                                   for the loss (default: {None})
         """
 
         if self.opt.lpos_needed:
-            self.opt.step(lpos)
+            self.opt.step(lpos, eloc)
         else:
             self.opt.step()
 
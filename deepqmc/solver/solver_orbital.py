@@ -1,4 +1,6 @@
+import numpy as np
 import torch
+from scipy.linalg import eig
 from torch.utils.data import DataLoader
 
 from deepqmc.solver.solver_base import SolverBase
@@ -70,6 +72,11 @@ class SolverOrbital(SolverBase):
         # orthogonalization penalty for the MO coeffs
         self.ortho_loss = OrthoReg()
 
+        # cache of the CI data if only the CI coeffs are optimized
+        self.ci_cache = None
+        if self._ci_only():
+            self.ci_cache = {'data': None, 'batch': {}}
+
         cumulative_loss = []
         min_loss = 1E3
 
@@ -89,12 +96,17 @@ class SolverOrbital(SolverBase):
                 # port data to device
                 lpos = data.to(self.device)
 
+                # get the precomputed CI data if possible
+                ci_data = self.get_ci_data(lpos, ibatch)
+
                 # get the gradient
-                loss, eloc = self.evaluate_gradient(grad, lpos)
+                with self._stage_cache_batch(lpos, ibatch):
+                    loss, eloc = self.evaluate_gradient(
+                        grad, lpos, ci_data=ci_data)
                 cumulative_loss += loss
 
                 # optimize the parameters
-                self.optimization_step(lpos)
+                self.optimization_step(lpos, eloc)
 
                 # observable
                 self.get_observable(self.obs_dict, pos,
@@ -109,6 +121,9 @@ class SolverOrbital(SolverBase):
 
             print('----------------------------------------')
 
+            # remove the negligible determinants
+            self._prune_configurations()
+
             # resample the data
             pos = self._resample(n, nepoch, pos)
 
@@ -124,22 +139,27 @@ class SolverOrbital(SolverBase):
         self.sampler.walkers.nwalkers = _nwalker_save
         self.sampler.nwalkers = _nwalker_save
 
-    def evaluate_gradient(self, grad, lpos):
+    def evaluate_gradient(self, grad, lpos, ci_data=None):
         """Evaluate the gradient
 
         Arguments:
             grad {str} -- method of the gradient (auto, manual)
             lpos {torch.tensor} -- positions of the walkers
 
+        Keyword Arguments:
+            ci_data {SimpleNamespace} -- precomputed CI data (default: {None})
 
         Returns:
             tuple -- (loss, local energy)
         """
-        if grad == 'auto':
-            loss, eloc = self._evaluate_grad_auto(lpos)
+        if self.opt.lpos_needed:
+            loss, eloc = self._evaluate_loss(lpos)
+
+        elif grad == 'auto':
+            loss, eloc = self._evaluate_grad_auto(lpos, ci_data)
 
         elif grad == 'manual':
-            loss, eloc = self._evaluate_grad_manual(lpos)
+            loss, eloc = self._evaluate_grad_manual(lpos, ci_data)
         else:
             raise ValueError('Gradient method should be auto or stab')
 
@@ -148,18 +168,35 @@ class SolverOrbital(SolverBase):
 
         return loss, eloc
 
-    def _evaluate_grad_auto(self, lpos):
+    def _evaluate_loss(self, lpos):
+        """Evaluate the loss without gradients when the optimizer
+        computes its own update from the walker positions (e.g. SR).
+
+        Arguments:
+            lpos {torch.tensor} -- positions of the walkers
+
+        Returns:
+            tuple -- (loss, local energy)
+        """
+        no_grad = self.wf.kinetic not in ['auto', 'hutchinson']
+        loss, eloc = self.loss(lpos, no_grad=no_grad)
+        return loss.detach(), eloc.detach()
+
+    def _evaluate_grad_auto(self, lpos, ci_data=None):
         """Evaluate the gradient using automatic diff of the required loss.
 
         Arguments:
             lpos {torch.tensor} -- positions of the walkers
 
+        Keyword Arguments:
+            ci_data {SimpleNamespace} -- precomputed CI data (default: {None})
+
         Returns:
             tuple -- (loss, local energy)
         """
 
         # compute the loss
-        loss, eloc = self.loss(lpos)
+        loss, eloc = self.loss(lpos, ci_data=ci_data)
 
         # add mo orthogonalization if required
         if self.wf.mo.weight.requires_grad and self.ortho_mo:
@@ -171,12 +208,15 @@ class SolverOrbital(SolverBase):
 
         return loss, eloc
 
-    def _evaluate_grad_manual(self, lpos):
+    def _evaluate_grad_manual(self, lpos, ci_data=None):
         """Evaluate the gradient using a low variance method
 
         Arguments:
             lpos {torch.tensor} -- positions of the walkers
 
+        Keyword Arguments:
+            ci_data {SimpleNamespace} -- precomputed CI data (default: {None})
+
         Returns:
             tuple -- (loss, local energy)
         """
@@ -188,8 +228,12 @@ class SolverOrbital(SolverBase):
             '''
 
             # compute local energy and wf values
-            _, eloc = self.loss(lpos, no_grad=True)
-            psi = self.wf(lpos)
+            if ci_data is None:
+                res = self.wf.evaluate(lpos, want=['local_energy', 'psi'])
+                eloc, psi = res.local_energy.detach(), res.psi
+            else:
+                _, eloc = self.loss(lpos, no_grad=True, ci_data=ci_data)
+                psi = self.wf.forward_from_ci_data(ci_data)
             norm = 1. / len(psi)
 
             # evaluate the prefactor of the grads
@@ -207,3 +251,96 @@ class SolverOrbital(SolverBase):
 
         else:
             raise ValueError('Manual gradient only for energy min')
+
+    def _ci_only(self):
+        """Check if the CI coefficients are the only parameters optimized
+        and if the CI data give the same local energies as the wave function,
+        i.e. its kinetic energy uses the Jacobi formula.
+
+        Returns:
+            bool -- True if only fc.weight requires grad
+        """
+        if self.task != 'wf_opt' or not hasattr(self.wf, 'get_ci_data'):
+            return False
+        if self.wf.kinetic != 'jacobi':
+            return False
+        params = [p for p in self.wf.parameters() if p.requires_grad]
+        return len(params) == 1 and params[0] is self.wf.fc.weight
+
+    def get_ci_data(self, lpos, ibatch):
+        """Get the CI data of a batch, computed once per sample set.
+
+        Arguments:
+            lpos {torch.tensor} -- positions of the walkers in the batch
+            ibatch {int} -- index of the batch
+
+        Returns:
+            SimpleNamespace -- CI data or None if the cache is not used
+        """
+
+        if self.ci_cache is None:
+            return None
+
+        # new sample set : clear the cache
+        data = self.dataloader.dataset.data
+        if self.ci_cache['data'] is not data:
+            self.ci_cache['data'] = data
+            self.ci_cache['batch'] = {}
+
+        if ibatch not in self.ci_cache['batch']:
+            self.ci_cache['batch'][ibatch] = self.wf.get_ci_data(lpos)
+
+        return self.ci_cache['batch'][ibatch]
+
+    def ci_eigen_solve(self, pos=None, batchsize=None):
+        """Optimize the CI coefficients by solving the generalized
+        eigenvalue problem H c = E S c in the space of the determinants.
+        The kinetic terms use the Jacobi formula whatever the kinetic method
+        of the wave function (see Orbital.get_ci_data).
+
+        Keyword Arguments:
+            pos {torch.tensor} -- positions of the walkers. If None,
+                                  perform a sampling first (default: {None})
+            batchsize {int} -- number of walkers processed at once
+                               if None all the walkers (default: {None})
+
+        Returns:
+            float -- lowest eigenvalue
+        """
+
+        if pos is None:
+            pos = self.sample(ntherm=self.initial_sample.ntherm,
+                              ndecor=self.initial_sample.ndecor)
+
+        if batchsize is None:
+            batchsize = len(pos)
+
+        nci = self.wf.nci
+        H = torch.zeros(nci, nci, dtype=torch.float64)
+        S = torch.zeros(nci, nci, dtype=torch.float64)
+
+        for istart in range(0, len(pos), batchsize):
+
+            lpos = pos[istart:istart + batchsize].to(self.device)
+            data = self.wf.get_ci_data(lpos)
+
+            with torch.no_grad():
+                # ratios D_i / sum_j c_j D_j and (H D_i) / sum_j c_j D_j
+                denom = self.wf.fc(data.psi)
+                d = (data.psi / denom).double().cpu()
+                hd = ((data.kin + data.potential * data.psi) /
+                      denom).double().cpu()
+
+            H += d.t() @ hd
+            S += d.t() @ d
+
+        evals, evecs = eig(H.numpy(), S.numpy())
+        imin = np.argmin(evals.real)
+        coeffs = evecs[:, imin].real
+        coeffs /= coeffs[np.argmax(np.abs(coeffs))]
+
+        self.wf.fc.weight.data = torch.tensor(
+            coeffs, dtype=self.wf.fc.weight.dtype,
+            device=self.wf.fc.weight.device).view(1, -1)
+
+        return evals[imin].real
@@ -27,8 +27,19 @@ class SolverOrbital(SolverBase):
         SolverBase.__init__(self, wf, sampler, optimizer)
 
         hvd.broadcast_optimizer_state(self.opt, root_rank=0)
-        self.opt = hvd.DistributedOptimizer(
-            self.opt, named_parameters=self.wf.named_parameters())
+
+        # optimizers using the walker positions (e.g. SR)
+        # reduce their own data across the ranks
+        if self.opt.__dict__.get('lpos_needed', False):
+            if 'distributed' not in self.opt.__dict__.keys():
+                raise ValueError(
+                    '%s can not be distributed with horovod'
+                    % type(self.opt).__name__)
+            self.opt.distributed = True
+            self.opt.hvd = hvd
+        else:
+            self.opt = hvd.DistributedOptimizer(
+                self.opt, named_parameters=self.wf.named_parameters())
 
         self.sampler.nwalkers //= hvd.size()
         self.sampler.walkers.nwalkers //= hvd.size()
@@ -47,8 +58,8 @@ class SolverOrbital(SolverBase):
             loss : loss used ('energy','variance' or callable (for supervised)
         '''
 
-        if 'lpos_needed' not in self.opt.defaults:
-            self.opt.defaults['lpos_needed'] = False
+        if 'lpos_needed' not in self.opt.__dict__.keys():
+            self.opt.lpos_needed = False
 
         self.wf.train()
 
@@ -99,24 +110,23 @@ class SolverOrbital(SolverBase):
             printd(hvd.rank(), 'epoch %d' % n)
 
             cumulative_loss = 0.
-            for data in self.dataloader:
+            for ibatch, data in enumerate(self.dataloader):
 
                 lpos = data.to(self.device)
                 lpos.requires_grad = True
 
-                loss, eloc = self.loss(lpos)
+                with self._stage_cache_batch(lpos, ibatch):
+                    loss, eloc = self.loss(lpos)
                 if self.wf.mo.weight.requires_grad:
                     loss += self.ortho_loss(self.wf.mo.weight)
                 cumulative_loss += loss
 
-                # compute gradients
-                self.opt.zero_grad()
-                loss.backward()
-
                 # optimize
-                if 'lpos_needed' in self.opt.defaults:
-                    self.opt.step(lpos)
+                if self.opt.lpos_needed:
+                    self.opt.step(lpos, eloc)
                 else:
+                    self.opt.zero_grad()
+                    loss.backward()
                     self.opt.step()
 
                 if self.wf.fc.clip:
@@ -0,0 +1,87 @@
+import torch
+
+
+def det_inverse_logdet(A):
+    """Determinants, inverses and log of the absolute determinants of a
+    batch of matrices in one pass. The kernel is selected with the size
+    of the matrices: closed form for n <= 3 and a single batched LU
+    factorization otherwise.
+
+    Arguments:
+        A {torch.tensor} -- matrices [..., n, n]
+
+    Returns:
+        torch.tensor, torch.tensor, torch.tensor -- det [...], inverse [..., n, n]
+                                                    and log|det| [...]
+    """
+
+    n = A.shape[-1]
+
+    if n == 0:
+        det = A.new_ones(A.shape[:-2])
+        return det, A.new_zeros(A.shape), torch.log(det)
+
+    if n <= 3:
+        adj, det = adjugate_closed_form(A)
+        return det, adj / det[..., None, None], torch.log(torch.abs(det))
+
+    return _lapack(A)
+
+
+def adjugate_closed_form(A):
+    """Adjugate matrices and determinants from the cofactor formulas,
+    exact also for singular matrices (n <= 3)
+
+    Arguments:
+        A {torch.tensor} -- matrices [..., n, n]
+
+    Returns:
+        torch.tensor, torch.tensor -- adjugates [..., n, n] and det [...]
+    """
+
+    n = A.shape[-1]
+
+    if n == 1:
+        return torch.ones_like(A), A[..., 0, 0]
+
+    if n == 2:
+        a, b = A[..., 0, 0], A[..., 0, 1]
+        c, d = A[..., 1, 0], A[..., 1, 1]
+        adj = torch.stack([torch.stack([d, -b], -1),
+                           torch.stack([-c, a], -1)], -2)
+        return adj, a * d - b * c
+
+    if n == 3:
+        r0, r1, r2 = A[..., 0, :], A[..., 1, :], A[..., 2, :]
+        c0 = torch.linalg.cross(r1, r2)
+        c1 = torch.linalg.cross(r2, r0)
+        c2 = torch.linalg.cross(r0, r1)
+        adj = torch.stack([c0, c1, c2], -1)
+        return adj, (r0 * c0).sum(-1)
+
+    raise ValueError('closed form adjugate only for n <= 3')
+
+
+def _lapack(A):
+    """Determinants and inverses from a batched LU factorization.
+
+    Arguments:
+        A {torch.tensor} -- matrices [..., n, n]
+
+    Returns:
+        torch.tensor, torch.tensor, torch.tensor -- det, inverse and log|det|
+    """
+
+    n = A.shape[-1]
+    LU, piv = torch.linalg.lu_factor_ex(A)[:2]
+
+    # det = prod(diag(U)) * sign of the permutation
+    diag = torch.diagonal(LU, dim1=-2, dim2=-1)
+    perm = (piv != torch.arange(1, n + 1, device=A.device)).sum(-1)
+    det = (1. - 2. * (perm % 2).type(A.dtype)) * diag.prod(-1)
+    logdet = torch.log(torch.abs(diag)).sum(-1)
+
+    eye = torch.eye(n, dtype=A.dtype, device=A.device).expand_as(A)
+    inv = torch.linalg.lu_solve(LU, piv, eye)
+
+    return det, inv, logdet
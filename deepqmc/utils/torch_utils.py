@@ -68,7 +68,7 @@ class Loss(nn.Module):
         if self.use_weight:
             self.weight = {'psi': None, 'psi0': None}
 
-    def forward(self, pos, no_grad=False):
+    def forward(self, pos, no_grad=False, ci_data=None):
         """Computes the loss
 
         Arguments:
@@ -76,6 +76,8 @@ class Loss(nn.Module):
 
         Keyword Arguments:
             no_grad {bool} -- computes the gradient of the loss (default: {False})
+            ci_data {SimpleNamespace} -- precomputed CI data of the batch
+                                         see Orbital.get_ci_data (default: {None})
 
         Returns:
             torch.tensor, torch.tensor -- value of the loss, local energies
@@ -88,8 +90,15 @@ class Loss(nn.Module):
 
         with _grad:
 
-            # compute local eneergies
-            local_energies = self.wf.local_energy(pos)
+            # compute local eneergies (and wf values for the weights)
+            if ci_data is None:
+                want = ['local_energy']
+                if self.use_weight:
+                    want.append('psi')
+                res = self.wf.evaluate(pos, want=want)
+                local_energies = res.local_energy
+            else:
+                local_energies = self.wf.local_energy_from_ci_data(ci_data)
 
             # mask the energies if necessary
             if self.clip:
@@ -118,7 +127,11 @@ class Loss(nn.Module):
             else:
 
                 # computes the weights
-                self.weight['psi'] = self.wf(pos)
+                if ci_data is None:
+                    self.weight['psi'] = res.psi
+                else:
+                    self.weight['psi'] = self.wf.forward_from_ci_data(
+                        ci_data)
 
                 if self.weight['psi0'] is None:
                     self.weight['psi0'] = self.weight['psi'].detach(
@@ -166,3 +179,60 @@ class OrthoReg(nn.Module):
         """Return the loss : |W x W^T - I|."""
         return self.alpha * \
             torch.norm(W.mm(W.transpose(0, 1)) - torch.eye(W.shape[0]))
+
+
+def batch_jacobian(out, params, chunk_size=64):
+    """Computes the jacobian of a batched output wrt a list of parameters
+
+    Arguments:
+        out {torch.tensor} -- batched output [nbatch] or [nbatch, 1]
+        params {list} -- list of parameters
+
+    Keyword Arguments:
+        chunk_size {int} -- number of rows of the jacobian computed
+                            in a single backward pass, which bounds the
+                            memory of the batched backward (default: {64})
+
+    Returns:
+        torch.tensor -- jacobian [nbatch, nparam]
+    """
+
+    out = out.view(-1)
+    nbatch = out.shape[0]
+    if chunk_size is None:
+        chunk_size = nbatch
+
+    jac = []
+
+    for istart in range(0, nbatch, chunk_size):
+
+        # rows of the chunk with a chunk sized grad output
+        chunk = out[istart:istart + chunk_size]
+        rows = torch.eye(len(chunk), dtype=out.dtype, device=out.device)
+        try:
+            grads = torch.autograd.grad(chunk, params,
+                                        grad_outputs=rows,
+                                        retain_graph=True,
+                                        allow_unused=True,
+                                        is_grads_batched=True)
+        except (TypeError, RuntimeError):
+            # older torch versions or non batchable ops
+            grads = [torch.autograd.grad(chunk, params, grad_outputs=r,
+                                         retain_graph=True,
+                                         allow_unused=True)
+                     for r in rows]
+            grads = [None if g[0] is None else torch.stack(g)
+                     for g in zip(*grads)]
+
+        jac.append(torch.cat([_flatten_grad(g, p, len(rows))
+                              for g, p in zip(grads, params)], dim=1))
+
+    return torch.cat(jac)
+
+
+def _flatten_grad(g, p, nrows):
+    """Flatten a batched gradient, replace unused gradients by zeros."""
+    if g is None:
+        return torch.zeros(nrows, p.numel(),
+                           dtype=p.dtype, device=p.device)
+    return g.reshape(nrows, -1)
@@ -42,6 +42,10 @@ class AtomicOrbitals(nn.Module):
             self.nshells, dim=0)
         self.nbas = len(self.bas_coords)
 
+        # index of the atom of each bas
+        self.bas_atom = torch.arange(
+            self.natoms).repeat_interleave(self.nshells)
+
         # index for the contractions
         self.index_ctr = torch.tensor(mol.basis.index_ctr)
 
@@ -95,7 +99,7 @@ class AtomicOrbitals(nn.Module):
         self.device = torch.device('cuda')
         self.to(self.device)
         attrs = ['bas_n', 'bas_coeffs',
-                 'nshells', 'norm_cst', 'index_ctr']
+                 'nshells', 'norm_cst', 'index_ctr', 'bas_atom']
         for at in attrs:
             self.__dict__[at] = self.__dict__[at].to(self.device)
 
@@ -104,7 +108,10 @@ class AtomicOrbitals(nn.Module):
             input,
             derivative=0,
             jacobian=True,
-            one_elec=False):
+            one_elec=False,
+            en_vect=None,
+            en_dist=None,
+            workspace=None):
         """Computes the values of the atomic orbitals (or their derivatives)
         for the electrons positions in input.
 
@@ -119,6 +126,14 @@ class AtomicOrbitals(nn.Module):
                                        False only for derivative=1
 
             one_elec (bool, optional): if only one electron is in input
+            en_vect (torch.tensor, optional): precomputed electron-nucleus
+                                              vectors (see Geometry)
+                                              Size : Nbatch, Nelec, Natom, Ndim
+            en_dist (torch.tensor, optional): precomputed electron-nucleus
+                                              distances (see Geometry)
+                                              Size : Nbatch, Nelec, Natom
+            workspace (Workspace, optional): buffers reused between calls
+                                             (see Workspace)
 
         Returns:
             torch.tensor: Value of the AO (or their derivatives)
@@ -141,13 +156,18 @@ class AtomicOrbitals(nn.Module):
 
         # get the x,y,z, distance component of each point from each RBF center
         # -> (Nbatch,Nelec,Nbas,Ndim)
-        xyz = (input.view(-1, self.nelec, 1, self.ndim) -
-               self.bas_coords[None, ...])
-        # print('xyz : ', time()-t0)
+        if en_vect is None:
+            xyz = (input.view(-1, self.nelec, 1, self.ndim) -
+                   self.bas_coords[None, ...])
+        else:
+            xyz = en_vect.index_select(2, self.bas_atom)
 
         # compute the distance
         # -> (Nbatch,Nelec,Nbas)
-        r = torch.sqrt((xyz**2).sum(3))
+        if en_dist is None:
+            r = torch.sqrt((xyz**2).sum(3))
+        else:
+            r = en_dist.index_select(2, self.bas_atom)
 
         # radial part
         # -> (Nbatch,Nelec,Nbas)
@@ -155,7 +175,7 @@ class AtomicOrbitals(nn.Module):
 
         # compute by the spherical harmonics
         # -> (Nbatch,Nelec,Nbas)
-        Y = self.harmonics(xyz)
+        Y = self.harmonics(xyz, workspace=workspace)
 
         # values of AO
         # -> (Nbatch,Nelec,Nbas)
@@ -173,7 +193,7 @@ class AtomicOrbitals(nn.Module):
                     self.bas_exp,
                     xyz=xyz,
                     derivative=1)
-                dY = self.harmonics(xyz, derivative=1)
+                dY = self.harmonics(xyz, derivative=1, workspace=workspace)
 
                 # -> (Nbatch,Nelec,Nbas)
                 bas = dR * Y + R * dY
@@ -187,7 +207,8 @@ class AtomicOrbitals(nn.Module):
                     xyz=xyz,
                     derivative=1,
                     jacobian=False)
-                dY = self.harmonics(xyz, derivative=1, jacobian=False)
+                dY = self.harmonics(
+                    xyz, derivative=1, jacobian=False, workspace=workspace)
                 # -> (Nbatch,Nelec,Nbas,Ndim)
                 bas = dR * Y.unsqueeze(-1) + R.unsqueeze(-1) * dY
 
@@ -196,7 +217,8 @@ class AtomicOrbitals(nn.Module):
 
             dR = self.radial(r, self.bas_n, self.bas_exp,
                              xyz=xyz, derivative=1, jacobian=False)
-            dY = self.harmonics(xyz, derivative=1, jacobian=False)
+            dY = self.harmonics(
+                xyz, derivative=1, jacobian=False, workspace=workspace)
 
             d2R = self.radial(
                 r,
@@ -204,7 +226,7 @@ class AtomicOrbitals(nn.Module):
                 self.bas_exp,
                 xyz=xyz,
                 derivative=2)
-            d2Y = self.harmonics(xyz, derivative=2)
+            d2Y = self.harmonics(xyz, derivative=2, workspace=workspace)
 
             bas = d2R * Y + 2. * (dR * dY).sum(3) + R * d2Y
 
@@ -216,11 +238,8 @@ class AtomicOrbitals(nn.Module):
 
             # contract the basis
             # -> (Nbatch,Nelec,Norb)
-            ao = torch.zeros(
-                nbatch,
-                self.nelec,
-                self.norb,
-                device=self.device)
+            ao = self._zeros(workspace, ('ao', derivative),
+                             (nbatch, self.nelec, self.norb), bas)
             ao.index_add_(2, self.index_ctr, bas)
 
         else:
@@ -230,8 +249,8 @@ class AtomicOrbitals(nn.Module):
 
             # contract the basis
             # -> (Nbatch,Nelec,Norb, Ndim)
-            ao = torch.zeros(nbatch, self.nelec, self.norb,
-                             3, device=self.device)
+            ao = self._zeros(workspace, ('ao', 'grad'),
+                             (nbatch, self.nelec, self.norb, 3), bas)
             ao.index_add_(2, self.index_ctr, bas)
 
         if one_elec:
@@ -239,6 +258,22 @@ class AtomicOrbitals(nn.Module):
 
         return ao
 
+    def _zeros(self, workspace, name, shape, like):
+        """Output buffer of the contraction, from the workspace if any.
+
+        Args:
+            workspace (Workspace): buffers (or None)
+            name (tuple): name of the buffer
+            shape (tuple): shape of the buffer
+            like (torch.tensor): tensor with the dtype of the buffer
+
+        Returns:
+            torch.tensor: buffer filled with zeros
+        """
+        if workspace is None:
+            return torch.zeros(shape, dtype=like.dtype, device=self.device)
+        return workspace.zeros(name, shape, like.dtype, self.device)
+
     def update(self, ao, pos, idelec):
         """Update the AO matrix if only the idelec electron has been moved.
 
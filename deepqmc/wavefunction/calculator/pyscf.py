@@ -1,6 +1,6 @@
 import numpy as np
 import os
-from pyscf import gto, scf
+from pyscf import gto, scf, mcscf
 import basis_set_exchange as bse
 import json
 import h5py
@@ -14,7 +14,7 @@ class CalculatorPySCF(CalculatorBase):
 
         CalculatorBase.__init__(
             self, atoms, atom_coords, basis, scf, units)
-        self.basis.harmonics_type = 'cartesian'
+        self.basis.harmonics_type = 'sph'
         self.run()
 
     def run(self):
@@ -46,80 +46,67 @@ class CalculatorPySCF(CalculatorBase):
     def save_data(self, mol, rhf, file_name):
         """Save the data to HDF5
 
+        The AOs are the real spherical GTOs of the SCF calculation,
+        i.e. 5 d and 7 f functions per shell in the PySCF order.
+
         Arguments:
             mol {pyscf.gto.M} -- psycf Molecule
             rhf {pyscf.scf} -- scf object
             file_name {str} -- name of the file
         """
 
-        mval = {0: [0], 1: [-1, 1, 0], 2: [-2, -1, 0, 1, 2]}
-        kx = {0: [0], 1: [1, 0, 0], 2: [2, 1, 1, 0, 0, 0]}
-        ky = {0: [0], 1: [0, 1, 0], 2: [0, 1, 0, 2, 1, 0]}
-        kz = {0: [0], 1: [0, 0, 1], 2: [0, 0, 1, 0, 1, 2]}
-
         h5 = h5py.File(file_name, 'w')
         h5['TotalEnergy'] = rhf.e_tot
+        h5['harmonics_type'] = 'sph'
+
         # number of unique ao (e.g. px,py,px -> p)
         h5['nbas'] = mol.nbas
 
         # total number of ao
-        # wrong if there are d orbitals as counts only 5 d orbs (sph)
-        # h5['nao'] = mol.nao
-        h5['nao'] = len(mol.cart_labels())
+        h5['nao'] = mol.nao_nr()
 
         nshells = [0] * mol.natm
 
         bas_coeff, bas_exp = [], []
         index_ctr = []
         bas_n, bas_l, bas_m = [], [], []
-        bas_kx, bas_ky, bas_kz = [], [], []
-        bas_n = []
-        bas_n_ori = self.get_bas_n(mol)
 
         iao = 0
         for ibas in range(mol.nbas):
 
-            # number of contracted gaussian in that bas
-            # nctr = mol.bas_nctr(ibas)
-            nctr = mol.bas_nprim(ibas)
-
-            # number of ao from that bas
-            mult = mol.bas_len_cart(ibas)
+            # number of primitive gaussians in that bas
+            nprim = mol.bas_nprim(ibas)
 
-            # quantum numbers
-            n = bas_n_ori[ibas]
+            # angular momentum and real harmonics in the pyscf order
             l = mol.bas_angular(ibas)
+            mvals = [1, -1, 0] if l == 1 else list(range(-l, l + 1))
 
-            # get qn per bas
-            bas_n += [n] * nctr * mult
-            bas_l += [l] * nctr * mult
+            # coeffs/exp of each contraction
+            coeffs = mol.bas_ctr_coeff(ibas)
+            exps = mol.bas_exp(ibas).tolist()
 
-            # coeffs/exp
-            bas_coeff += mol.bas_ctr_coeff(
-                ibas).flatten().tolist() * mult
-            bas_exp += mol.bas_exp(ibas).flatten().tolist() * mult
+            for ictr in range(mol.bas_nctr(ibas)):
+                for m in mvals:
 
-            # number of shell per atoms
-            nshells[mol.bas_atom(ibas)] += nctr * mult
-
-            for m in range(mult):
-                index_ctr += [iao] * nctr
-                iao += 1
+                    # radial part r^l exp(-a r^2)
+                    bas_n += [l] * nprim
+                    bas_l += [l] * nprim
+                    bas_m += [m] * nprim
 
-            for k in kx[l]:
-                bas_kx += [k] * nctr
+                    bas_coeff += coeffs[:, ictr].tolist()
+                    bas_exp += exps
 
-            for k in ky[l]:
-                bas_ky += [k] * nctr
+                    index_ctr += [iao] * nprim
+                    iao += 1
 
-            for k in kz[l]:
-                bas_kz += [k] * nctr
-
-        bas_norm = []
-        for expnt, l in zip(bas_exp, bas_l):
-            bas_norm.append(mol.gto_norm(l, expnt))
+            # number of shell per atoms
+            nshells[mol.bas_atom(ibas)] += nprim * \
+                mol.bas_nctr(ibas) * len(mvals)
 
-        bas_kr = np.array(bas_n) - np.array(bas_l) - 1
+        # the real harmonics are normalized so that
+        # only the radial part is normalized here
+        bas_norm = [mol.gto_norm(l, expnt)
+                    for expnt, l in zip(bas_exp, bas_l)]
 
         h5.create_dataset('nshells', data=nshells)
         h5.create_dataset('index_ctr', data=index_ctr)
@@ -130,15 +117,10 @@ class CalculatorPySCF(CalculatorBase):
 
         h5.create_dataset('bas_n', data=bas_n)
         h5.create_dataset('bas_l', data=bas_l)
-        h5.create_dataset('bas_kr', data=bas_kr)
-
-        h5.create_dataset('bas_kx', data=bas_kx)
-        h5.create_dataset('bas_ky', data=bas_ky)
-        h5.create_dataset('bas_kz', data=bas_kz)
+        h5.create_dataset('bas_m', data=bas_m)
 
         h5['nmo'] = rhf.mo_energy.shape[0]
         h5.create_dataset('mos', data=rhf.mo_coeff)
-        h5.create_dataset('cart2sph', data=mol.cart2sph_coeff())
 
         h5.close()
 
@@ -147,29 +129,38 @@ class CalculatorPySCF(CalculatorBase):
 
         h5 = h5py.File(self.out_file, 'r')
 
+        # files of previous versions contain cartesian AOs
+        if 'harmonics_type' in h5:
+            self.basis.harmonics_type = h5['harmonics_type'][()].decode()
+        else:
+            self.basis.harmonics_type = 'cart'
+
         self.basis.radial_type = 'gto'
-        self.basis.harmonics_type = 'cart'
 
         self.basis.nao = int(h5['nao'][()])
         self.basis.nmo = int(h5['nmo'][()])
 
         self.basis.nshells = h5['nshells'][()]
 
-        self.basis.bas_kr = h5['bas_kr'][()]
-        self.basis.bas_kx = h5['bas_kx'][()]
-        self.basis.bas_ky = h5['bas_ky'][()]
-        self.basis.bas_kz = h5['bas_kz'][()]
-
         self.basis.bas_n = h5['bas_n'][()]
         self.basis.bas_l = h5['bas_l'][()]
 
+        if self.basis.harmonics_type == 'sph':
+            self.basis.bas_m = h5['bas_m'][()]
+            self.basis.bas_norm = h5['bas_norm'][()]
+
+        else:
+            self.basis.bas_kr = h5['bas_kr'][()]
+            self.basis.bas_kx = h5['bas_kx'][()]
+            self.basis.bas_ky = h5['bas_ky'][()]
+            self.basis.bas_kz = h5['bas_kz'][()]
+
+            # the norm given by pyscf only accounts
+            # for the radial part of the cartesian AOs
+
         self.basis.bas_exp = h5['bas_exp'][()]
         self.basis.bas_coeffs = h5['bas_coeff'][()]
 
-        # the norm given by pyscf only accounts
-        # for the radial part
-        # self.basis.bas_norm = h5['bas_norm'][()]
-
         self.basis.index_ctr = h5['index_ctr'][()]
         self.basis.atom_coords_internal = self.atom_coords
 
@@ -184,15 +175,59 @@ class CalculatorPySCF(CalculatorBase):
 
         h5 = h5py.File(self.out_file, 'r')
 
-        nao = h5['nao'][()]
-        nao = h5['nmo'][()]
-        mos = h5['mos'][()]
-        cart2sph = h5['cart2sph']
-        bas_mos = cart2sph @ mos
+        bas_mos = h5['mos'][()]
+        if 'cart2sph' in h5:
+            bas_mos = h5['cart2sph'][()] @ bas_mos
         h5.close()
 
         return self.normalize_columns(bas_mos)
 
+    def save_ci_coeffs(self, ncas, nelecas, file_name=None):
+        """Run a CASCI calculation on the stored RHF orbitals and
+        save the CI coefficients (see OrbitalConfigurations) next to
+        these orbitals. The orbitals are not canonicalized so that the
+        CI vector refers to the MOs of the wave function.
+
+        Arguments:
+            ncas {int} -- number of active orbitals
+            nelecas {int} -- number of active electrons
+
+        Keyword Arguments:
+            file_name {str} -- name of the hdf5 file (default: {None})
+
+        Returns:
+            str -- name of the file
+        """
+
+        if file_name is None:
+            file_name = ''.join(self.atoms) + '_' + self.basis_name + \
+                '_cas_%d_%d.hdf5' % (nelecas, ncas)
+
+        with h5py.File(self.out_file, 'r') as h5:
+            mos = h5['mos'][()]
+
+        mol = gto.M(
+            atom=self.get_atoms_str(),
+            basis=self.basis_name,
+            unit=self.units)
+        mc = mcscf.CASCI(scf.RHF(mol), ncas, nelecas)
+        mc.canonicalization = False
+        mc.kernel(mos)
+
+        # rows/columns : rank of the spin up/down occupations
+        # of the active orbitals
+        h5 = h5py.File(file_name, 'w')
+        h5['TotalEnergy'] = mc.e_tot
+        h5['ncore'] = mc.ncore
+        h5['ncas'] = ncas
+        h5['nelecas_up'] = mc.nelecas[0]
+        h5['nelecas_down'] = mc.nelecas[1]
+        h5.create_dataset('ci_coeffs', data=mc.ci)
+        h5.create_dataset('mos', data=mos)
+        h5.close()
+
+        return file_name
+
     def get_atoms_str(self):
         """Refresh the atom string.  Necessary when atom positions have changed. """
         atoms_str = ''
@@ -205,19 +240,6 @@ class CalculatorPySCF(CalculatorBase):
             atoms_str += ';'
         return atoms_str
 
-    @staticmethod
-    def get_bas_n(mol):
-
-        label2int = {'s': 1, 'p': 2, 'd': 3}
-        labels = [l[:3] for l in mol.cart_labels(fmt=False)]
-        unique_labels = []
-        for l in labels:
-            if l not in unique_labels:
-                unique_labels.append(l)
-        nlabel = [l[2][1] for l in unique_labels]
-        n = [label2int[nl] for nl in nlabel]
-        return n
-
     def parse_basis(self):
         """Get the properties of all the orbitals in the molecule."""
 
@@ -0,0 +1,173 @@
+from contextlib import contextmanager
+
+import torch
+
+from deepqmc.wavefunction.electron_distance import ElectronDistance
+
+
+class Geometry(object):
+
+    def __init__(self, nelec, ndim=3):
+        """Electron-nucleus and electron-electron geometry shared by the
+        AOs, the jastrow factor and the potentials.
+
+        Within an evaluation scope (see evaluation()) the quantities are
+        computed once for the position tensor of the scope and reused by
+        all the layers. Outside of a scope they are simply computed.
+
+        Arguments:
+            nelec {int} -- number of electrons
+
+        Keyword Arguments:
+            ndim {int} -- number of dimension (default: {3})
+        """
+
+        self.nelec = nelec
+        self.ndim = ndim
+        self.edist = ElectronDistance(nelec, ndim)
+
+        # index of the unique electron pairs
+        self.index_pairs = torch.triu_indices(nelec, nelec, offset=1)
+
+        self.pos = None
+        self.depth = 0
+        self.data = {}
+
+    @contextmanager
+    def evaluation(self, pos):
+        """Share the geometry of pos between all the calls in the scope.
+
+        Arguments:
+            pos {torch.tensor} -- positions of the electrons [nbatch, nelec*ndim]
+        """
+
+        # nested scope with other positions : keep the outer one
+        if self.depth > 0 and pos is not self.pos:
+            yield self
+            return
+
+        self.pos = pos
+        self.depth += 1
+        try:
+            yield self
+        finally:
+            self.depth -= 1
+            if self.depth == 0:
+                self.clear()
+
+    def en_vectors(self, pos, atom_coords):
+        """Electron-nucleus displacement vectors r_i - R_A
+
+        Arguments:
+            pos {torch.tensor} -- positions of the electrons [nbatch, nelec*ndim]
+            atom_coords {torch.tensor} -- positions of the atoms [natom, ndim]
+
+        Returns:
+            torch.tensor -- displacement vectors [nbatch, nelec, natom, ndim]
+        """
+        return self._memo(
+            ('en_vectors',) + self._atom_key(atom_coords), pos,
+            lambda: pos.view(-1, self.nelec, 1, self.ndim) -
+            atom_coords[None, None, ...])
+
+    def en_distances(self, pos, atom_coords):
+        """Electron-nucleus distances
+
+        Arguments:
+            pos {torch.tensor} -- positions of the electrons [nbatch, nelec*ndim]
+            atom_coords {torch.tensor} -- positions of the atoms [natom, ndim]
+
+        Returns:
+            torch.tensor -- distances [nbatch, nelec, natom]
+        """
+        return self._memo(
+            ('en_distances',) + self._atom_key(atom_coords), pos,
+            lambda: torch.sqrt(
+                (self.en_vectors(pos, atom_coords)**2).sum(-1)))
+
+    def en_inverse(self, pos, atom_coords):
+        """Inverse of the electron-nucleus distances
+
+        Arguments:
+            pos {torch.tensor} -- positions of the electrons [nbatch, nelec*ndim]
+            atom_coords {torch.tensor} -- positions of the atoms [natom, ndim]
+
+        Returns:
+            torch.tensor -- inverse distances [nbatch, nelec, natom]
+        """
+        return self._memo(
+            ('en_inverse',) + self._atom_key(atom_coords), pos,
+            lambda: 1. / self.en_distances(pos, atom_coords))
+
+    def ee_distances(self, pos, derivative=0):
+        """Electron-electron distance matrix (or its derivatives)
+        see ElectronDistance
+
+        Arguments:
+            pos {torch.tensor} -- positions of the electrons [nbatch, nelec*ndim]
+
+        Keyword Arguments:
+            derivative {int} -- order of the derivative (default: {0})
+
+        Returns:
+            torch.tensor -- distance matrix [nbatch, (ndim,) nelec, nelec]
+        """
+        return self._memo(('ee_distances', derivative), pos,
+                          lambda: self.edist(pos, derivative))
+
+    def ee_pair_distances(self, pos):
+        """Distances of the unique electron pairs i<j
+
+        Arguments:
+            pos {torch.tensor} -- positions of the electrons [nbatch, nelec*ndim]
+
+        Returns:
+            torch.tensor -- distances [nbatch, npairs]
+        """
+        def func():
+            xyz = pos.view(-1, self.nelec, self.ndim)
+            vect = xyz[:, self.index_pairs[0], :] - \
+                xyz[:, self.index_pairs[1], :]
+            return torch.sqrt((vect**2).sum(-1))
+        return self._memo(('ee_pair_distances',), pos, func)
+
+    def ee_pair_inverse(self, pos):
+        """Inverse distances of the unique electron pairs i<j
+
+        Arguments:
+            pos {torch.tensor} -- positions of the electrons [nbatch, nelec*ndim]
+
+        Returns:
+            torch.tensor -- inverse distances [nbatch, npairs]
+        """
+        return self._memo(('ee_pair_inverse',), pos,
+                          lambda: 1. / self.ee_pair_distances(pos))
+
+    def clear(self):
+        """Remove the stored quantities."""
+        self.pos = None
+        self.data = {}
+
+    @staticmethod
+    def _atom_key(atom_coords):
+        """Identify the state of the atomic positions."""
+        return (id(atom_coords), atom_coords._version)
+
+    def _memo(self, name, pos, func):
+        """Return the stored value of name for pos or compute it.
+
+        Arguments:
+            name {tuple} -- name of the quantity
+            pos {torch.tensor} -- positions of the electrons
+            func {callable} -- function computing the quantity
+
+        Returns:
+            torch.tensor -- value of the quantity
+        """
+
+        if self.depth == 0 or pos is not self.pos:
+            return func()
+
+        if name not in self.data:
+            self.data[name] = func()
+        return self.data[name]
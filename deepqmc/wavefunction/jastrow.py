@@ -46,12 +46,22 @@ class TwoBodyJastrowFactor(nn.Module):
 
         self.edist = ElectronDistance(self.nelec, self.ndim)
 
+        # unique pairs i<j (upper triangle)
+        self.index_pairs = torch.triu_indices(self.nelec, self.nelec, 1)
+        self.lower_mask = torch.tril(
+            torch.ones(self.nelec, self.nelec)) == 1
+
+        # shared e-e distances (see Geometry) and
+        # cache of the e-e distances (see Orbital.use_stage_cache)
+        self.geom = None
+        self.stage_cache = None
+
     def _to_device(self):
         """Export the non parameter variable to the device."""
 
         self.device = torch.device('cuda')
         self.to(self.device)
-        attrs = ['static_weight']
+        attrs = ['static_weight', 'index_pairs', 'lower_mask']
         for at in attrs:
             self.__dict__[at] = self.__dict__[at].to(self.device)
 
@@ -80,7 +90,7 @@ class TwoBodyJastrowFactor(nn.Module):
 
         size = pos.shape
         assert size[1] == self.nelec * self.ndim
-        r = self.edist(pos)
+        r = self._get_distance(pos)
         jast = self._get_jastrow_elements(r)
 
         if derivative == 0:
@@ -88,14 +98,33 @@ class TwoBodyJastrowFactor(nn.Module):
             return self._prod_unique_pairs(jast)
 
         elif derivative == 1:
-            dr = self.edist(pos, derivative=1)
+            dr = self._get_distance(pos, derivative=1)
             return self._jastrow_derivative(r, dr, jast, jacobian)
 
         elif derivative == 2:
-            dr = self.edist(pos, derivative=1)
-            d2r = self.edist(pos, derivative=2)
+            dr = self._get_distance(pos, derivative=1)
+            d2r = self._get_distance(pos, derivative=2)
             return self._jastrow_second_derivative(r, dr, d2r, jast)
 
+    def _get_distance(self, pos, derivative=0):
+        """Get the e-e distances (or derivative), from the cache if possible
+
+        Args:
+            pos (torch.tensor): Positions of the electrons
+            derivative (int, optional): order of the derivative. Defaults to 0.
+
+        Returns:
+            torch.tensor: distance (or derivative) matrix
+        """
+        def func():
+            if self.geom is None:
+                return self.edist(pos, derivative)
+            return self.geom.ee_distances(pos, derivative)
+
+        if self.stage_cache is None:
+            return func()
+        return self.stage_cache.get(('edist', derivative), pos, func)
+
     def _jastrow_derivative(self, r, dr, jast, jacobian):
         """Compute the value of the derivative of the Jastrow factor
 
@@ -289,18 +318,18 @@ class TwoBodyJastrowFactor(nn.Module):
             torch.tensor : value of the product
         """
 
-        mat_cpy = mat.clone()
         if not_el is not None:
 
+            mat = mat.clone()
             if not isinstance(not_el, list):
                 not_el = [not_el]
 
             for _el in not_el:
                 i, j = _el
-                mat_cpy[..., i, j] = 1
+                mat[..., i, j] = 1
 
-        return mat_cpy[..., torch.tril(torch.ones(
-            self.nelec, self.nelec)) == 0].prod(1).view(-1, 1)
+        return mat[..., self.index_pairs[0],
+                   self.index_pairs[1]].prod(1).view(-1, 1)
 
     def _sum_unique_pairs(self, mat, axis=None):
         """Sum the unique pairs of the lower triangluar matrix
@@ -313,9 +342,7 @@ class TwoBodyJastrowFactor(nn.Module):
             torch.tensor:
         """
 
-        mat_cpy = mat.clone()
-        mat_cpy[..., torch.tril(torch.ones(
-            self.nelec, self.nelec)) == 1] = 0
+        mat_cpy = mat.masked_fill(self.lower_mask, 0)
 
         if axis is None:
             return mat_cpy.sum()
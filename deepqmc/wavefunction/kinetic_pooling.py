@@ -1,7 +1,11 @@
 import torch
 from torch import nn
+from torch.autograd import Function
 
 from deepqmc.wavefunction.orbital_projector import OrbitalProjector
+from deepqmc.wavefunction.slater_pooling import (batch_det_inverse,
+                                                 batch_adjugate,
+                                                 adjugate)
 
 
 def btrace(M):
@@ -12,6 +16,88 @@ def bproj(M, P):
     return P.transpose(1, 2) @ M @ P
 
 
+class BatchDeterminantTrace(Function):
+
+    @staticmethod
+    def forward(ctx, A, B):
+        """Determinants and trace terms of a batch of matrices
+
+        .. math::
+            D = |A| \\
+            K = D tr(A^{-1} B) = tr(adj(A) B)
+
+        K stays finite at the nodes of the determinant.
+
+        Arguments:
+            A {torch.tensor} -- matrices [..., n, n]
+            B {torch.tensor} -- matrices [..., n, n]
+
+        Returns:
+            torch.tensor, torch.tensor -- D and K [...]
+        """
+        det, inv = batch_det_inverse(A)
+        adj, mask = batch_adjugate(A, det, inv)
+        K = (adj.transpose(-1, -2) * B).sum((-1, -2))
+        ctx.save_for_backward(A, B, det, inv, adj, mask)
+        return det, K
+
+    @staticmethod
+    def backward(ctx, grad_det, grad_K):
+        """Analytic gradients reusing the inverse of the forward pass
+
+        .. math::
+            dD/dA = adj(A)^T \\
+            dK/dA = tr(A^{-1} B) adj(A)^T - (adj(A) B A^{-1})^T \\
+            dK/dB = adj(A)^T
+
+        Near singular matrices are differentiated through the adjugate.
+
+        Arguments:
+            grad_det {torch.tensor} -- gradient wrt D [...]
+            grad_K {torch.tensor} -- gradient wrt K [...]
+
+        Returns:
+            torch.tensor, torch.tensor -- gradients wrt A and B
+        """
+
+        A, B, det, inv, adj, mask = ctx.saved_tensors
+
+        # higher order derivatives : differentiable recomputation
+        if torch.is_grad_enabled():
+            det = torch.det(A)
+            K = det * btrace(torch.linalg.solve(A, B))
+            return torch.autograd.grad((det, K), (A, B),
+                                       (grad_det, grad_K),
+                                       create_graph=True,
+                                       allow_unused=True)
+
+        if A.shape[-1] == 0:
+            return torch.zeros_like(A), torch.zeros_like(B)
+
+        adjT = adj.transpose(-1, -2)
+        gd = grad_det[..., None, None]
+        gk = grad_K[..., None, None]
+
+        trace = btrace(inv @ B)[..., None, None]
+        grad_A = (gd + gk * trace) * adjT \
+            - gk * (adj @ B @ inv).transpose(-1, -2)
+        grad_B = gk * adjT
+
+        # near singular matrices
+        if mask.any():
+            with torch.enable_grad():
+                Am = A[mask].detach().requires_grad_()
+                Bm = B[mask].detach().requires_grad_()
+                adj_m = adjugate(Am)
+                K_m = (adj_m.transpose(-1, -2) * Bm).sum((-1, -2))
+                gA_m, gB_m = torch.autograd.grad(K_m, (Am, Bm),
+                                                 grad_K[mask])
+            grad_A[mask] = gd[mask] * adjT[mask] + gA_m
+            grad_B[mask] = gB_m
+
+        return grad_A, grad_B
+
+
 class KineticPooling(nn.Module):
 
     def __init__(self, configs, mol, cuda=False):
@@ -37,8 +123,7 @@ class KineticPooling(nn.Module):
 
         if cuda:
             self.device = torch.device('cuda')
-            self.orb_proj.Pup = self.orb_proj.Pup.to(self.device)
-            self.orb_proj.Pdown = self.orb_proj.Pdown.to(self.device)
+            self.orb_proj.to(self.device)
 
     def forward(self, MO, d2MO, dJdMO=None, d2JMO=None):
         """ Compute the kinetic energy using the trace trick
@@ -63,7 +148,7 @@ class KineticPooling(nn.Module):
             K : T Psi (Nbatch, Ndet)
         """
 
-        # shortcut up/down matrices
+        # up/down matrices of the distinct spin occupations
         Aup, Adown = self.orb_proj.split_orbitals(MO)
         if dJdMO is None and d2JMO is None:
             Bup, Bdown = self.orb_proj.split_orbitals(d2MO)
@@ -71,16 +156,19 @@ class KineticPooling(nn.Module):
             Bup, Bdown = self.orb_proj.split_orbitals(
                 d2MO + 2 * dJdMO + d2JMO)
 
-        # inverse of MO matrices
-        iAup = torch.inverse(Aup)
-        iAdown = torch.inverse(Adown)
+        # determinants and trace terms D tr(A^-1 B)
+        # computed once per distinct spin determinant
+        det_up, Kup = BatchDeterminantTrace.apply(Aup, Bup)
+        det_down, Kdown = BatchDeterminantTrace.apply(Adown, Bdown)
+
+        det_up, det_down = self.orb_proj.expand(det_up, det_down)
+        Kup, Kdown = self.orb_proj.expand(Kup, Kdown)
 
         # determinant product
-        det_prod = torch.det(Aup) * torch.det(Adown)
+        det_prod = det_up * det_down
 
         # kinetic terms
-        kinetic = -0.5 * (btrace(iAup@Bup) +
-                          btrace(iAdown@Bdown)) * det_prod
+        kinetic = -0.5 * (Kup * det_down + Kdown * det_up)
 
         # reshape
         kinetic = kinetic.transpose(0, 1)
@@ -0,0 +1,58 @@
+import numpy as np
+
+
+def cholesky_localization(mo_coeffs, index):
+    """Localize a set of molecular orbitals with the pivoted Cholesky
+    decomposition of their density matrix D = C C^T (Aquilante et al.,
+    J. Chem. Phys. 125, 174101 (2006)).
+
+    The localized orbitals L verify L L^T = C C^T, i.e. L = C U with U
+    orthogonal, so that the Slater determinants containing all these
+    orbitals are unchanged (up to the sign of det(U)).
+
+    Arguments:
+        mo_coeffs {np.ndarray} -- MO coefficients [nao, nmo]
+        index {list} -- indexes of the orbitals to localize
+
+    Returns:
+        np.ndarray -- MO coefficients with localized orbitals [nao, nmo]
+    """
+
+    index = list(index)
+    if len(index) == 0:
+        return mo_coeffs
+
+    C = mo_coeffs[:, index]
+    D = C @ C.T
+    nao, nloc = C.shape
+
+    L = np.zeros((nao, nloc))
+    diag = np.diag(D).copy()
+
+    for j in range(nloc):
+        p = np.argmax(diag)
+        L[:, j] = (D[:, p] - L[:, :j] @ L[p, :j]) / np.sqrt(diag[p])
+        diag -= L[:, j]**2
+
+    out = mo_coeffs.copy()
+    out[:, index] = L
+    return out
+
+
+def common_occupied_orbitals(configs):
+    """Orbitals occupied in all the spin up and spin down
+    determinants of the configurations.
+
+    Arguments:
+        configs {tuple} -- spin up/down configurations
+
+    Returns:
+        list -- sorted indexes of the orbitals
+    """
+
+    occ = None
+    for conf in list(configs[0]) + list(configs[1]):
+        orbs = set(conf.tolist())
+        occ = orbs if occ is None else occ & orbs
+
+    return sorted(occ) if occ is not None else []
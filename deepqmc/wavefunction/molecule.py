@@ -2,10 +2,12 @@ import os
 import math
 import numpy as np
 from mendeleev import element
+from scipy.special import factorial2 as f2, gamma
 
 
 from deepqmc.wavefunction.calculator.adf import CalculatorADF
 from deepqmc.wavefunction.calculator.pyscf import CalculatorPySCF
+from deepqmc.wavefunction.norm_orbital import atomic_orbital_norm
 
 
 class Molecule(object):
@@ -95,6 +97,8 @@ class Molecule(object):
                           'uniform' : all electrons in a box covering the molecule
                           'normal   : all electrons in a shpere covering the molecule
                           'atomic'  : electrons around atoms
+                          'scf'     : electrons drawn from the densities
+                                      of the occupied SCF orbitals
 
         Raises:
             ValueError: if method is not supported
@@ -121,12 +125,83 @@ class Molecule(object):
             domain['atom_num'] = self.atomic_number
             domain['atom_nelec'] = self.atomic_nelec
 
+        elif method == 'scf':
+            domain.update(self.get_orbital_density())
+
         else:
             raise ValueError(
                 'Method to initialize the walkers not recognized')
 
         return domain
 
+    def get_orbital_density(self):
+        """Densities of the occupied SCF orbitals as mixtures that can be
+        sampled exactly. The products of the primitives of an orbital
+        sharing the same center and angular part are radial functions
+        r^(n_p+n_q) exp(-(a_p+a_q) r^m) whose weights are their integrals.
+        Their sum over a group is a square and thus a positive density
+        despite the negative weights. The cross terms between groups are
+        neglected and the angular parts are taken isotropic. The electron
+        i of each spin is assigned to the i-th occupied orbital.
+
+        Returns:
+            dict -- signed weights of the terms for each electron
+                    (orb_weights [nelec, nterm]) and center (orb_coords),
+                    exponent (orb_exp), power of r (orb_power) and radial
+                    type (radial_type) of the terms
+        """
+        basis = self.basis
+        nshells = np.array(basis.nshells)
+        atom = np.repeat(np.arange(len(nshells)), nshells)
+
+        # angular part and total power of r of the primitives
+        if basis.harmonics_type == 'sph':
+            angular = np.stack([basis.bas_l, basis.bas_m], -1)
+            power = np.array(basis.bas_n, dtype=float)
+            ang_norm = np.ones(len(power))
+        else:
+            angular = np.stack([basis.bas_kx, basis.bas_ky, basis.bas_kz], -1)
+            L = angular.sum(-1)
+            power = np.array(basis.bas_kr, dtype=float) + L
+            ang_norm = 4 * np.pi * f2(2 * angular - 1).prod(-1) / \
+                f2(2 * L + 1)
+
+        if hasattr(basis, 'bas_norm'):
+            norm = np.array(basis.bas_norm)
+        else:
+            norm = np.array(atomic_orbital_norm(basis))
+
+        # pairs of primitives with the same center and angular part
+        same = (atom[:, None] == atom[None, :]) & \
+            (angular[:, None] == angular[None, :]).all(-1)
+        ip, iq = np.nonzero(np.triu(same))
+
+        exp = 0.5 * (np.array(basis.bas_exp)[ip] +
+                     np.array(basis.bas_exp)[iq])
+        k = 0.5 * (power[ip] + power[iq])
+
+        # integral of r^(2k+2) exp(-2 exp r^m)
+        if basis.radial_type == 'gto':
+            integral = gamma(k + 1.5) / (2 * (2 * exp)**(k + 1.5))
+        else:
+            integral = gamma(2 * k + 3) / (2 * exp)**(2 * k + 3)
+        integral *= ang_norm[ip] * np.where(ip == iq, 1., 2.)
+
+        # coefficients of the primitives in the occupied mos
+        mos = self.calculator.get_mo_coeffs()
+        occ = list(range(self.nup)) + list(range(self.ndown))
+        coeffs = mos[np.array(basis.index_ctr)][:, occ].T * \
+            np.array(basis.bas_coeffs) * norm
+
+        weights = coeffs[:, ip] * coeffs[:, iq] * integral
+        weights /= weights.sum(1, keepdims=True)
+
+        return {'orb_weights': weights,
+                'orb_coords': np.array(basis.atom_coords_internal)[atom[ip]],
+                'orb_exp': exp,
+                'orb_power': k,
+                'radial_type': basis.radial_type}
+
 
 if __name__ == "__main__":
 
@@ -1,56 +1,180 @@
+import os
+import re
+from itertools import combinations
+from math import comb
+
+import h5py
 import torch
 import numpy as np
 
 
+def rank_combination(occ):
+    """Rank of a set of occupied orbitals among all the sets of the
+    same size, in colexicographic order (i.e. the order of the
+    occupation bit strings, as used by the PySCF CI vectors)
+
+    Args:
+        occ (list): sorted indexes of the occupied orbitals
+
+    Returns:
+        int: rank of the combination
+    """
+    return sum(comb(int(c), i + 1) for i, c in enumerate(occ))
+
+
+def unrank_combination(rank, k):
+    """Occupied orbitals of the combination of a given rank
+    (inverse of rank_combination)
+
+    Args:
+        rank (int): rank of the combination
+        k (int): number of occupied orbitals
+
+    Returns:
+        list: sorted indexes of the occupied orbitals
+    """
+    occ = []
+    for i in range(k, 0, -1):
+        c = i - 1
+        while comb(c + 1, i) <= rank:
+            c += 1
+        rank -= comb(c, i)
+        occ.append(c)
+    return occ[::-1]
+
+
 class OrbitalConfigurations(object):
 
     def __init__(self, mol):
         self.mol = mol
+        self.ci_coeffs = None
 
-    def get_configs(self, configs):
+    def get_configs(self, configs, threshold=0.):
         """Get the configuratio in the CI expansion
 
         Args:
-            configs (str): name of the configs we want
-            mol (mol object): molecule object
+            configs (str): name of the configs we want or name of a
+                           file containing CI coefficients
+            threshold (float): minimum weight of the determinants read
+                               from a file (default: 0.)
 
         Returns:
             tuple(torch.LongTensor,torch.LongTensor): the spin up/spin down
-            electronic confs
+            electronic confs (the confs of a file are sorted by
+            excitation level)
         """
 
-        if isinstance(configs, str):
-            configs = configs.lower()
-
         if isinstance(configs, torch.Tensor):
             return configs
 
-        elif configs == 'ground_state':
-            return self._get_ground_state_config()
+        if os.path.isfile(configs):
+            return self._get_file_config(configs, threshold)
 
-        elif configs.startswith('cas('):
-            nelec, norb = eval(configs.lstrip("cas"))
-            nocc, nvirt = self._get_orb_number(nelec, norb)
-            return self._get_cas_config(nocc, nvirt, nelec)
+        configs = configs.lower()
 
-        elif configs.startswith('single('):
-            nelec, norb = eval(configs.lstrip("single"))
-            nocc, nvirt = self._get_orb_number(nelec, norb)
-            return self._get_single_config(nocc, nvirt)
+        if configs == 'ground_state':
+            return self._get_ground_state_config()
 
-        elif configs.startswith('single_double('):
-            nelec, norb = eval(configs.lstrip("single_double"))
-            nocc, nvirt = self._get_orb_number(nelec, norb)
-            return self._get_single_double_config(nocc, nvirt)
+        match = re.fullmatch(
+            r'(cas|single|single_double)\(\s*(\d+)\s*,\s*(\d+)\s*\)',
+            configs.replace(' ', ''))
 
-        else:
+        if match is None:
             print(configs, " not recognized as valid configuration")
             print('Options are : ground_state')
             print('              single(nelec,norb)')
             print('              single_double(nelec,norb)')
             print('              cas(nelec,norb)')
+            print('              name of a CI coefficients file')
             raise ValueError("Config error")
 
+        name = match.group(1)
+        nelec, norb = int(match.group(2)), int(match.group(3))
+        nocc, nvirt = self._get_orb_number(nelec, norb)
+
+        if name == 'cas':
+            configs = self._get_cas_config(nocc, nvirt, nelec)
+
+        elif name == 'single':
+            configs = self._get_single_config(nocc, nvirt)
+
+        else:
+            configs = self._get_single_double_config(nocc, nvirt)
+
+        return configs
+
+    def excitation_level(self, configs):
+        """Number of electrons excited from the ground state
+
+        Args:
+            configs (tuple): spin up/spin down electronic confs
+
+        Returns:
+            torch.LongTensor: excitation level of each configuration
+        """
+        cup, cdown = configs
+        return (cup >= self.mol.nup).sum(-1) + \
+            (cdown >= self.mol.ndown).sum(-1)
+
+    def sort_by_excitation(self, configs, weights=None):
+        """Sort the configurations by excitation level and then by
+        decreasing weight (stable, the ground state stays first)
+
+        Args:
+            configs (tuple): spin up/spin down electronic confs
+            weights (torch.tensor, optional): weights of the configurations
+
+        Returns:
+            tuple, torch.LongTensor: sorted confs and sorting index
+        """
+        level = self.excitation_level(configs).double()
+        if weights is not None:
+            w = torch.as_tensor(weights).abs().double()
+            level = level + 0.5 * (1. - w / w.max())
+        index = torch.sort(level, stable=True)[1]
+        return (configs[0][index], configs[1][index]), index
+
+    def _get_file_config(self, filename, threshold=0.):
+        """Read the configurations and CI coefficients of a file
+        (see CalculatorPySCF.save_ci_coeffs) keeping the determinants
+        with a weight above the threshold. The CI vector is indexed by
+        the ranks of the spin up/down occupations of the active space.
+
+        Args:
+            filename (str): name of the hdf5 file
+            threshold (float): minimum absolute value of the CI coefficients
+
+        Returns:
+            tuple(torch.LongTensor,torch.LongTensor): the spin up/spin down
+            electronic confs
+        """
+
+        with h5py.File(filename, 'r') as h5:
+            ci = h5['ci_coeffs'][()]
+            ncore = int(h5['ncore'][()])
+            nelec_up = int(h5['nelecas_up'][()])
+            nelec_down = int(h5['nelecas_down'][()])
+
+        # only the selected determinants are decoded
+        iup, idown = np.nonzero(np.abs(ci) >= threshold)
+        if len(iup) == 0:
+            raise ValueError(
+                'No determinant above the threshold %f' % threshold)
+
+        core = list(range(ncore))
+        cup = [core + [ncore + i for i in unrank_combination(int(r), nelec_up)]
+               for r in iup]
+        cdown = [core + [ncore + i for i in
+                         unrank_combination(int(r), nelec_down)]
+                 for r in idown]
+        configs = (torch.LongTensor(cup), torch.LongTensor(cdown))
+
+        weights = torch.as_tensor(ci[iup, idown])
+        configs, index = self.sort_by_excitation(configs, weights)
+        self.ci_coeffs = weights[index]
+
+        return configs
+
     def _get_ground_state_config(self):
         """Return only the ground state configuration
 
@@ -134,33 +258,34 @@ class OrbitalConfigurations(object):
             nocc (int): number of occupied orbitals in the CAS
             nvirt ([type]): number of virt orbitals in the CAS
         """
-        from itertools import combinations, product
 
-        idx_low, idx_high = self.mol.nup - nocc, self.mol.nup + nvirt
-        orb_index_up = range(idx_low, idx_high)
-        idx_frz = list(range(idx_low))
-        _cup = [idx_frz + list(l)
-                for l in list(combinations(orb_index_up, nelec // 2))]
-
-        idx_low, idx_high = self.mol.nup - nocc - 1, self.mol.nup + nvirt - 1
-        orb_index_down = range(idx_low, idx_high)
-        _cdown = [
-            idx_frz +
-            list(l) for l in list(
-                combinations(
-                    orb_index_up,
-                    nelec //
-                    2))]
-
-        confs = list(product(_cup, _cdown))
         cup, cdown = [], []
-
-        for c in confs:
-            cup.append(c[0])
-            cdown.append(c[1])
+        for _cup, _cdown in self.iter_cas_config(nocc, nvirt, nelec):
+            cup.append(_cup)
+            cdown.append(_cdown)
 
         return (torch.LongTensor(cup), torch.LongTensor(cdown))
 
+    def iter_cas_config(self, nocc, nvirt, nelec):
+        """Enumerate the confs of the CAS, spin down fastest
+
+        Args:
+            nocc (int): number of occupied orbitals in the CAS
+            nvirt ([type]): number of virt orbitals in the CAS
+            nelec (int): number of electrons in the CAS
+
+        Yields:
+            list, list: spin up and spin down occupied orbitals
+        """
+
+        idx_low, idx_high = self.mol.nup - nocc, self.mol.nup + nvirt
+        orb_index = range(idx_low, idx_high)
+        idx_frz = list(range(idx_low))
+
+        for _cup in combinations(orb_index, nelec // 2):
+            for _cdown in combinations(orb_index, nelec // 2):
+                yield idx_frz + list(_cup), idx_frz + list(_cdown)
+
     def _get_orb_number(self, nelec, norb):
         """compute the number of occupied and virtual orbital
         __ PER SPIN __
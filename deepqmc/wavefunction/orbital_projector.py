@@ -17,37 +17,89 @@ class OrbitalProjector(object):
         self.nup = mol.nup
         self.ndown = mol.ndown
 
+        self.unique_up, self.index_up = self.get_unique_configs(
+            self.configs[0])
+        self.unique_down, self.index_down = self.get_unique_configs(
+            self.configs[1])
+
         self.Pup, self.Pdown = self.get_projectors()
 
+    @staticmethod
+    def get_unique_configs(configs):
+        """Get the distinct occupations of one spin channel.
+
+        In CAS or product expansions the same spin up (down) determinant
+        appears in many configurations. Only the distinct ones are computed
+        and mapped back to the configurations.
+
+        Arguments:
+            configs {torch.LongTensor} -- occupations [nconfs, nelec_spin]
+
+        Returns:
+            torch.LongTensor, torch.LongTensor -- unique occupations [nunique, nelec_spin]
+                                                  and index of each config [nconfs]
+        """
+        configs = torch.as_tensor(configs)
+        if configs.shape[-1] == 0:
+            return configs[:1], torch.zeros(
+                configs.shape[0], dtype=torch.long)
+        return torch.unique(configs, dim=0, return_inverse=True)
+
     def get_projectors(self):
-        """Get the projectors of the conf in the CI expansion
+        """Get the projectors of the distinct spin up/down
+        occupations of the CI expansion
 
         Returns:
             torch.tensor, torch.tensor : projectors
         """
 
-        Pup = torch.zeros(self.nconfs, self.nmo, self.nup)
-        Pdown = torch.zeros(self.nconfs, self.nmo, self.ndown)
-
-        for ic, (cup, cdown) in enumerate(
-                zip(self.configs[0], self.configs[1])):
+        Pup = torch.zeros(len(self.unique_up), self.nmo, self.nup)
+        Pdown = torch.zeros(len(self.unique_down), self.nmo, self.ndown)
 
+        for ic, cup in enumerate(self.unique_up):
             for _id, imo in enumerate(cup):
                 Pup[ic][imo, _id] = 1.
 
+        for ic, cdown in enumerate(self.unique_down):
             for _id, imo in enumerate(cdown):
                 Pdown[ic][imo, _id] = 1.
 
         return Pup.unsqueeze(1), Pdown.unsqueeze(1)
 
+    def to(self, device):
+        """Move the projectors and index maps to a device
+
+        Arguments:
+            device {torch.device} -- device
+        """
+        self.Pup = self.Pup.to(device)
+        self.Pdown = self.Pdown.to(device)
+        self.index_up = self.index_up.to(device)
+        self.index_down = self.index_down.to(device)
+
     def split_orbitals(self, mo):
-        """Split the orbital  matrix in multiple slater matrices
+        """Split the orbital matrix in the slater matrices of the
+        distinct spin up/down occupations
 
         Arguments:
             mo {torch.tensor} -- molecular orbital matrix
 
         Returns:
-            torch.tensor -- all slater matrices
+            torch.tensor -- slater matrices [nunique_up/down, nbatch, nup/ndown, nup/ndown]
         """
         return mo[:, :self.nup, :] @ self.Pup, mo[:,
                                                   self.nup:, :] @ self.Pdown
+
+    def expand(self, up, down):
+        """Map quantities of the distinct spin up/down determinants
+        on the configurations
+
+        Arguments:
+            up {torch.tensor} -- spin up quantities [nunique_up, ...]
+            down {torch.tensor} -- spin down quantities [nunique_down, ...]
+
+        Returns:
+            torch.tensor, torch.tensor -- quantities of each configuration [nconfs, ...]
+        """
+        return up.index_select(0, self.index_up), \
+            down.index_select(0, self.index_down)
@@ -1,9 +1,146 @@
 
 import torch
 from torch import nn
-from torch.autograd import Variable
+from torch.autograd import Variable, Function
 
 from deepqmc.wavefunction.orbital_projector import OrbitalProjector
+from deepqmc.utils.small_matrix import (det_inverse_logdet,
+                                        adjugate_closed_form)
+
+
+def batch_det_inverse(A):
+    """Determinants and inverses of a batch of matrices computed in one
+    pass with the kernel adapted to the size of the matrices.
+
+    Arguments:
+        A {torch.tensor} -- matrices [..., n, n]
+
+    Returns:
+        torch.tensor, torch.tensor -- determinants [...] and inverses [..., n, n]
+    """
+    det, inv, _ = det_inverse_logdet(A)
+    return det, inv
+
+
+def near_singular(A, inv):
+    """Flag the matrices whose inverse can not be trusted, using the
+    reciprocal condition number estimate 1/(|A|_1 |A^-1|_1).
+
+    Arguments:
+        A {torch.tensor} -- matrices [..., n, n]
+        inv {torch.tensor} -- inverses [..., n, n]
+
+    Returns:
+        torch.tensor -- boolean mask [...]
+    """
+    eps = torch.finfo(A.dtype).eps
+    norm_A = A.abs().sum(-2).max(-1)[0]
+    norm_inv = inv.abs().sum(-2).max(-1)[0]
+    finite = torch.isfinite(inv).all(-1).all(-1)
+    return ~finite | (norm_A * norm_inv * eps > 1E-3)
+
+
+def svd_adjugate(A):
+    """Adjugate matrices computed from the SVD, well defined
+    (and differentiable) for singular matrices.
+
+    adj(A) = det(U V^T) V diag(prod_{j!=i} s_j) U^T
+
+    Arguments:
+        A {torch.tensor} -- matrices [..., n, n]
+
+    Returns:
+        torch.tensor -- adjugate matrices [..., n, n]
+    """
+    n = A.shape[-1]
+    U, S, Vh = torch.linalg.svd(A)
+    Sp = S.unsqueeze(-2).repeat_interleave(n, dim=-2)
+    Sp = Sp + torch.diag_embed(1. - S)
+    Sp = Sp.prod(-1)
+    sign = torch.linalg.det(U) * torch.linalg.det(Vh)
+    return sign[..., None, None] * \
+        (Vh.transpose(-1, -2) * Sp.unsqueeze(-2)) @ U.transpose(-1, -2)
+
+
+def batch_adjugate(A, det, inv):
+    """Adjugate matrices det(A) A^-1, using the cofactor formulas (n <= 3)
+    or the SVD for the matrices close to singular.
+
+    Arguments:
+        A {torch.tensor} -- matrices [..., n, n]
+        det {torch.tensor} -- determinants [...]
+        inv {torch.tensor} -- inverses [..., n, n]
+
+    Returns:
+        torch.tensor, torch.tensor -- adjugate matrices [..., n, n] and
+                                      mask of the near singular matrices
+    """
+    mask = near_singular(A, inv)
+
+    # exact cofactor formulas for small matrices
+    if 0 < A.shape[-1] <= 3:
+        return adjugate_closed_form(A)[0], mask
+
+    adj = det[..., None, None] * inv
+    if mask.any():
+        adj[mask] = svd_adjugate(A[mask])
+    return adj, mask
+
+
+def adjugate(A):
+    """Differentiable adjugate matrices, also for singular matrices.
+
+    Arguments:
+        A {torch.tensor} -- matrices [..., n, n]
+
+    Returns:
+        torch.tensor -- adjugate matrices [..., n, n]
+    """
+    if A.shape[-1] <= 3:
+        return adjugate_closed_form(A)[0]
+    return svd_adjugate(A)
+
+
+class BatchDeterminant(Function):
+
+    @staticmethod
+    def forward(ctx, A):
+        """Determinants of a batch of matrices.
+
+        Arguments:
+            A {torch.tensor} -- matrices [..., n, n]
+
+        Returns:
+            torch.tensor -- determinants [...]
+        """
+        det, inv = batch_det_inverse(A)
+        ctx.save_for_backward(A, det, inv)
+        return det
+
+    @staticmethod
+    def backward(ctx, grad_det):
+        """Gradient d det(A) / dA = adj(A)^T reusing the inverse
+        of the forward pass.
+
+        Arguments:
+            grad_det {torch.tensor} -- gradient wrt the determinants [...]
+
+        Returns:
+            torch.tensor -- gradient wrt the matrices [..., n, n]
+        """
+
+        A, det, inv = ctx.saved_tensors
+
+        # higher order derivatives : differentiable recomputation
+        if torch.is_grad_enabled():
+            return torch.autograd.grad(torch.det(A), A, grad_det,
+                                       create_graph=True)[0]
+
+        if A.shape[-1] == 0:
+            return torch.zeros_like(A)
+
+        adj, _ = batch_adjugate(A, det, inv)
+        return grad_det[..., None, None] * adj.transpose(-1, -2)
 
 
 class SlaterPooling(nn.Module):
@@ -33,8 +170,7 @@ class SlaterPooling(nn.Module):
 
         if cuda:
             self.device = torch.device('cuda')
-            self.orb_proj.Pup = self.orb_proj.Pup.to(self.device)
-            self.orb_proj.Pdown = self.orb_proj.Pdown.to(self.device)
+            self.orb_proj.to(self.device)
 
     def forward(self, input, return_matrix=False):
         """Computes the SD values
@@ -49,13 +185,15 @@ class SlaterPooling(nn.Module):
             torch.tensor -- slater matrices or determinant depending on return_matrix
         """
 
+        # slater matrices of the distinct spin up/down occupations
         mo_up, mo_down = self.orb_proj.split_orbitals(input)
         if return_matrix:
-            return mo_up, mo_down
-        else:
-            return (
-                torch.det(mo_up) *
-                torch.det(mo_down)).transpose(0, 1)
+            return self.orb_proj.expand(mo_up, mo_down)
+
+        det_up, det_down = self.orb_proj.expand(
+            BatchDeterminant.apply(mo_up),
+            BatchDeterminant.apply(mo_down))
+        return (det_up * det_down).transpose(0, 1)
 
 
 if __name__ == "__main__":
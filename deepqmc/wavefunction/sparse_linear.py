@@ -0,0 +1,78 @@
+from torch import nn
+
+
+class SparseLinear(nn.Module):
+
+    def __init__(self, weight, threshold=1E-6, max_density=0.1):
+        """Linear layer without bias using a thresholded sparse (CSR) copy
+        of a frozen weight matrix.
+
+        Arguments:
+            weight {torch.tensor} -- weight matrix [nout, nin]
+
+        Keyword Arguments:
+            threshold {float} -- coefficients smaller than threshold
+                                 (in absolute value) are set to 0 (default: {1E-6})
+            max_density {float} -- use a dense product if the fraction of non
+                                   zero coefficients is larger (default: {0.1})
+        """
+
+        super(SparseLinear, self).__init__()
+
+        self.threshold = threshold
+        self.max_density = max_density
+        self.out_features, self.in_features = weight.shape
+
+        w = weight.detach().clone()
+        w[w.abs() < threshold] = 0.
+        self.weight = nn.Parameter(w)
+        self.weight.requires_grad = False
+
+        self._sparse = None
+        self._version = None
+
+    @property
+    def density(self):
+        """Fraction of non zero coefficients."""
+        return self.get_sparse_weight()._nnz() / self.weight.numel()
+
+    def get_sparse_weight(self):
+        """Sparse copy of the weight, rebuilt if the weight has changed.
+
+        Returns:
+            torch.tensor -- sparse weight matrix [nout, nin]
+        """
+
+        version = (self.weight.data_ptr(), self.weight._version)
+        if self._sparse is None or version != self._version:
+            w = self.weight.detach()
+            w = w * (w.abs() >= self.threshold)
+            self._sparse = w.to_sparse_csr()
+            self._version = version
+        return self._sparse
+
+    def clear_cache(self):
+        """Remove the sparse copy of the weight."""
+        self._sparse = None
+        self._version = None
+
+    def forward(self, input):
+        """Apply the layer on the last dimension of the input.
+
+        Arguments:
+            input {torch.tensor} -- input [..., nin]
+
+        Returns:
+            torch.tensor -- output [..., nout]
+        """
+
+        if self.weight.requires_grad:
+            raise ValueError('SparseLinear only supports frozen weights')
+
+        if self.density > self.max_density:
+            return nn.functional.linear(input, self.weight)
+
+        shape = input.shape[:-1]
+        x = input.reshape(-1, self.in_features).t().contiguous()
+        out = self.get_sparse_weight() @ x
+        return out.t().reshape(*shape, self.out_features)
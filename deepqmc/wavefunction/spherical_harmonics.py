@@ -15,13 +15,14 @@ class Harmonics(object):
         if self.type == 'sph':
             self.bas_l = torch.tensor(kwargs['bas_l'])
             self.bas_m = torch.tensor(kwargs['bas_m'])
+            self.index_lm = get_index_lm(self.bas_l, self.bas_m)
 
         elif self.type == 'cart':
             self.bas_kx = torch.tensor(kwargs['bas_kx'])
             self.bas_ky = torch.tensor(kwargs['bas_ky'])
             self.bas_kz = torch.tensor(kwargs['bas_kz'])
 
-    def __call__(self, xyz, derivative=0, jacobian=True):
+    def __call__(self, xyz, derivative=0, jacobian=True, workspace=None):
         """Computes the cartesian or spherical harmonics
 
         Arguments:
@@ -30,6 +31,7 @@ class Harmonics(object):
         Keyword Arguments:
             derivative {int} -- order of the derivative (default: {0})
             jacobian {bool} -- return the sum of th derivative if true and grad if False (default: {True})
+            workspace {Workspace} -- buffers for the outputs (default: {None})
 
         Raises:
             ValueError: of type is unrecognized
@@ -48,7 +50,8 @@ class Harmonics(object):
                 jacobian)
         elif self.type == 'sph':
             return SphericalHarmonics(
-                xyz, self.bas_l, self.bas_m, derivative, jacobian)
+                xyz, self.bas_l, self.bas_m, derivative, jacobian,
+                workspace, self.index_lm)
         else:
             raise ValueError('Harmonics type should be cart or sph')
 
@@ -115,122 +118,121 @@ def CartesianHarmonics(xyz, kx, ky, kz, derivative=0, jacobian=True):
         return d2x + d2y + d2z
 
 
-def SphericalHarmonics(xyz, l, m, derivative=0, jacobian=True):
+def SphericalHarmonics(xyz, l, m, derivative=0, jacobian=True,
+                       workspace=None, index_lm=None):
     """Compute the Real Spherical Harmonics of the AO.
     Args:
         xyz : array (Nbatch,Nelec,Nrbf,Ndim) x,y,z, distance component of each
               point from each RBF center
         l : array(Nrbf) l quantum number
         m : array(Nrbf) m quantum number
+        workspace : Workspace for the output (optional)
+        index_lm : precomputed output of get_index_lm(l, m) (optional)
     Returns:
         Y array (Nbatch,Nelec,Nrbf) : value of each SH at each point
         or array (Nbatch,Nelec,Nrbf, Ndim) : grad of each SH at each point (if jacobian=False)
     """
 
+    if index_lm is None:
+        index_lm = get_index_lm(l, m)
+
     if jacobian:
-        return get_spherical_harmonics(xyz, l, m, derivative)
+        return get_spherical_harmonics(xyz, l, m, derivative, workspace,
+                                       index_lm)
     else:
         if derivative != 1:
             raise ValueError(
                 'Gradient of the spherical harmonics require derivative=1')
-        return get_grad_spherical_harmonics(xyz, l, m)
+        return get_grad_spherical_harmonics(xyz, l, m, workspace, index_lm)
 
 
-def get_spherical_harmonics(xyz, l, m, derivative):
+def get_index_lm(l, m):
+    """Group the RBF with the same quantum numbers.
+    Args:
+        l : array(Nrbf) l quantum number
+        m : array(Nrbf) m quantum number
+    Returns:
+        list of (l, m, index) : RBF indexes of each pair of quantum numbers
+    """
+    index_lm = []
+    for lval in range(int(l.max()) + 1 if len(l) > 0 else 0):
+        if lval > 3:
+            raise ValueError(
+                'Spherical harmonics are only implemented up to l=3')
+        for mval in range(-lval, lval + 1):
+            ind = ((l == lval) & (m == mval)).nonzero().view(-1)
+            if len(ind) > 0:
+                index_lm.append((lval, mval, ind))
+    return index_lm
+
+
+def get_spherical_harmonics(xyz, l, m, derivative, workspace=None,
+                            index_lm=None):
     """Compute the Real Spherical Harmonics of the AO.
     Args:
         xyz : array (Nbatch,Nelec,Nrbf,Ndim) x,y,z, distance component of each
               point from each RBF center
         l : array(Nrbf) l quantum number
         m : array(Nrbf) m quantum number
+        workspace : Workspace for the output (optional)
+        index_lm : precomputed output of get_index_lm(l, m) (optional)
     Returns:
         Y array (Nbatch,Nelec,Nrbf) : value of each SH at each point
     """
 
-    Y = torch.zeros_like(xyz[..., 0])
+    if workspace is None:
+        Y = torch.zeros_like(xyz[..., 0])
+    else:
+        Y = workspace.zeros(('sph', derivative), xyz.shape[:-1],
+                            xyz.dtype, xyz.device)
 
-    # l=0
-    ind = (l == 0).nonzero().view(-1)
-    if derivative == 0:
-        Y[:, :, ind] = _spherical_harmonics_l0(xyz[:, :, ind, :])
-    if derivative == 1:
-        Y[:, :, ind] = _nabla_spherical_harmonics_l0(
-            xyz[:, :, ind, :])
-
-    # l=1
-    indl = (l == 1)
-    if torch.any(indl):
-        for mval in [-1, 0, 1]:
-            indm = (m == mval)
-            ind = (indl * indm).nonzero().view(-1)
-            if len(ind > 0):
-                if derivative == 0:
-                    Y[:, :, ind] = _spherical_harmonics_l1(
-                        xyz[:, :, ind, :], mval)
-                if derivative == 1:
-                    Y[:, :, ind] = _nabla_spherical_harmonics_l1(
-                        xyz[:, :, ind, :], mval)
-                if derivative == 2:
-                    Y[:, :, ind] = _lap_spherical_harmonics_l1(
-                        xyz[:, :, ind, :], mval)
-
-    # l=2
-    indl = (l == 2)
-    if torch.any(indl):
-        for mval in [-2, -1, 0, 1, 2]:
-            indm = (m == mval)
-            ind = (indl * indm).nonzero().view(-1)
-            if len(ind > 0):
-                if derivative == 0:
-                    Y[:, :, ind] = _spherical_harmonics_l2(
-                        xyz[:, :, ind, :], mval)
-                if derivative == 1:
-                    Y[:, :, ind] = _nabla_spherical_harmonics_l2(
-                        xyz[:, :, ind, :], mval)
-                if derivative == 2:
-                    Y[:, :, ind] = _lap_spherical_harmonics_l2(
-                        xyz[:, :, ind, :], mval)
+    if index_lm is None:
+        index_lm = get_index_lm(l, m)
+
+    func = {0: _spherical_harmonics,
+            1: _nabla_spherical_harmonics,
+            2: _lap_spherical_harmonics}[derivative]
+    for lval, mval, ind in index_lm:
+
+        # l=0 (the derivatives of Y00 are null)
+        if lval == 0:
+            if derivative == 0:
+                Y[:, :, ind] = 0.2820948
+
+        else:
+            Y[:, :, ind] = func[lval](xyz[:, :, ind, :], mval)
 
     return Y
 
 
-def get_grad_spherical_harmonics(xyz, l, m):
+def get_grad_spherical_harmonics(xyz, l, m, workspace=None,
+                                 index_lm=None):
     """Compute the gradient of the Real Spherical Harmonics of the AO.
     Args:
         xyz : array (Nbatch,Nelec,Nrbf,Ndim) x,y,z, distance component of each
               point from each RBF center
         l : array(Nrbf) l quantum number
         m : array(Nrbf) m quantum number
+        workspace : Workspace for the output (optional)
+        index_lm : precomputed output of get_index_lm(l, m) (optional)
     Returns:
         Y array (Nbatch,Nelec,Nrbf,3) : value of each grad SH at each point
     """
 
-    Y = torch.zeros_like(xyz)
-
-    # l=0
-    ind = (l == 0).nonzero().view(-1)
-    Y[:, :, ind, :] = _grad_spherical_harmonics_l0(xyz[:, :, ind, :])
-
-    # l=1
-    indl = (l == 1)
-    if torch.any(indl):
-        for mval in [-1, 0, 1]:
-            indm = (m == mval)
-            ind = (indl * indm).nonzero().view(-1)
-            if len(ind > 0):
-                # _tmp = _grad_spherical_harmonics_l1(xyz[:, :, ind, :], mval)
-                Y[:, :, ind, :] = _grad_spherical_harmonics_l1(
-                    xyz[:, :, ind, :], mval)
-
-    # l=2
-    indl = (l == 2)
-    if torch.any(indl):
-        for mval in [-2, -1, 0, 1, 2]:
-            indm = (m == mval)
-            ind = (indl * indm).nonzero().view(-1)
-            if len(ind > 0):
-                Y[:, :, ind, :] = _grad_spherical_harmonics_l2(
-                    xyz[:, :, ind, :], mval)
+    if workspace is None:
+        Y = torch.zeros_like(xyz)
+    else:
+        Y = workspace.zeros(('sph', 'grad'), xyz.shape,
+                            xyz.dtype, xyz.device)
+
+    if index_lm is None:
+        index_lm = get_index_lm(l, m)
+
+    # l>0 (the gradient of Y00 is null)
+    for lval, mval, ind in index_lm:
+        if lval > 0:
+            Y[:, :, ind, :] = _grad_spherical_harmonics[lval](
+                xyz[:, :, ind, :], mval)
 
     return Y
 
@@ -401,125 +403,175 @@ def _nabla_spherical_harmonics_l2(xyz, m):
         xyz : array (Nbatch,Nelec,Nrbf,Ndim) x,y,z, of (Point - Center)
         m : second quantum number (-2,-1,0,1,2)
     Returns
-        Y2-2 = 1/2\sqrt(15/\pi) (x+y)/r^2 - 2 * xy (x+y+z)/r^3
-        Y2-1 = 1/2\sqrt(15/\pi) (y+z)/r^2 - 2 * yz (x+y+z)/r^3
-        Y20  = 1/4\sqrt(5/\pi) ( (-2x-2y+4z)/r^2 - 2 *(-xx - yy + 2zz) * (x+y+z)/r3 )
-        Y21  = 1/2\sqrt(15/\pi) (x+z)/r^2 - 2 * xz (x+y+z)/r^3
-        Y22  = 1/4\sqrt(15/\pi)  ( 2(x-y)/r^2 - 2 *(xx-yy)(x+y+z)/r^3  )
+        \nabla Y2m = \sum_i d/dx_i Y2m (see _grad_spherical_harmonics_l2)
     """
+    return _grad_spherical_harmonics_l2(xyz, m).sum(-1)
 
-    r = torch.sqrt((xyz**2).sum(3))
-    r2 = r**2
-    r3 = r**3
 
-    if m == 0:
-        c0 = 0.31539156525252005
-        return c0 * ((- 2 * xyz[:, :, :, 0] - 2 * xyz[:, :, :, 1] + 4 * xyz[:, :, :, 2]) / r2
-                      - 2 * (-xyz[:, :, :, 0]**2 - xyz[:, :, :, 1]**2 + 2 * xyz[:, :, :, 2]**2) * xyz.sum(3) / r3)
-    if m == 2:
-        c2 = 0.5462742152960396
-        return c2 * (2 * (xyz[:, :, :, 0] - xyz[:, :, :, 1]) / r2 - 2 * (xyz[:, :, :, 0]**2
-                     - xyz[:, :, :, 1]**2) * xyz.sum(3) / r3)
-    else:
-        cm = 1.0925484305920792
-        index = {-2: [0, 1], -1: [1, 2], 1: [2, 0]}
-        return cm * ((xyz[:, :, :, index[m][0]] + xyz[:, :, :, index[m][1]]) / r2
-                   - 2 * xyz[:, :, :, index[m][0]] * xyz[:, :, :, index[m][1]] * xyz.sum(3) / r3)
+def _grad_spherical_harmonics_l2(xyz, m):
+    """Compute the gradient of l=2 Spherical Harmonics
+    Args:
+        xyz : array (Nbatch,Nelec,Nrbf,Ndim) x,y,z, of (Point - Center)
+        m : second quantum number (-2,-1,0,1,2)
+    Returns
+        \nabla Y2m = c (\nabla f / r^2 - 2 f [x,y,z] / r^4)
+        with Y2m = c f / r^2 (see _spherical_harmonics_l2)
+    """
+    return _grad_solid_harmonics(xyz, 2, m)
 
 
-def _grad_spherical_harmonics_l2(xyz, m):
-    """Compute the nabla of l=2 Spherical Harmonics
+def _lap_spherical_harmonics_l2(xyz, m):
+    """Compute the laplacian of l=2 Spherical Harmonics
     Args:
         xyz : array (Nbatch,Nelec,Nrbf,Ndim) x,y,z, of (Point - Center)
         m : second quantum number (-2,-1,0,1,2)
+    Returns
+        \nabla^2 Y2m = -6 Y2m / r^2
+    """
+    return -6 * _spherical_harmonics_l2(xyz, m) / (xyz**2).sum(-1)
+
+# =============== L3
 
+
+def _spherical_harmonics_l3(xyz, m):
+    """Compute the l=3 Spherical Harmonics
+    Args:
+        xyz : array (Nbatch,Nelec,Nrbf,Ndim) x,y,z, of (Point - Center)
+        m : second quantum number (-3,-2,-1,0,1,2,3)
     Returns
-        Y2-2 = 1/2 \sqrt(15/\pi) 1./r4 ([y(-xx+yy+zz, x(-yy+xx+zz,-2xyz))])
-        Y2-1 = 1/2 \sqrt(15/\pi)
-        Y20  = 1/4 \sqrt(5/\pi)
-        Y21  = 1/2 \sqrt(15/\pi)
-        Y22  = 1/4 \sqrt(15/\pi)
+        Y3-3 = 1/4\sqrt(35/(2\pi)) y(3x^2-y^2)/r^3
+        Y3-2 = 1/2\sqrt(105/\pi) xyz/r^3
+        Y3-1 = 1/4\sqrt(21/(2\pi)) y(4z^2-x^2-y^2)/r^3
+        Y30  = 1/4\sqrt(7/\pi) z(2z^2-3x^2-3y^2)/r^3
+        Y31  = 1/4\sqrt(21/(2\pi)) x(4z^2-x^2-y^2)/r^3
+        Y32  = 1/4\sqrt(105/\pi) z(x^2-y^2)/r^3
+        Y33  = 1/4\sqrt(35/(2\pi)) x(x^2-3y^2)/r^3
     """
+    c, f, _ = _harmonic_polynomial(xyz, 3, m)
+    return c * f / (xyz**2).sum(-1)**1.5
 
-    r = torch.sqrt((xyz**2).sum(3))
-    r4 = r**4
 
-    x = xyz[:, :, :, 0]
-    y = xyz[:, :, :, 1]
-    z = xyz[:, :, :, 2]
+def _nabla_spherical_harmonics_l3(xyz, m):
+    """Compute the nabla of l=3 Spherical Harmonics
+    Args:
+        xyz : array (Nbatch,Nelec,Nrbf,Ndim) x,y,z, of (Point - Center)
+        m : second quantum number (-3,-2,-1,0,1,2,3)
+    Returns
+        \nabla Y3m = \sum_i d/dx_i Y3m (see _grad_spherical_harmonics_l3)
+    """
+    return _grad_spherical_harmonics_l3(xyz, m).sum(-1)
 
-    if m == -2:
-        c0 = 0.31539156525252005
-        p = (c0 / r4).unsqueeze(-1)
-        return p * (torch.stack([y * (-x**2 + y**2 + z**2),
-                                 x * (-y**2 + x**2 + z**2),
-                                 -2 * xyz.prod(-1)],
-                                dim=-1))
-    if m == -1:
-        c0 = 0.31539156525252005
-        p = (c0 / r4).unsqueeze(-1)
-        return p * (torch.stack([-2 * xyz.prod(-1),
-                                 z * (-y**2 + x**2 + z**2),
-                                 y * (-z**2 + x**2 + y**2)],
-                                dim=-1))
-    if m == 0:
-        c0 = 0.31539156525252005
-        p = (c0 / r4).unsqueeze(-1)
-        return p * (torch.stack([-6 * x * z * z,
-                                 -6 * y * z * z,
-                                 6 * x * x * z + 6 * y * y * z],
-                                dim=-1))
 
-    if m == 1:
-        c0 = 0.31539156525252005
-        p = (c0 / r4).unsqueeze(-1)
-        return p * (torch.stack([z * (-x * x + y * y + z * z),
-                                 -2 * xyz.prod(-1),
-                                 x * (x * x + y * y - z * z)],
-                                dim=-1))
-    if m == 2:
-        c0 = 0.5462742152960396
-        p = (c0 / r4).unsqueeze(-1)
-        return p * (torch.stack([4 * x * y * y + 2 * x * z * z,
-                                 -4 * x * x * y - 2 * y * z * z,
-                                 -2 * z * (x * x - y * y)],
-                                dim=-1))
+def _grad_spherical_harmonics_l3(xyz, m):
+    """Compute the gradient of l=3 Spherical Harmonics
+    Args:
+        xyz : array (Nbatch,Nelec,Nrbf,Ndim) x,y,z, of (Point - Center)
+        m : second quantum number (-3,-2,-1,0,1,2,3)
+    Returns
+        \nabla Y3m = c (\nabla f / r^3 - 3 f [x,y,z] / r^5)
+        with Y3m = c f / r^3 (see _spherical_harmonics_l3)
+    """
+    return _grad_solid_harmonics(xyz, 3, m)
 
 
-def _lap_spherical_harmonics_l2(xyz, m):
-    """Compute the nabla of l=2 Spherical Harmonics
+def _lap_spherical_harmonics_l3(xyz, m):
+    """Compute the laplacian of l=3 Spherical Harmonics
     Args:
         xyz : array (Nbatch,Nelec,Nrbf,Ndim) x,y,z, of (Point - Center)
-        m : second quantum number (-2,-1,0,1,2)
+        m : second quantum number (-3,-2,-1,0,1,2,3)
     Returns
-        Y2-2 = 1/2\sqrt(15/\pi) -6xy/r^4
-        Y2-1 = 1/2\sqrt(15/\pi) -6yz/r^4
+        \nabla^2 Y3m = -12 Y3m / r^2
+    """
+    return -12 * _spherical_harmonics_l3(xyz, m) / (xyz**2).sum(-1)
+
+# =============== helpers
 
-        Y20  = 1/4\sqrt(5/\pi) ( 6/r6 * (xx+yy)^2 - zz * (xx + yy -2zz))
 
-        Y21  = 1/2\sqrt(15/\pi) -6zx/r^4
-        Y22  = 1/4\sqrt(15/\pi)  ( 6/r6 * ( zz*(yy-xx)  +y^4 - x^4  )  )
+def _harmonic_polynomial(xyz, l, m):
+    """Homogeneous harmonic polynomial f of the Spherical Harmonics
+    Ylm = c f / r^l and its gradient (l=2,3)
+    Args:
+        xyz : array (Nbatch,Nelec,Nrbf,Ndim) x,y,z, of (Point - Center)
+        l : first quantum number (2,3)
+        m : second quantum number (-l,...,l)
+    Returns
+        c : normalization of the harmonics
+        f : array (Nbatch,Nelec,Nrbf) value of the polynomial
+        grad_f : list of 3 arrays (Nbatch,Nelec,Nrbf) gradient of the polynomial
     """
 
-    r = torch.sqrt((xyz**2).sum(3))
-    r4 = r**4
-    r6 = r**6
+    x, y, z = xyz[..., 0], xyz[..., 1], xyz[..., 2]
+    zero = torch.zeros_like(x)
+
+    if l == 2:
+        if m == -2:
+            return 1.0925484305920792, x * y, [y, x, zero]
+        if m == -1:
+            return 1.0925484305920792, y * z, [zero, z, y]
+        if m == 0:
+            return (0.31539156525252005, 2 * z**2 - x**2 - y**2,
+                    [-2 * x, -2 * y, 4 * z])
+        if m == 1:
+            return 1.0925484305920792, z * x, [z, zero, x]
+        if m == 2:
+            return 0.5462742152960396, x**2 - y**2, [2 * x, -2 * y, zero]
+
+    if l == 3:
+        if m == -3:
+            return (0.5900435899266435, y * (3 * x**2 - y**2),
+                    [6 * x * y, 3 * x**2 - 3 * y**2, zero])
+        if m == -2:
+            return 2.890611442640554, x * y * z, [y * z, x * z, x * y]
+        if m == -1:
+            return (0.4570457994644658, y * (4 * z**2 - x**2 - y**2),
+                    [-2 * x * y, 4 * z**2 - x**2 - 3 * y**2, 8 * y * z])
+        if m == 0:
+            return (0.3731763325901154, z * (2 * z**2 - 3 * x**2 - 3 * y**2),
+                    [-6 * x * z, -6 * y * z, 6 * z**2 - 3 * x**2 - 3 * y**2])
+        if m == 1:
+            return (0.4570457994644658, x * (4 * z**2 - x**2 - y**2),
+                    [4 * z**2 - 3 * x**2 - y**2, -2 * x * y, 8 * x * z])
+        if m == 2:
+            return (1.445305721320277, z * (x**2 - y**2),
+                    [2 * x * z, -2 * y * z, x**2 - y**2])
+        if m == 3:
+            return (0.5900435899266435, x * (x**2 - 3 * y**2),
+                    [3 * x**2 - 3 * y**2, -6 * x * y, zero])
+
+    raise ValueError('Harmonic polynomial not implemented for l=%d, m=%d'
+                     % (l, m))
+
+
+def _grad_solid_harmonics(xyz, l, m):
+    """Compute the gradient of the Spherical Harmonics Ylm = c f / r^l
+    Args:
+        xyz : array (Nbatch,Nelec,Nrbf,Ndim) x,y,z, of (Point - Center)
+        l : first quantum number (2,3)
+        m : second quantum number (-l,...,l)
+    Returns
+        \nabla Ylm = c (\nabla f / r^l - l f [x,y,z] / r^(l+2))
+    """
+    c, f, grad_f = _harmonic_polynomial(xyz, l, m)
+    r2 = (xyz**2).sum(-1, keepdim=True)
+    return c * (torch.stack(grad_f, -1) / r2**(0.5 * l)
+                - l * f.unsqueeze(-1) * xyz / r2**(0.5 * l + 1))
 
-    if m == 0:
-        c0 = 0.31539156525252005
-        xyz2 = xyz**2
-        return c0 * (6 / r6 * (xyz2[:, :, :, :2].sum(-1))**2 - xyz2[:, :, :, 2] * (xyz2[:, :, :, 0]
-                    + xyz2[:, :, :, 1] - 2 * xyz2[:, :, :, 2]))
-    if m == 2:
-        c2 = 0.5462742152960396
-        xyz2 = xyz**2
-        return c2 * (6 / r6 * xyz2[:, :, :, 2] * (xyz2[:, :, :, 1] - xyz2[:, :, :, 0])
-                   + xyz2[:, :, :, 1]**2 - xyz2[:, :, :, 0]**2)
-    else:
-        cm = 1.0925484305920792
-        index = {-2: [0, 1], -1: [1, 2], 1: [2, 0]}
-        return cm * (- 6 * xyz[:, :, :, index[m][0]]
-                     * xyz[:, :, :, index[m][1]] / r4)
+
+_spherical_harmonics = {1: _spherical_harmonics_l1,
+                        2: _spherical_harmonics_l2,
+                        3: _spherical_harmonics_l3}
+
+_nabla_spherical_harmonics = {1: _nabla_spherical_harmonics_l1,
+                              2: _nabla_spherical_harmonics_l2,
+                              3: _nabla_spherical_harmonics_l3}
+
+_grad_spherical_harmonics = {1: _grad_spherical_harmonics_l1,
+                             2: _grad_spherical_harmonics_l2,
+                             3: _grad_spherical_harmonics_l3}
+
+_lap_spherical_harmonics = {1: _lap_spherical_harmonics_l1,
+                            2: _lap_spherical_harmonics_l2,
+                            3: _lap_spherical_harmonics_l3}
 
 
 if __name__ == "__main__":
@@ -0,0 +1,192 @@
+import torch
+
+
+class SplineOrbitals(object):
+
+    def __init__(self, resolution=0.1, margin=3., cusp_radius=0.5):
+        """Molecular orbitals tabulated on a regular 3D grid and evaluated
+        with tricubic B-splines.
+
+        Each evaluation only involves the 4x4x4 coefficients surrounding the
+        point, i.e. the cost per orbital and per electron does not depend on
+        the size of the basis set. Electrons closer to a nucleus than
+        cusp_radius, where the orbitals vary too quickly to be interpolated,
+        or outside of the grid are computed analytically.
+
+        Keyword Arguments:
+            resolution {float} -- spacing of the grid (default: {0.1})
+            margin {float} -- extension of the grid around the
+                              molecular domain (default: {3.})
+            cusp_radius {float} -- radius around the nuclei where the
+                                   analytical orbitals are used (default: {0.5})
+        """
+
+        self.resolution = resolution
+        self.margin = margin
+        self.cusp_radius = cusp_radius
+
+        self.coeffs = None
+        self.signature = None
+
+    def needs_update(self, signature):
+        """Check if the tables were built for another state of the orbitals.
+
+        Arguments:
+            signature {tuple} -- state of the orbitals
+
+        Returns:
+            bool -- the tables must be rebuilt
+        """
+        return self.coeffs is None or signature != self.signature
+
+    def clear(self):
+        """Remove the tables."""
+        self.coeffs = None
+        self.signature = None
+
+    def build(self, func, box, atom_coords, signature, chunk_size=10000):
+        """Tabulate the orbitals and compute the spline coefficients.
+
+        Arguments:
+            func {callable} -- values of the orbitals at points [npts, 3] -> [npts, nmo]
+            box {tuple} -- min and max of the domain along each axis
+            atom_coords {torch.tensor} -- positions of the atoms [natom, 3]
+            signature {tuple} -- state of the orbitals
+
+        Keyword Arguments:
+            chunk_size {int} -- number of nodes evaluated at once (default: {10000})
+        """
+
+        device = atom_coords.device
+        bmin = torch.as_tensor(box[0]).reshape(-1) - self.margin
+        extent = torch.as_tensor(box[1]).reshape(-1) - bmin + self.margin
+        npts = [int(n) + 1 for n in torch.ceil(extent / self.resolution)]
+
+        self.h = self.resolution
+        self.origin = bmin.expand(3).to(device=device,
+                                        dtype=atom_coords.dtype)
+        self.npts = torch.tensor(npts, device=device)
+        self.atom_coords = atom_coords.detach()
+
+        axes = [self.origin[i] + self.h * torch.arange(
+            npts[i], device=device, dtype=atom_coords.dtype)
+            for i in range(3)]
+        grid = torch.stack(torch.meshgrid(*axes, indexing='ij'), -1)
+        grid = grid.reshape(-1, 3)
+
+        # the AOs with l > 0 are not defined on the nuclei
+        on_atom = torch.cdist(grid, self.atom_coords).min(-1)[0] < 1E-6
+        grid[on_atom] += 1E-6
+
+        with torch.no_grad():
+            vals = torch.cat([func(grid[i:i + chunk_size])
+                              for i in range(0, grid.shape[0], chunk_size)])
+
+        vals = vals.reshape(*npts, -1)
+        self.nmo = vals.shape[-1]
+
+        # interpolating spline coefficients along each axis
+        coeffs = torch.einsum(
+            'ij,jklm->iklm', self._prefilter(npts[0]).to(vals), vals)
+        coeffs = torch.einsum(
+            'ij,kjlm->kilm', self._prefilter(npts[1]).to(vals), coeffs)
+        coeffs = torch.einsum(
+            'ij,kljm->klim', self._prefilter(npts[2]).to(vals), coeffs)
+
+        self.coeffs = coeffs.reshape(-1, self.nmo)
+        self.signature = signature
+
+        # strides and offsets of the 4x4x4 coefficients in the flat table
+        ny, nz = npts[1] + 2, npts[2] + 2
+        self.strides = torch.tensor([ny * nz, nz, 1], device=device)
+        offset = torch.arange(4, device=device)
+        self.offsets = (offset[:, None, None] * ny * nz +
+                        offset[None, :, None] * nz +
+                        offset[None, None, :]).reshape(-1)
+
+    def __call__(self, pos, func):
+        """Values of the orbitals for all the electrons.
+
+        Arguments:
+            pos {torch.tensor} -- positions of the electrons [nbatch, nelec*3]
+            func {callable} -- analytical orbitals at points [npts, 3]
+
+        Returns:
+            torch.tensor -- orbitals [nbatch, nelec, nmo]
+        """
+
+        nbatch = pos.shape[0]
+        xyz = pos.reshape(-1, 3)
+
+        # points handled by the splines
+        u = (xyz - self.origin) / self.h
+        inside = ((u >= 0) & (u <= self.npts - 1)).all(-1)
+        dist = torch.cdist(xyz, self.atom_coords)
+        inside &= (dist > self.cusp_radius).all(-1)
+
+        out = xyz.new_zeros(xyz.shape[0], self.nmo)
+        if inside.any():
+            out[inside] = self._interpolate(u[inside])
+        if not inside.all():
+            out[~inside] = func(xyz[~inside])
+
+        return out.reshape(nbatch, -1, self.nmo)
+
+    def _interpolate(self, u):
+        """Tricubic interpolation of the orbitals.
+
+        Arguments:
+            u {torch.tensor} -- positions in grid units [npts, 3]
+
+        Returns:
+            torch.tensor -- orbitals [npts, nmo]
+        """
+
+        idx = torch.min(torch.floor(u).long().clamp(min=0), self.npts - 2)
+        t = u - idx
+
+        index = (idx * self.strides).sum(-1)
+        index = (index[:, None] + self.offsets).reshape(-1)
+        coeffs = self.coeffs.index_select(0, index).view(-1, 64, self.nmo)
+
+        weights = self._outer(*[self._basis(t[:, i]) for i in range(3)])
+        return torch.bmm(weights.unsqueeze(1), coeffs).squeeze(1)
+
+    @staticmethod
+    def _basis(t):
+        """Uniform cubic B-spline basis functions on [0, 1].
+
+        Arguments:
+            t {torch.tensor} -- position in the interval [npts]
+
+        Returns:
+            torch.tensor -- values of the 4 basis functions [npts, 4]
+        """
+        return torch.stack([(1 - t)**3,
+                            3 * t**3 - 6 * t**2 + 4,
+                            -3 * t**3 + 3 * t**2 + 3 * t + 1,
+                            t**3], -1) / 6.
+
+    @staticmethod
+    def _outer(bx, by, bz):
+        """Tensor product of the 1D basis functions [npts, 64]."""
+        return (bx[:, :, None, None] * by[:, None, :, None] *
+                bz[:, None, None, :]).reshape(bx.shape[0], -1)
+
+    @staticmethod
+    def _prefilter(npts):
+        """Matrix giving the npts+2 spline coefficients interpolating
+        npts values, with natural (zero curvature) boundary conditions.
+
+        Arguments:
+            npts {int} -- number of nodes
+
+        Returns:
+            torch.tensor -- matrix [npts+2, npts]
+        """
+        mat = torch.zeros(npts + 2, npts + 2, dtype=torch.float64)
+        mat[0, :3] = torch.tensor([1., -2., 1.])
+        mat[-1, -3:] = torch.tensor([1., -2., 1.])
+        for i in range(npts):
+            mat[i + 1, i:i + 3] = torch.tensor([1., 4., 1.]) / 6.
+        return torch.linalg.inv(mat)[:, 1:-1]
@@ -0,0 +1,110 @@
+from collections import OrderedDict
+from contextlib import contextmanager
+
+
+class StageCache(object):
+
+    def __init__(self, max_memory=None):
+        """Cache of the intermediate quantities of the wave function
+        (AOs and their derivatives, e-e distances, potentials ...) that do not
+        depend on the trainable parameters, for a given batch of walkers.
+
+        Entries are only used for the walker tensor bound with batch(), are
+        cleared when the sample set, the set of trainable parameters or the
+        geometry changes and are evicted in a LRU fashion above max_memory.
+
+        Keyword Arguments:
+            max_memory {int} -- maximum memory in bytes, None for no limit (default: {None})
+        """
+
+        self.max_memory = max_memory
+        self.data = OrderedDict()
+        self.memory = 0
+
+        self.pos = None
+        self.batch_key = None
+        self.sample_set = None
+        self.sample_version = None
+        self.signature = None
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @contextmanager
+    def batch(self, pos, sample_set, ibatch, signature):
+        """Bind the cache to a batch of walkers.
+
+        Arguments:
+            pos {torch.tensor} -- positions of the walkers in the batch
+            sample_set {torch.tensor} -- tensor containing all the walkers
+            ibatch {int} -- index of the batch in the sample set
+            signature {tuple} -- trainable parameters and geometry state
+        """
+
+        if (sample_set is not self.sample_set
+                or sample_set._version != self.sample_version
+                or signature != self.signature):
+            self.clear()
+            self.sample_set = sample_set
+            self.sample_version = sample_set._version
+            self.signature = signature
+
+        self.pos = pos
+        self.batch_key = ibatch
+        try:
+            yield self
+        finally:
+            self.pos = None
+            self.batch_key = None
+
+    def get(self, name, pos, func):
+        """Return the cached value of name or compute it.
+
+        Arguments:
+            name {hashable} -- name of the quantity
+            pos {torch.tensor} -- positions used to compute the quantity
+            func {callable} -- function computing the quantity
+
+        Returns:
+            torch.tensor -- value of the quantity
+        """
+
+        if pos is not self.pos:
+            return func()
+
+        key = (self.batch_key, name)
+        if key in self.data:
+            self.hits += 1
+            self.data.move_to_end(key)
+            return self.data[key]
+
+        self.misses += 1
+        val = func().detach()
+        self._add(key, val)
+        return val
+
+    def _add(self, key, val):
+        """Add an entry and evict the oldest ones if needed.
+
+        Arguments:
+            key {tuple} -- key of the entry
+            val {torch.tensor} -- value
+        """
+
+        nbytes = val.element_size() * val.nelement()
+        if self.max_memory is not None and nbytes > self.max_memory:
+            return
+
+        self.data[key] = val
+        self.memory += nbytes
+
+        while self.max_memory is not None and self.memory > self.max_memory:
+            _, old = self.data.popitem(last=False)
+            self.memory -= old.element_size() * old.nelement()
+            self.evictions += 1
+
+    def clear(self):
+        """Remove all the entries."""
+        self.data = OrderedDict()
+        self.memory = 0
@@ -1,3 +1,6 @@
+from contextlib import nullcontext
+from types import SimpleNamespace
+
 import torch
 from torch import nn
 
@@ -6,6 +9,12 @@ from torch.autograd import grad, Variable
 
 class WaveFunction(nn.Module):
 
+    # quantities that can be requested to evaluate()
+    evaluate_fields = ('psi', 'log_psi', 'sign', 'drift',
+                       'kinetic_energy', 'nuclear_potential',
+                       'electronic_potential', 'nuclear_repulsion',
+                       'local_energy')
+
     def __init__(self, nelec, ndim, kinetic='auto', cuda=False):
 
         super(WaveFunction, self).__init__()
@@ -15,6 +24,13 @@ class WaveFunction(nn.Module):
         self.ndim_tot = self.nelec * self.ndim
         self.kinetic = kinetic
         self.cuda = cuda
+
+        # options of the stochastic laplacian (kinetic='hutchinson')
+        # and variance of the last kinetic energy estimate
+        self.hutchinson = {'nprobe': 8,
+                           'probe': 'rademacher',
+                           'control_variate': False}
+        self.kinetic_variance = None
         self.device = torch.device('cpu')
         if self.cuda:
             self.device = torch.device('cuda')
@@ -57,11 +73,114 @@ class WaveFunction(nn.Module):
         '''
         raise NotImplementedError()
 
+    def evaluate(self, pos, want=None):
+        '''Compute several quantities of the wave function in a single pass.
+
+        Args:
+            pos: position of the electrons
+            want: names of the quantities to compute, see
+                  evaluate_fields (default all of them)
+
+        Returns: SimpleNamespace with the requested quantities
+                 (None for the others)
+        '''
+
+        if want is None:
+            want = self.evaluate_fields
+        want = set([want] if isinstance(want, str) else want)
+        for name in want:
+            if name not in self.evaluate_fields:
+                raise ValueError('%s not in evaluate_fields' % name)
+
+        res = SimpleNamespace(**{k: None for k in self.evaluate_fields})
+
+        # the drift is the gradient of log|psi| w.r.t the positions
+        grad_enabled = torch.is_grad_enabled()
+        _grad = nullcontext()
+        if 'drift' in want:
+            _grad = torch.enable_grad()
+            if not pos.requires_grad:
+                pos = pos.detach().clone().requires_grad_()
+
+        with _grad:
+
+            self._evaluate(pos, want, res)
+
+            if 'local_energy' in want:
+                res.local_energy = res.kinetic_energy \
+                    + res.nuclear_potential \
+                    + res.electronic_potential \
+                    + res.nuclear_repulsion
+
+            if want & {'log_psi', 'sign', 'drift'}:
+                res.log_psi = torch.log(torch.abs(res.psi))
+                res.sign = torch.sign(res.psi)
+
+            if 'drift' in want:
+                res.drift = grad(res.log_psi, pos,
+                                 grad_outputs=torch.ones_like(res.log_psi),
+                                 retain_graph=grad_enabled)[0]
+
+        # do not return a graph if the caller disabled the gradients
+        if not grad_enabled:
+            for k, v in res.__dict__.items():
+                if isinstance(v, torch.Tensor):
+                    res.__dict__[k] = v.detach()
+
+        return res
+
+    def _evaluate(self, pos, want, res):
+        '''Fill the values of psi, the kinetic energy and the
+        potentials required by evaluate().
+
+        Args:
+            pos: position of the electrons
+            want: set of the requested quantities
+            res: SimpleNamespace to fill
+        '''
+
+        need_ke = bool(want & {'kinetic_energy', 'local_energy'})
+        need_psi = bool(want & {'psi', 'log_psi', 'sign', 'drift'})
+
+        need_out = self.kinetic in ['auto', 'hutchinson']
+        if need_psi or (need_ke and need_out):
+            res.psi = self.forward(pos)
+
+        if need_ke:
+            if self.kinetic == 'auto':
+                res.kinetic_energy = self.kinetic_energy_autograd(
+                    pos, out=res.psi)
+            elif self.kinetic == 'hutchinson':
+                res.kinetic_energy = self.kinetic_energy_hutchinson(
+                    pos, out=res.psi)
+            else:
+                res.kinetic_energy = self.kinetic_energy(pos)
+
+        self._evaluate_potentials(pos, want, res)
+
+    def _evaluate_potentials(self, pos, want, res):
+        '''Fill the potential energy terms required by evaluate().
+
+        Args:
+            pos: position of the electrons
+            want: set of the requested quantities
+            res: SimpleNamespace to fill
+        '''
+
+        for name in ['nuclear_potential', 'electronic_potential']:
+            if name in want or 'local_energy' in want:
+                res.__dict__[name] = getattr(self, name)(pos)
+
+        if 'nuclear_repulsion' in want or 'local_energy' in want:
+            res.nuclear_repulsion = self.nuclear_repulsion()
+
     def kinetic_energy(self, pos):
         '''Main switch for the kinetic energy.'''
 
         if self.kinetic == 'auto':
             return self.kinetic_energy_autograd(pos)
+        elif self.kinetic == 'hutchinson':
+            return self.kinetic_energy_hutchinson(pos)
         elif self.kinetic == 'fd':
             return self.kinetic_energy_finite_difference(pos)
         else:
@@ -69,7 +188,7 @@ class WaveFunction(nn.Module):
                 'kinetic %s not recognized' %
                 self.kinetic)
 
-    def kinetic_energy_autograd(self, pos):
+    def kinetic_energy_autograd(self, pos, out=None):
         '''Compute the second derivative of the network
         output w.r.t the value of the input.
 
@@ -83,7 +202,8 @@ class WaveFunction(nn.Module):
             values of nabla^2 * Psi
         '''
 
-        out = self.forward(pos)
+        if out is None:
+            out = self.forward(pos)
 
         # compute the jacobian
         z = torch.ones_like(out)
@@ -110,6 +230,101 @@ class WaveFunction(nn.Module):
 
         return -0.5 * hess.view(-1, 1) / out
 
+    def set_hutchinson(self, nprobe=8, probe='rademacher',
+                       control_variate=False):
+        '''Set the options of the stochastic estimate of the laplacian.
+
+        Args:
+            nprobe: number of random probes
+            probe: distribution of the probes (rademacher, gaussian)
+            control_variate: use a leave-one-out estimate of the
+                             hessian diagonal as control variate
+                             (gaussian probes only, nprobe > 1)
+        '''
+
+        if probe not in ['rademacher', 'gaussian']:
+            raise ValueError('probe must be rademacher or gaussian')
+        if control_variate and (probe != 'gaussian' or nprobe < 2):
+            raise ValueError(
+                'control variate requires gaussian probes and nprobe > 1')
+
+        self.hutchinson = {'nprobe': nprobe,
+                           'probe': probe,
+                           'control_variate': control_variate}
+
+    def kinetic_energy_hutchinson(self, pos, out=None):
+        '''Compute the kinetic energy with the Hutchinson estimator
+        of the laplacian:
+
+            nabla^2 Psi ~ 1/K sum_k v_k^T H v_k
+
+        with K random probes v_k (E[v v^T] = I) and H the hessian of
+        Psi. Each probe costs one hessian-vector product instead of the
+        3N backward passes of the exact laplacian.
+
+        With gaussian probes the diagonal of the hessian can be used as
+        a control variate: d^(-k)^T (v_k^2 - 1) is substracted from each
+        term, with d^(-k) the estimate of the diagonal from the other
+        probes. The variance of the estimate of the kinetic energy
+        for each walker is stored in self.kinetic_variance.
+
+        Args:
+            pos: position of the electron
+            out : preomputed values of the wf at pos
+
+        Returns:
+            values of the kinetic energy (-1/2 nabla^2 Psi / Psi)
+        '''
+
+        if out is None:
+            out = self.forward(pos)
+
+        nprobe = self.hutchinson['nprobe']
+
+        # compute the jacobian
+        jacob = grad(out, pos,
+                     grad_outputs=torch.ones_like(out),
+                     create_graph=True)[0]
+
+        # hessian vector products
+        vhv, vdiag = [], []
+        for _ in range(nprobe):
+
+            if self.hutchinson['probe'] == 'gaussian':
+                v = torch.randn_like(pos)
+            else:
+                v = torch.randint_like(pos, 2) * 2. - 1.
+
+            hv = grad(jacob, pos, grad_outputs=v,
+                      create_graph=True)[0]
+
+            vhv.append((v * hv).sum(1))
+            if self.hutchinson['control_variate']:
+                vdiag.append((v * hv, v**2 - 1.))
+
+        vhv = torch.stack(vhv)
+
+        # leave one out diagonal control variate
+        if self.hutchinson['control_variate']:
+            diag = torch.stack([d for d, _ in vdiag])
+            diag_sum = diag.sum(0)
+            for k, (dk, v2) in enumerate(vdiag):
+                diag_loo = (diag_sum - dk) / (nprobe - 1)
+                vhv[k] = vhv[k] - (diag_loo * v2).sum(1)
+
+        lap = vhv.mean(0)
+
+        # variance of the estimate of the kinetic energy
+        with torch.no_grad():
+            if nprobe > 1:
+                var = vhv.var(0) / nprobe
+            else:
+                var = torch.zeros_like(lap)
+            self.kinetic_variance = (
+                0.25 * var / out.view(-1)**2).view(-1, 1)
+
+        return -0.5 * lap.view(-1, 1) / out
+
     def kinetic_energy_finite_difference(self, pos, eps=1E-3):
         '''Compute the second derivative of the network
         output w.r.t the value of the input using finite difference.
@@ -182,6 +397,16 @@ class WaveFunction(nn.Module):
         el = self.local_energy(pos)
         return torch.mean(el), torch.var(el), self.sampling_error(el)
 
+    def screening_pdf(self):
+        '''Cheap approximation of the density used by the samplers to
+        screen the moves before the exact acceptance, None if the
+        wave function has none.'''
+        return None
+
     def pdf(self, pos):
         '''density of the wave function.'''
         return (self.forward(pos)**2).reshape(-1)
+
+    def log_pdf(self, pos):
+        '''log of the density of the wave function.'''
+        return 2. * torch.log(torch.abs(self.forward(pos))).reshape(-1)
@@ -2,6 +2,7 @@ import torch
 from torch import nn
 import numpy as np
 from time import time
+from types import SimpleNamespace
 
 from deepqmc.wavefunction.atomic_orbitals import AtomicOrbitals
 from deepqmc.wavefunction.slater_pooling import SlaterPooling
@@ -9,12 +10,20 @@ from deepqmc.wavefunction.kinetic_pooling import KineticPooling
 from deepqmc.wavefunction.orbital_configurations import OrbitalConfigurations
 from deepqmc.wavefunction.wf_base import WaveFunction
 from deepqmc.wavefunction.jastrow import TwoBodyJastrowFactor
+from deepqmc.wavefunction.geometry import Geometry
+from deepqmc.wavefunction.localization import (cholesky_localization,
+                                               common_occupied_orbitals)
+from deepqmc.wavefunction.sparse_linear import SparseLinear
+from deepqmc.wavefunction.spline_orbitals import SplineOrbitals
+from deepqmc.wavefunction.stage_cache import StageCache
+from deepqmc.wavefunction.workspace import Workspace
 
 
 class Orbital(WaveFunction):
 
     def __init__(self, mol, configs='ground_state',
-                 kinetic='jacobi', use_jastrow=True, cuda=False):
+                 kinetic='jacobi', use_jastrow=True, cuda=False,
+                 localize=False, mo_threshold=None, ci_threshold=0.):
         """Network to compute a wave function
 
         Arguments:
@@ -26,10 +35,19 @@ class Orbital(WaveFunction):
                             'cas(nelec,norb)'
                             'single(nelec,norb)'
                             'single_double(nelec,norb)'
+                            or name of a CI coefficients file
+                            (see CalculatorPySCF.save_ci_coeffs)
 
-            kinetic {str} -- method to compute the kinetic energy (jacobi, auto, fd) (default: {'jacobi'})
+            kinetic {str} -- method to compute the kinetic energy (jacobi, auto, hutchinson, fd) (default: {'jacobi'})
             use_jastrow {bool} -- use a jastrow factor (default: {True})
             cuda {bool} -- use cuda (default: {False})
+            localize {bool} -- localize the orbitals occupied in all
+                               the configurations (default: {False})
+            mo_threshold {float} -- if not None, MO coefficients below that
+                                    threshold are dropped and the MOs are computed
+                                    with a sparse product (default: {None})
+            ci_threshold {float} -- minimum CI coefficient of the determinants
+                                    read from a file (default: {0.})
 
         Raises:
             ValueError: if cuda requested and not available
@@ -49,6 +67,11 @@ class Orbital(WaveFunction):
         # define the atomic orbital layer
         self.ao = AtomicOrbitals(mol, cuda)
 
+        # e-n and e-e geometry shared by the ao, jastrow and potentials
+        self.geom = Geometry(self.nelec, self.ndim)
+        self.atomic_charges = torch.tensor(
+            mol.atomic_number).type(torch.get_default_dtype())
+
         # define the mo layer
         self.mo_scf = nn.Linear(
             mol.basis.nao, mol.basis.nmo, bias=False)
@@ -67,13 +90,24 @@ class Orbital(WaveFunction):
         self.use_jastrow = use_jastrow
         self.jastrow = TwoBodyJastrowFactor(mol.nup, mol.ndown,
                                             w=1., cuda=cuda)
+        self.jastrow.geom = self.geom
 
         # define the SD we want
         self.orb_confs = OrbitalConfigurations(mol)
         self.configs_method = configs
-        self.configs = self.orb_confs.get_configs(configs)
+        self.configs = self.orb_confs.get_configs(
+            configs, threshold=ci_threshold)
         self.nci = len(self.configs[0])
 
+        # configurations of the initial expansion kept by the pruning
+        self.config_mask = torch.ones(self.nci, dtype=torch.bool)
+
+        # localized and/or sparse mo coefficients
+        if localize:
+            self.localize_orbitals()
+        if mo_threshold is not None:
+            self.mo_scf = SparseLinear(self.mo_scf.weight, mo_threshold)
+
         #  define the SD pooling layer
         self.pool = SlaterPooling(
             self.configs, mol, cuda)
@@ -89,6 +123,9 @@ class Orbital(WaveFunction):
         if self.nci > 1:
             self.fc.weight.data.fill_(0.)
             self.fc.weight.data[0][0] = 1.
+        if self.orb_confs.ci_coeffs is not None:
+            self.fc.weight.data = self.orb_confs.ci_coeffs.type(
+                self.fc.weight.dtype).view(1, -1)
         if self.cuda:
             self.fc = self.fc.to(self.device)
         self.fc.clip = False
@@ -96,9 +133,44 @@ class Orbital(WaveFunction):
         if kinetic == 'jacobi':
             self.local_energy = self.local_energy_jacobi
 
+        # cache of the frozen layers (see use_stage_cache)
+        self.stage_cache = None
+
+        # tabulated orbitals (see use_spline_orbitals)
+        self.mo_spline = None
+        self._use_spline = False
+
+        # buffers reused without gradient (see use_workspace)
+        self.workspace = None
+
         if self.cuda:
             self.device = torch.device('cuda')
             self.to(self.device)
+            self.atomic_charges = self.atomic_charges.to(self.device)
+
+    def prune_configurations(self, keep):
+        """Remove configurations from the CI expansion.
+
+        The CI parameter is resized in place so that optimizers keep
+        a reference to it (their state for it must be reset).
+
+        Arguments:
+            keep {torch.tensor} -- boolean mask of the configurations to keep [nci]
+        """
+
+        keep = torch.as_tensor(keep, dtype=torch.bool).cpu()
+        self.configs = (self.configs[0][keep], self.configs[1][keep])
+        self.config_mask[self.config_mask.nonzero().view(-1)[~keep]] = False
+        self.nci = len(self.configs[0])
+
+        self.pool = SlaterPooling(self.configs, self.mol, self.cuda)
+        self.kinpool = KineticPooling(self.configs, self.mol, self.cuda)
+
+        with torch.no_grad():
+            self.fc.weight.set_(self.fc.weight[:, keep.to(
+                self.fc.weight.device)].clone())
+        self.fc.weight.grad = None
+        self.fc.in_features = self.nci
 
     def get_mo_coeffs(self):
         """get the molecular orbital coefficient
@@ -112,6 +184,19 @@ class Orbital(WaveFunction):
         # return nn.Parameter(mo_coeff)
         return nn.Parameter(mo_coeff.transpose(0, 1).contiguous())
 
+    def localize_orbitals(self):
+        """Localize the orbitals occupied in all the configurations.
+
+        As these orbitals are in all the determinants, the rotation only
+        changes the sparsity of the MO coefficients, not the wave function.
+        """
+        index = common_occupied_orbitals(self.configs)
+        mos = self.mo_scf.weight.detach().cpu().numpy().T
+        mos = cholesky_localization(mos, index)
+        self.mo_scf.weight.data = torch.as_tensor(
+            mos.T.copy(), dtype=self.mo_scf.weight.dtype,
+            device=self.mo_scf.weight.device)
+
     def update_mo_coeffs(self):
         """Update the MO matrix for example in a geo opt run."""
         self.mol.atom_coords = self.ao.atom_coords.detach().numpy().tolist()
@@ -136,18 +221,12 @@ class Orbital(WaveFunction):
         if self.use_jastrow:
             J = self.jastrow(x)
 
-        # atomic orbital
+        # molecular orbitals
         if ao is None:
-            x = self.ao(x)
+            x = self._get_mo_vals(x)
 
         else:
-            x = ao
-
-        # molecular orbitals
-        x = self.mo_scf(x)
-
-        # mix the mos
-        x = self.mo(x)
+            x = self.mo(self.mo_scf(ao))
 
         # pool the mos
         x = self.pool(x)
@@ -158,19 +237,218 @@ class Orbital(WaveFunction):
         else:
             return self.fc(x)
 
-    def _get_mo_vals(self, x, derivative=0):
-        """Get the values of MOs
+    def _get_mo_vals(self, x, derivative=0, jacobian=True):
+        """Get the values of MOs, from the spline tables in the
+        screening density (see use_spline_orbitals).
 
         Arguments:
             x {torch.tensor} -- positions of the electrons [nbatch, nelec*ndim]
 
         Keyword Arguments:
             derivative {int} -- order of the derivative (default: {0})
+            jacobian {bool} -- return the jacobian (default: {True})
+
+        Returns:
+            torch.tensor -- MO matrix [nbatch, nelec, nmo (, ndim)]
+        """
+
+        if self._use_spline and derivative == 0:
+            self._update_spline_orbitals()
+            return self.mo_spline(x, self._get_mo_points)
+
+        ao = self._get_ao_vals(x, derivative=derivative, jacobian=jacobian)
+        if not jacobian:
+            return self.mo(self.mo_scf(ao.transpose(2, 3))).transpose(2, 3)
+        return self.mo(self.mo_scf(ao))
+
+    def _get_mo_points(self, xyz):
+        """Analytical values of the MOs at individual points
+
+        Arguments:
+            xyz {torch.tensor} -- positions [npts, ndim]
+
+        Returns:
+            torch.tensor -- MO values [npts, nmo]
+        """
+
+        # pad the points to fill configurations of nelec electrons
+        npts = xyz.shape[0]
+        npad = (-npts) % self.nelec
+        if npad > 0:
+            xyz = torch.cat([xyz, xyz[-1:].expand(npad, -1)])
+
+        ao = self.ao(xyz.reshape(-1, self.nelec * self.ndim))
+        mo = self.mo(self.mo_scf(ao))
+
+        return mo.reshape(-1, mo.shape[-1])[:npts]
+
+    def use_spline_orbitals(self, resolution=0.1, margin=3.,
+                            cusp_radius=0.5):
+        """Evaluate the MOs with tricubic splines tabulated on a grid in
+        the screening density of the samplers (see screening_pdf). The
+        Metropolis moves are first accepted with this approximate density
+        and then corrected with the exact one, so that the walkers still
+        sample |psi|^2. The values, local energies and CI data of the wave
+        function always use the analytical MOs. The tables are rebuilt when
+        the MO coefficients or the geometry change.
+
+        Keyword Arguments:
+            resolution {float} -- spacing of the grid (default: {0.1})
+            margin {float} -- extension of the grid around the
+                              molecule (default: {3.})
+            cusp_radius {float} -- radius around the nuclei where the
+                                   analytical MOs are used (default: {0.5})
+        """
+        self.mo_spline = SplineOrbitals(resolution=resolution,
+                                        margin=margin,
+                                        cusp_radius=cusp_radius)
+
+    def screening_pdf(self):
+        """Density with the spline tables of the MOs, if they are used
+        (see use_spline_orbitals).
+
+        Returns:
+            callable -- approximate density or None
+        """
+        if self.mo_spline is None:
+            return None
+        return self._spline_pdf
+
+    def _spline_pdf(self, pos):
+        """Density of the wave function with the MOs of the spline tables.
+
+        Arguments:
+            pos {torch.tensor} -- positions of the electrons [nbatch, nelec*ndim]
+
+        Returns:
+            torch.tensor -- approximate density [nbatch]
+        """
+        self._use_spline = True
+        try:
+            return (self.forward(pos)**2).reshape(-1)
+        finally:
+            self._use_spline = False
+
+    def _update_spline_orbitals(self):
+        """Rebuild the spline tables if the MOs have changed."""
+
+        signature = tuple((p.data_ptr(), p._version) for p in [
+            self.mo.weight, self.mo_scf.weight, self.ao.atom_coords,
+            self.ao.bas_exp, self.ao.bas_coeffs])
+
+        if self.mo_spline.needs_update(signature):
+            # same padding as the uniform domain but along each axis
+            atom_coords = self.ao.atom_coords.detach()
+            box = (atom_coords.min(0)[0] - 0.5, atom_coords.max(0)[0] + 0.5)
+            self.mo_spline.build(self._get_mo_points, box,
+                                 atom_coords, signature)
+
+    def clear_cache(self):
+        """Remove the spline tables and the stage cache, e.g. when the
+        parameters were changed by another process."""
+        if self.mo_spline is not None:
+            self.mo_spline.clear()
+        if self.stage_cache is not None:
+            self.stage_cache.clear()
+
+    def _get_ao_vals(self, x, derivative=0, jacobian=True):
+        """Get the values of the AOs, from the stage cache if the AOs are frozen
+
+        Arguments:
+            x {torch.tensor} -- positions of the electrons [nbatch, nelec*ndim]
+
+        Keyword Arguments:
+            derivative {int} -- order of the derivative (default: {0})
+            jacobian {bool} -- return the jacobian (default: {True})
+
+        Returns:
+            torch.tensor -- AO matrix [nbatch, nelec, nao (, ndim)]
+        """
+        def func():
+            atom_coords = self.ao.atom_coords
+            return self.ao(
+                x, derivative=derivative, jacobian=jacobian,
+                en_vect=self.geom.en_vectors(x, atom_coords),
+                en_dist=self.geom.en_distances(x, atom_coords),
+                workspace=self._get_workspace(x))
+
+        return self._cached(('ao', derivative, jacobian), x, func,
+                            frozen=self._ao_frozen())
+
+    def use_workspace(self):
+        """Reuse the buffers of the AOs and spherical harmonics between
+        evaluations without gradient with the same batch size, e.g. during
+        the sampling."""
+        self.workspace = Workspace()
+
+    def _get_workspace(self, x):
+        """Workspace used for the positions x. The buffers are overwritten
+        by the next evaluation and are therefore not used when gradients
+        are required or when the AOs are kept in the stage cache.
+
+        Arguments:
+            x {torch.tensor} -- positions of the electrons [nbatch, nelec*ndim]
+
+        Returns:
+            Workspace -- workspace or None
+        """
+        if self.workspace is None or torch.is_grad_enabled():
+            return None
+        if self.stage_cache is not None and self.stage_cache.pos is x:
+            return None
+        return self.workspace
+
+    def use_stage_cache(self, max_memory=None):
+        """Cache the outputs of the frozen layers (AOs, e-e distances,
+        potentials) of each batch between optimization steps.
+
+        Keyword Arguments:
+            max_memory {int} -- maximum size of the cache in bytes (default: {None})
+
+        Raises:
+            ValueError: if the kinetic energy is not computed with jacobi
+        """
+        if self.kinetic != 'jacobi':
+            raise ValueError('The stage cache requires kinetic=jacobi')
+        self.stage_cache = StageCache(max_memory=max_memory)
+        self.jastrow.stage_cache = self.stage_cache
+
+    def stage_signature(self):
+        """State of the trainable parameters and geometry used
+        to invalidate the stage cache.
+
+        Returns:
+            tuple -- names of the trainable parameters and geometry version
+        """
+        trainable = tuple(name for name, p in self.named_parameters()
+                          if p.requires_grad)
+        return (trainable, self.ao.bas_coeffs.requires_grad,
+                self.ao.atom_coords._version)
+
+    def _ao_frozen(self):
+        """Check if the AO layer has no trainable parameter."""
+        return not (self.ao.atom_coords.requires_grad or
+                    self.ao.bas_exp.requires_grad or
+                    self.ao.bas_coeffs.requires_grad)
+
+    def _cached(self, name, x, func, frozen=True):
+        """Compute a quantity or get it from the stage cache.
+
+        Arguments:
+            name {hashable} -- name of the quantity
+            x {torch.tensor} -- positions of the electrons
+            func {callable} -- function computing the quantity
+
+        Keyword Arguments:
+            frozen {bool} -- the quantity does not depend on
+                             trainable parameters (default: {True})
 
         Returns:
-            torch.tensor -- MO matrix [nbatch, nelec, nmo]
+            torch.tensor -- value of the quantity
         """
-        return self.mo(self.mo_scf(self.ao(x, derivative=derivative)))
+        if self.stage_cache is None or not frozen:
+            return func()
+        return self.stage_cache.get(name, x, func)
 
     def local_energy_jacobi(self, pos):
         """Computes the local energy using the jacobi formula (trace trick)
@@ -183,12 +461,14 @@ class Orbital(WaveFunction):
             torch.tensor -- value of the local energy [nbatch]
         """
 
-        ke = self.kinetic_energy_jacobi(pos)
+        with self.geom.evaluation(pos):
+
+            ke = self.kinetic_energy_jacobi(pos)
 
-        return ke \
-            + self.nuclear_potential(pos) \
-            + self.electronic_potential(pos) \
-            + self.nuclear_repulsion()
+            return ke \
+                + self.nuclear_potential(pos) \
+                + self.electronic_potential(pos) \
+                + self.nuclear_repulsion()
 
     def kinetic_energy_jacobi(self, x, **kwargs):
         """Compute the value of the kinetic enery using
@@ -201,31 +481,130 @@ class Orbital(WaveFunction):
             torch.tensor -- value of the kinetic energy [nbatch]
         """
 
-        mo = self._get_mo_vals(x)
-        d2mo = self._get_mo_vals(x, derivative=2)
-        djast_dmo, d2jast_mo = None, None
+        kin, psi = self._kinetic_pooling_jacobi(x)
+        return self.fc(kin) / self.fc(psi)
 
-        if self.use_jastrow:
+    def _evaluate(self, pos, want, res):
+        """Fill the quantities required by evaluate(). With the jacobi
+        kinetic energy the values of the wave function are obtained from
+        the same AOs, MOs and jastrow factor as the kinetic energy.
 
-            jast = self.jastrow(x)
-            djast = self.jastrow(x, derivative=1, jacobian=False)
-            djast = djast.transpose(1, 2) / jast.unsqueeze(-1)
+        Arguments:
+            pos {torch.tensor} -- positions of the electrons [nbatch, nelec*ndim]
+            want {set} -- names of the requested quantities
+            res {SimpleNamespace} -- results to fill
+        """
 
-            dao = self.ao(
-                x,
-                derivative=1,
-                jacobian=False).transpose(
-                2,
-                3)
-            dmo = self.mo(self.mo_scf(dao)).transpose(2, 3)
-            djast_dmo = (djast.unsqueeze(2) * dmo).sum(-1)
+        with self.geom.evaluation(pos):
 
-            d2jast = self.jastrow(x, derivative=2) / jast
-            d2jast_mo = d2jast.unsqueeze(-1) * mo
+            if self.kinetic != 'jacobi' or \
+                    not want & {'kinetic_energy', 'local_energy'}:
+                return super(Orbital, self)._evaluate(pos, want, res)
 
-        kin, psi = self.kinpool(mo, d2mo, djast_dmo, d2jast_mo)
+            kin, det, jast = self._kinetic_pooling_jacobi(
+                pos, return_jastrow=True)
+            psi = self.fc(det)
+            res.kinetic_energy = self.fc(kin) / psi
 
-        return self.fc(kin) / self.fc(psi)
+            if want & {'psi', 'log_psi', 'sign', 'drift'}:
+                res.psi = psi if jast is None else jast * psi
+
+            self._evaluate_potentials(pos, want, res)
+
+    def _kinetic_pooling_jacobi(self, x, return_jastrow=False):
+        """Compute the kinetic terms and the values of each determinant
+        using the Jacobi formula.
+
+        Arguments:
+            x {torch.tensor} -- positions of the electrons [nbatch, nelec*ndim]
+
+        Keyword Arguments:
+            return_jastrow {bool} -- also return the values of the
+                                     jastrow factor (default: {False})
+
+        Returns:
+            torch.tensor, torch.tensor -- kinetic terms and values
+                                          of the determinants [nbatch, nci]
+                                          (and jastrow factor or None)
+        """
+
+        with self.geom.evaluation(x):
+
+            mo = self._get_mo_vals(x)
+            d2mo = self._get_mo_vals(x, derivative=2)
+            djast_dmo, d2jast_mo, jast = None, None, None
+
+            if self.use_jastrow:
+
+                jast = self.jastrow(x)
+                djast = self.jastrow(x, derivative=1, jacobian=False)
+                djast = djast.transpose(1, 2) / jast.unsqueeze(-1)
+
+                dmo = self._get_mo_vals(x, derivative=1, jacobian=False)
+                djast_dmo = (djast.unsqueeze(2) * dmo).sum(-1)
+
+                d2jast = self.jastrow(x, derivative=2) / jast
+                d2jast_mo = d2jast.unsqueeze(-1) * mo
+
+            kin, det = self.kinpool(mo, d2mo, djast_dmo, d2jast_mo)
+            if return_jastrow:
+                return kin, det, jast
+            return kin, det
+
+    def get_ci_data(self, pos):
+        """Compute the quantities that do not depend on the CI coefficients.
+
+        When only the CI coefficients are optimized, the local energy is the
+        ratio of two linear functions of the coefficients and these data can
+        be reused as long as the positions do not change.
+
+        The kinetic terms are always computed with the Jacobi formula,
+        whatever the kinetic method of the wave function. They are exact and
+        thus differ from the ones of local_energy for kinetic='hutchinson'.
+
+        Arguments:
+            pos {torch.tensor} -- positions of the electrons [nbatch, nelec*ndim]
+
+        Returns:
+            SimpleNamespace -- kinetic terms and values of the determinants,
+                               jastrow factor and potential energy
+        """
+
+        with torch.no_grad(), self.geom.evaluation(pos):
+
+            kin, psi, jast = self._kinetic_pooling_jacobi(
+                pos, return_jastrow=True)
+
+            if jast is None:
+                jast = torch.ones(pos.shape[0], 1, device=self.device)
+
+            pot = self.nuclear_potential(pos) \
+                + self.electronic_potential(pos) \
+                + self.nuclear_repulsion()
+
+        return SimpleNamespace(kin=kin, psi=psi, jastrow=jast, potential=pot)
+
+    def local_energy_from_ci_data(self, data):
+        """Local energy from precomputed CI data
+
+        Arguments:
+            data {SimpleNamespace} -- output of get_ci_data
+
+        Returns:
+            torch.tensor -- values of the local energy [nbatch, 1]
+        """
+        return self.fc(data.kin) / self.fc(data.psi) + data.potential
+
+    def forward_from_ci_data(self, data):
+        """Values of the wave function from precomputed CI data
+
+        Arguments:
+            data {SimpleNamespace} -- output of get_ci_data
+
+        Returns:
+            torch.tensor -- values of the wave function [nbatch, 1]
+        """
+        return data.jastrow * self.fc(data.psi)
 
     def nuclear_potential(self, pos):
         """Computes the electron-nuclear term
@@ -235,19 +614,23 @@ class Orbital(WaveFunction):
 
         Returns:
             torch.tensor -- value of the electron-nuclear term [nbatch]
+        """
+        return self._cached('nuclear_potential', pos,
+                            lambda: self._nuclear_potential(pos),
+                            frozen=not self.ao.atom_coords.requires_grad)
 
-        TODO : vectorize that !!
+    def _nuclear_potential(self, pos):
+        """Computes the electron-nuclear term
+
+        Arguments:
+            pos {torch.tensor} -- positions of the electrons [nbatch, nelec*ndim]
+
+        Returns:
+            torch.tensor -- value of the electron-nuclear term [nbatch]
         """
 
-        p = torch.zeros(pos.shape[0], device=self.device)
-        for ielec in range(self.nelec):
-            pelec = pos[:, (ielec * self.ndim):(ielec + 1) * self.ndim]
-            for iatom in range(self.natom):
-                patom = self.ao.atom_coords[iatom, :]
-                Z = self.ao.atomic_number[iatom]
-                r = torch.sqrt(((pelec - patom)**2).sum(1))  # + 1E-12
-                p += -Z / r
-        return p.view(-1, 1)
+        invr = self.geom.en_inverse(pos, self.ao.atom_coords)
+        return -(self.atomic_charges * invr).sum((1, 2)).view(-1, 1)
 
     def electronic_potential(self, pos):
         """Computes the electron-electron term
@@ -257,21 +640,21 @@ class Orbital(WaveFunction):
 
         Returns:
             torch.tensor -- value of the el-el repulsion [nbatch]
+        """
+        return self._cached('electronic_potential', pos,
+                            lambda: self._electronic_potential(pos))
 
-        TODO : vectorize that !!
+    def _electronic_potential(self, pos):
+        """Computes the electron-electron term
+
+        Arguments:
+            pos {torch.tensor} -- positions of the electrons [nbatch, nelec*ndim]
+
+        Returns:
+            torch.tensor -- value of the el-el repulsion [nbatch]
         """
 
-        pot = torch.zeros(pos.shape[0], device=self.device)
-
-        for ielec1 in range(self.nelec - 1):
-            epos1 = pos[:, ielec1 *
-                        self.ndim:(ielec1 + 1) * self.ndim]
-            for ielec2 in range(ielec1 + 1, self.nelec):
-                epos2 = pos[:, ielec2 *
-                            self.ndim:(ielec2 + 1) * self.ndim]
-                r = torch.sqrt(((epos1 - epos2)**2).sum(1))  # + 1E-12
-                pot += (1. / r)
-        return pot.view(-1, 1)
+        return self.geom.ee_pair_inverse(pos).sum(1).view(-1, 1)
 
     def nuclear_repulsion(self):
         """Computes the nuclear-nuclear repulsion term
@@ -0,0 +1,85 @@
+import torch
+
+
+class Workspace(object):
+
+    def __init__(self):
+        """Preallocated buffers reused between evaluations of the
+        wave function with identical shapes (e.g. during the sampling).
+
+        A buffer is identified by its name, shape, dtype and device and
+        is overwritten by the next request of the same buffer. It must
+        therefore only hold intermediate quantities and is only used
+        without gradient (see Orbital.use_workspace).
+        """
+
+        self.buffers = {}
+        self.allocations = 0
+        self.reuses = 0
+
+    def zeros(self, name, shape, dtype=None, device=None):
+        """Buffer filled with zeros
+
+        Arguments:
+            name {hashable} -- name of the buffer
+            shape {tuple} -- shape of the buffer
+
+        Keyword Arguments:
+            dtype {torch.dtype} -- type of the buffer (default: {None})
+            device {torch.device} -- device of the buffer (default: {None})
+
+        Returns:
+            torch.tensor -- buffer
+        """
+        return self.empty(name, shape, dtype, device).zero_()
+
+    def empty(self, name, shape, dtype=None, device=None):
+        """Uninitialized buffer
+
+        Arguments:
+            name {hashable} -- name of the buffer
+            shape {tuple} -- shape of the buffer
+
+        Keyword Arguments:
+            dtype {torch.dtype} -- type of the buffer (default: {None})
+            device {torch.device} -- device of the buffer (default: {None})
+
+        Returns:
+            torch.tensor -- buffer
+        """
+
+        if dtype is None:
+            dtype = torch.get_default_dtype()
+        device = torch.device('cpu') if device is None \
+            else torch.device(device)
+
+        key = (name, tuple(shape), dtype, device)
+        if key in self.buffers:
+            self.reuses += 1
+        else:
+            self.buffers[key] = torch.empty(
+                shape, dtype=dtype, device=device)
+            self.allocations += 1
+
+        return self.buffers[key]
+
+    @property
+    def memory(self):
+        """Size of the buffers in bytes."""
+        return sum(b.numel() * b.element_size()
+                   for b in self.buffers.values())
+
+    def stats(self):
+        """Statistics of the workspace
+
+        Returns:
+            dict -- number of buffers, allocations, reuses and memory in bytes
+        """
+        return {'buffers': len(self.buffers),
+                'allocations': self.allocations,
+                'reuses': self.reuses,
+                'memory': self.memory}
+
+    def clear(self):
+        """Release the buffers."""
+        self.buffers = {}
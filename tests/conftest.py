@@ -0,0 +1,10 @@
+import pytest
+import torch
+
+
+@pytest.fixture(autouse=True)
+def isolate_rng():
+    """Restore the global RNG after each test so that the seeds set by
+    a test do not leak into the stochastic tests that follow it."""
+    with torch.random.fork_rng(devices=[]):
+        yield
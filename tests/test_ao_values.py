@@ -2,6 +2,8 @@ import torch
 from torch.autograd import Variable
 from deepqmc.wavefunction.wf_orbital import Orbital
 from deepqmc.wavefunction.molecule import Molecule
+from deepqmc.wavefunction.atomic_orbitals import AtomicOrbitals
+from deepqmc.wavefunction.spherical_harmonics import Harmonics
 from pyscf import gto
 
 import matplotlib.pyplot as plt
@@ -38,7 +40,7 @@ class TestAOvalues(unittest.TestCase):
 
         aovals = self.wf.ao(self.pos).detach().numpy()
         aovals_ref = self.m.eval_gto(
-            'GTOval_cart', self.pos.detach().numpy()[:, :3])
+            'GTOval_sph', self.pos.detach().numpy()[:, :3])
 
         assert np.allclose(
             aovals[:, 0, self.iorb], aovals_ref[:, self.iorb])
@@ -48,7 +50,7 @@ class TestAOvalues(unittest.TestCase):
         ip_aovals = self.wf.ao(
             self.pos, derivative=1).detach().numpy()
         ip_aovals_ref = self.m.eval_gto(
-            'GTOval_ip_cart', self.pos.detach().numpy()[:, :3])
+            'GTOval_ip_sph', self.pos.detach().numpy()[:, :3])
         ip_aovals_ref = ip_aovals_ref.sum(0)
 
         assert np.allclose(ip_aovals[:, 0, self.iorb],
@@ -60,7 +62,7 @@ class TestAOvalues(unittest.TestCase):
             self.pos, derivative=2).detach().numpy()
 
         ip_aovals_ref = self.m.eval_gto(
-            'GTOval_ip_cart', self.pos.detach().numpy()[:, :3])
+            'GTOval_ip_sph', self.pos.detach().numpy()[:, :3])
         ip_aovals_ref = ip_aovals_ref.sum(0)
 
         i2p_aovals_ref = np.gradient(
@@ -69,6 +71,79 @@ class TestAOvalues(unittest.TestCase):
         # assert np.allclose(i2p_aovals[:,0,self.iorb],i2p_aovals_ref)
 
 
+class TestSphericalAOvalues(unittest.TestCase):
+
+    def setUp(self):
+
+        torch.manual_seed(0)
+
+        # basis with d shells and general contractions
+        at = 'Li 0 0 -0.69; H 0 0 0.69'
+        self.mol = Molecule(atom=at,
+                            calculator='pyscf',
+                            basis='cc-pvdz',
+                            unit='bohr')
+
+        self.m = gto.M(atom=at, basis='cc-pvdz', unit='bohr')
+        self.ao = AtomicOrbitals(self.mol)
+
+        self.pos = torch.randn(10, self.mol.nelec * 3)
+        self.xyz = self.pos.reshape(-1, 3).numpy()
+
+    def test_nao(self):
+        """The AOs are the 5d spherical GTOs of the SCF."""
+        assert self.mol.basis.nao == self.m.nao_nr()
+
+    def test_ao(self):
+
+        aovals = self.ao(self.pos).reshape(-1, self.mol.basis.nao)
+        aovals_ref = self.m.eval_gto('GTOval_sph', self.xyz)
+
+        assert np.allclose(aovals.detach().numpy(), aovals_ref, atol=1E-6)
+
+    def test_ao_deriv(self):
+
+        ip_aovals = self.ao(self.pos, derivative=1, jacobian=False)
+        ip_aovals = ip_aovals.reshape(-1, self.mol.basis.nao, 3)
+        ip_aovals_ref = self.m.eval_gto('GTOval_ip_sph', self.xyz)
+
+        assert np.allclose(ip_aovals.detach().numpy(),
+                           ip_aovals_ref.transpose(1, 2, 0), atol=1E-5)
+
+    def test_ao_hess(self):
+
+        i2p_aovals = self.ao(self.pos, derivative=2)
+        i2p_aovals = i2p_aovals.reshape(-1, self.mol.basis.nao)
+        i2p_aovals_ref = self.m.eval_gto('GTOval_sph_deriv2', self.xyz)
+        i2p_aovals_ref = i2p_aovals_ref[[4, 7, 9]].sum(0)
+
+        assert np.allclose(i2p_aovals.detach().numpy(),
+                           i2p_aovals_ref, atol=1E-4)
+
+    def test_harmonics(self):
+        """Derivatives of the real spherical harmonics up to l=3."""
+
+        l = [lval for lval in range(4) for _ in range(2 * lval + 1)]
+        m = [mval for lval in range(4) for mval in range(-lval, lval + 1)]
+        harmonics = Harmonics('sph', bas_l=l, bas_m=m)
+
+        xyz = torch.randn(5, 2, 1, 3)
+        xyz = xyz.expand(-1, -1, len(l), -1).clone().requires_grad_()
+
+        Y = harmonics(xyz)
+        grad = torch.autograd.grad(Y.sum(), xyz, create_graph=True)[0]
+        lap = sum(torch.autograd.grad(grad[..., i].sum(), xyz,
+                                      retain_graph=True)[0][..., i]
+                  for i in range(3))
+
+        assert torch.allclose(harmonics(xyz, derivative=1, jacobian=False),
+                              grad, atol=1E-5)
+        assert torch.allclose(harmonics(xyz, derivative=1),
+                              grad.sum(-1), atol=1E-5)
+        assert torch.allclose(harmonics(xyz, derivative=2),
+                              lap, atol=1E-4)
+
+
 if __name__ == "__main__":
     # unittest.main()
     t = TestAOvalues()
@@ -0,0 +1,78 @@
+import torch
+import torch.optim as optim
+
+from deepqmc.wavefunction.wf_orbital import Orbital
+from deepqmc.wavefunction.molecule import Molecule
+from deepqmc.solver.solver_orbital import SolverOrbital
+from deepqmc.sampler.metropolis import Metropolis
+
+import unittest
+
+
+class TestCIData(unittest.TestCase):
+
+    def setUp(self):
+
+        torch.manual_seed(0)
+
+        # molecule
+        self.mol = Molecule(
+            atom='Li 0 0 -0.69; H 0 0 0.69',
+            unit='bohr',
+            calculator='pyscf',
+            basis='sto-3g')
+
+        # multi determinant wave function
+        self.wf = Orbital(self.mol, kinetic='jacobi',
+                          configs='single_double(2,2)',
+                          use_jastrow=True)
+        self.wf.fc.weight.data = torch.rand(1, self.wf.nci)
+
+        self.pos = 2 * torch.rand(10, self.mol.nelec * 3)
+
+    def test_ci_data(self):
+        """The CI data give the values and local energies of the
+        wave function."""
+
+        data = self.wf.get_ci_data(self.pos)
+
+        with torch.no_grad():
+            assert torch.allclose(self.wf.forward_from_ci_data(data),
+                                  self.wf(self.pos))
+            assert torch.allclose(self.wf.local_energy_from_ci_data(data),
+                                  self.wf.local_energy(self.pos))
+
+    def test_ci_eigen_solve(self):
+        """The eigen solve of the CI coefficients does not increase
+        the energy estimated on the samples."""
+
+        self.wf.fc.weight.data = torch.zeros(1, self.wf.nci)
+        self.wf.fc.weight.data[0, 0] = 1.
+
+        sampler = Metropolis(nwalkers=500, nstep=200, step_size=0.2,
+                             ndim=self.wf.ndim, nelec=self.wf.nelec,
+                             init=self.mol.domain('normal'),
+                             move={'type': 'all-elec-iter',
+                                   'proba': 'normal'})
+        opt = optim.Adam(self.wf.parameters(), lr=0.01)
+        solver = SolverOrbital(wf=self.wf, sampler=sampler, optimizer=opt)
+        pos = sampler.generate(self.wf.pdf, ntherm=100, ndecor=10,
+                               with_tqdm=False)
+
+        with torch.no_grad():
+            psi = self.wf(pos)
+            energy = self.wf.local_energy(pos).mean()
+
+            evalue = solver.ci_eigen_solve(pos)
+
+            # reweighted energy of the new coefficients
+            weight = (self.wf(pos) / psi)**2
+            eloc = self.wf.local_energy(pos)
+            new_energy = (weight * eloc).sum() / weight.sum()
+
+        assert evalue <= energy
+        assert new_energy <= energy
+
+
+if __name__ == "__main__":
+    unittest.main()
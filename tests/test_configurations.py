@@ -0,0 +1,162 @@
+import os
+import tempfile
+from math import comb
+
+import h5py
+import numpy as np
+import torch
+import torch.optim as optim
+from pyscf.fci import cistring
+
+from deepqmc.wavefunction.wf_orbital import Orbital
+from deepqmc.wavefunction.molecule import Molecule
+from deepqmc.wavefunction.orbital_configurations import (
+    OrbitalConfigurations, rank_combination, unrank_combination)
+from deepqmc.solver.solver_orbital import SolverOrbital
+from deepqmc.sampler.metropolis import Metropolis
+
+import unittest
+
+
+class TestConfigurations(unittest.TestCase):
+
+    def setUp(self):
+
+        torch.manual_seed(0)
+
+        # molecule
+        self.mol = Molecule(
+            atom='Li 0 0 -0.69; H 0 0 0.69',
+            unit='bohr',
+            calculator='pyscf',
+            basis='sto-3g')
+
+        self.orb_confs = OrbitalConfigurations(self.mol)
+
+        self.pos = 2 * torch.rand(10, self.mol.nelec * 3)
+
+    def test_ranking(self):
+        """Compare the ranking with the PySCF strings."""
+
+        for addr, string in enumerate(cistring.make_strings(range(6), 3)):
+            occ = [i for i in range(6) if (int(string) >> i) & 1]
+            assert unrank_combination(addr, 3) == occ
+            assert rank_combination(occ) == addr
+
+    def test_parse(self):
+        """Check the parsing of the configurations."""
+
+        cup, cdown = self.orb_confs.get_configs('cas(2, 4)')
+        assert len(cup) == comb(4, 1)**2
+
+        # same order as the enumeration, with the ground state first
+        nocc, nvirt = self.orb_confs._get_orb_number(2, 4)
+        ref = list(self.orb_confs.iter_cas_config(nocc, nvirt, 2))
+        assert [c.tolist() for c in cup] == [c[0] for c in ref]
+        assert [c.tolist() for c in cdown] == [c[1] for c in ref]
+        assert self.orb_confs.excitation_level((cup, cdown))[0] == 0
+
+        with self.assertRaises(ValueError):
+            self.orb_confs.get_configs('cas(2,4);print(1)')
+
+    def test_file(self):
+        """Read the CI coefficients of a file."""
+
+        ci = np.zeros((comb(4, 1), comb(4, 1)))
+        ci[0, 0], ci[1, 1], ci[2, 0], ci[3, 3] = 0.9, -0.3, 0.2, 1E-4
+
+        with tempfile.TemporaryDirectory() as tmp:
+            fname = os.path.join(tmp, 'ci.hdf5')
+            with h5py.File(fname, 'w') as h5:
+                h5['ci_coeffs'] = ci
+                h5['ncore'] = 1
+                h5['ncas'] = 4
+                h5['nelecas_up'] = 1
+                h5['nelecas_down'] = 1
+
+            wf = Orbital(self.mol, kinetic='jacobi', configs=fname,
+                         ci_threshold=1E-3, use_jastrow=False)
+
+        assert wf.nci == 3
+        assert torch.allclose(wf.fc.weight.data,
+                              torch.tensor([[0.9, 0.2, -0.3]]))
+        assert wf.configs[0].tolist() == [[0, 1], [0, 3], [0, 2]]
+        assert wf.configs[1].tolist() == [[0, 1], [0, 1], [0, 2]]
+
+    def test_save_ci_coeffs(self):
+        """The CASCI uses the orbitals of the wave function."""
+
+        calc = self.mol.calculator
+        with h5py.File(calc.out_file, 'r') as h5:
+            mos = h5['mos'][()]
+            e_scf = h5['TotalEnergy'][()]
+
+        with tempfile.TemporaryDirectory() as tmp:
+            fname = calc.save_ci_coeffs(
+                4, 2, file_name=os.path.join(tmp, 'ci.hdf5'))
+            with h5py.File(fname, 'r') as h5:
+                assert np.allclose(h5['mos'][()], mos)
+                assert h5['TotalEnergy'][()] < e_scf
+                ci = h5['ci_coeffs'][()]
+
+            wf = Orbital(self.mol, kinetic='jacobi', configs=fname,
+                         use_jastrow=False)
+
+        # the leading determinant is the RHF ground state
+        assert np.abs(ci[0, 0]) == np.abs(ci).max()
+        assert wf.configs[0][0].tolist() == [0, 1]
+        assert wf.configs[1][0].tolist() == [0, 1]
+
+    def test_prune(self):
+        """Prune the determinants with small CI weights."""
+
+        wf = Orbital(self.mol, kinetic='jacobi',
+                     configs='single_double(2,2)', use_jastrow=True)
+        wf.fc.weight.data = torch.rand(1, wf.nci)
+        wf.fc.weight.data[0, 1:3] = 1E-4
+
+        ref = wf(self.pos)
+        keep = torch.ones(wf.nci, dtype=torch.bool)
+        keep[1:3] = False
+        wf_nci = wf.nci
+
+        opt = optim.Adam(wf.parameters(), lr=0.01)
+        sampler = Metropolis(nwalkers=10, nstep=10, step_size=0.5,
+                             ndim=wf.ndim, nelec=wf.nelec,
+                             init=self.mol.domain('normal'))
+        solver = SolverOrbital(wf=wf, sampler=sampler, optimizer=opt)
+        solver.pruning(threshold=1E-2, patience=2)
+
+        solver._prune_configurations()
+        assert wf.nci == wf_nci
+
+        solver._prune_configurations()
+        assert wf.nci == wf_nci - 2
+        assert torch.allclose(wf(self.pos), ref, atol=1E-3)
+        assert any(p is wf.fc.weight for p in opt.param_groups[0]['params'])
+
+        # the optimizer still works with the resized parameter
+        opt.zero_grad()
+        wf(self.pos).sum().backward()
+        opt.step()
+
+        # the checkpoint restores the pruned expansion
+        new_wf = Orbital(self.mol, kinetic='jacobi',
+                         configs='single_double(2,2)', use_jastrow=True)
+        new_opt = optim.Adam(new_wf.parameters(), lr=0.01)
+        new_solver = SolverOrbital(wf=new_wf, sampler=sampler,
+                                   optimizer=new_opt)
+
+        with tempfile.TemporaryDirectory() as tmp:
+            fname = os.path.join(tmp, 'checkpoint.pth')
+            solver.save_checkpoint(0, 0., fname)
+            new_solver.load_checkpoint(fname)
+
+        assert new_wf.nci == wf.nci
+        assert torch.equal(new_wf.config_mask, wf.config_mask)
+        assert torch.equal(new_wf.configs[0], wf.configs[0])
+        assert torch.allclose(new_wf(self.pos), wf(self.pos))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,110 @@
+from itertools import combinations, product
+from types import SimpleNamespace
+
+import torch
+from torch.autograd import gradcheck, gradgradcheck
+
+from deepqmc.wavefunction.slater_pooling import (BatchDeterminant,
+                                                 SlaterPooling)
+from deepqmc.wavefunction.kinetic_pooling import (BatchDeterminantTrace,
+                                                  KineticPooling)
+from deepqmc.utils.small_matrix import det_inverse_logdet
+
+import unittest
+
+
+def cofactors(M):
+    """Cofactor matrices computed with explicit minors."""
+    n = M.shape[-1]
+    C = torch.zeros_like(M)
+    for i in range(n):
+        for j in range(n):
+            m = torch.cat([M[..., :i, :], M[..., i + 1:, :]], -2)
+            m = torch.cat([m[..., :j], m[..., j + 1:]], -1)
+            C[..., i, j] = (-1)**(i + j) * torch.det(m)
+    return C
+
+
+class TestDeterminant(unittest.TestCase):
+
+    def setUp(self):
+        torch.manual_seed(0)
+        self.dtype = torch.float64
+
+    def test_small_matrix_kernels(self):
+        """Compare the kernels of all sizes with torch.linalg."""
+        for n in range(11):
+            A = torch.rand(4, 6, n, n, dtype=self.dtype)
+            det, inv, logdet = det_inverse_logdet(A)
+            assert torch.allclose(det, torch.linalg.det(A))
+            assert torch.allclose(logdet, torch.linalg.slogdet(A)[1])
+            assert torch.allclose(inv, torch.linalg.inv(A))
+
+    def test_gradients(self):
+        """Check the first and second derivatives."""
+        for n in [1, 2, 4]:
+            A = torch.rand(3, 5, n, n, dtype=self.dtype, requires_grad=True)
+            B = torch.rand(3, 5, n, n, dtype=self.dtype, requires_grad=True)
+            assert gradcheck(BatchDeterminant.apply, (A,))
+            assert gradgradcheck(BatchDeterminant.apply, (A,))
+            assert gradcheck(BatchDeterminantTrace.apply, (A, B))
+            assert gradgradcheck(BatchDeterminantTrace.apply, (A, B))
+
+    def test_singular(self):
+        """Check the gradients of singular matrices."""
+
+        A = torch.rand(5, 3, 3, dtype=self.dtype)
+        A[:, 2] = A[:, 0] + A[:, 1]
+        A.requires_grad = True
+        B = torch.rand(5, 3, 3, dtype=self.dtype, requires_grad=True)
+
+        det = BatchDeterminant.apply(A)
+        grad_det = torch.autograd.grad(det.sum(), A)[0]
+        assert torch.allclose(grad_det, cofactors(A.detach()))
+
+        det, K = BatchDeterminantTrace.apply(A, B)
+        assert torch.allclose(K, (cofactors(A) * B).sum((-1, -2)))
+        grad_A, grad_B = torch.autograd.grad(K.sum(), (A, B))
+
+        Aref = A.detach().requires_grad_()
+        Kref = (cofactors(Aref) * B.detach()).sum((-1, -2))
+        grad_Aref = torch.autograd.grad(Kref.sum(), Aref)[0]
+        assert torch.allclose(grad_A, grad_Aref)
+        assert torch.allclose(grad_B, cofactors(A.detach()))
+
+    def test_unique_spin_determinants(self):
+        """Check the pooling of product configurations."""
+
+        mol = SimpleNamespace(nup=2, ndown=2,
+                              basis=SimpleNamespace(nmo=5))
+        occ = [list(c) for c in combinations(range(5), 2)]
+        cup, cdown = zip(*product(occ, occ))
+        configs = (torch.LongTensor(cup), torch.LongTensor(cdown))
+
+        pool = SlaterPooling(configs, mol)
+        kinpool = KineticPooling(configs, mol)
+        assert pool.orb_proj.Pup.shape[0] == len(occ)
+        assert pool.orb_proj.Pdown.shape[0] == len(occ)
+
+        mo = torch.rand(7, 4, 5)
+        d2mo = torch.rand(7, 4, 5)
+
+        det = pool(mo)
+        kin, det_kin = kinpool(mo, d2mo)
+
+        for ic, (up, down) in enumerate(zip(*configs)):
+            Aup, Adown = mo[:, :2][..., up], mo[:, 2:][..., down]
+            Bup, Bdown = d2mo[:, :2][..., up], d2mo[:, 2:][..., down]
+            dup, ddown = torch.det(Aup), torch.det(Adown)
+            ref = -0.5 * dup * ddown * (
+                torch.linalg.solve(Aup, Bup).diagonal(
+                    dim1=-2, dim2=-1).sum(-1) +
+                torch.linalg.solve(Adown, Bdown).diagonal(
+                    dim1=-2, dim2=-1).sum(-1))
+            assert torch.allclose(det[:, ic], dup * ddown, atol=1E-6)
+            assert torch.allclose(det_kin[:, ic], dup * ddown, atol=1E-6)
+            assert torch.allclose(kin[:, ic], ref, atol=1E-4)
+
+
+if __name__ == "__main__":
+    unittest.main()
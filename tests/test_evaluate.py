@@ -0,0 +1,79 @@
+import torch
+from torch.autograd import grad
+
+from deepqmc.wavefunction.wf_orbital import Orbital
+from deepqmc.wavefunction.molecule import Molecule
+
+import unittest
+
+
+class TestEvaluate(unittest.TestCase):
+
+    def setUp(self):
+
+        torch.manual_seed(0)
+
+        # molecule
+        self.mol = Molecule(
+            atom='H 0 0 -0.69; H 0 0 0.69',
+            unit='bohr',
+            calculator='pyscf',
+            basis='sto-3g')
+
+        self.pos = torch.rand(10, self.mol.nelec * 3)
+        self.pos.requires_grad = True
+
+    def _check(self, wf):
+        """Compare the output of evaluate with the individual methods."""
+
+        res = wf.evaluate(self.pos)
+
+        psi = wf(self.pos)
+        assert torch.allclose(res.psi, psi)
+        assert torch.allclose(res.log_psi, torch.log(torch.abs(psi)))
+        assert torch.allclose(res.sign, torch.sign(psi))
+        assert torch.allclose(res.local_energy, wf.local_energy(self.pos))
+        assert torch.allclose(res.nuclear_potential,
+                              wf.nuclear_potential(self.pos))
+        assert torch.allclose(res.electronic_potential,
+                              wf.electronic_potential(self.pos))
+
+        dpsi = grad(psi, self.pos, grad_outputs=torch.ones_like(psi))[0]
+        assert torch.allclose(res.drift, dpsi / psi)
+
+    def test_evaluate_jacobi(self):
+        wf = Orbital(self.mol, kinetic='jacobi',
+                     configs='single(2,2)', use_jastrow=True)
+        self._check(wf)
+
+    def test_evaluate_auto(self):
+        wf = Orbital(self.mol, kinetic='auto',
+                     configs='single(2,2)', use_jastrow=True)
+        self._check(wf)
+
+    def test_evaluate_hutchinson(self):
+        """Compare the stochastic kinetic energy with the exact one."""
+        wf = Orbital(self.mol, kinetic='auto',
+                     configs='single(2,2)', use_jastrow=True)
+        ref = wf.evaluate(self.pos, want='kinetic_energy').kinetic_energy
+
+        wf.kinetic = 'hutchinson'
+        for probe, cv in [('rademacher', False), ('gaussian', True)]:
+            wf.set_hutchinson(nprobe=500, probe=probe, control_variate=cv)
+            ke = wf.evaluate(self.pos, want='kinetic_energy').kinetic_energy
+            err = 6 * torch.sqrt(wf.kinetic_variance)
+            assert ((ke - ref).abs() < err).all()
+
+    def test_evaluate_no_grad(self):
+        """Check that the drift is available without gradients."""
+        wf = Orbital(self.mol, kinetic='jacobi',
+                     configs='single(2,2)', use_jastrow=True)
+        with torch.no_grad():
+            res = wf.evaluate(self.pos.detach(), want=['psi', 'drift'])
+        assert res.local_energy is None
+        assert not res.psi.requires_grad
+        assert res.drift.shape == self.pos.shape
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,72 @@
+import torch
+
+from deepqmc.wavefunction.wf_orbital import Orbital
+from deepqmc.wavefunction.molecule import Molecule
+
+import unittest
+
+
+class TestGeometry(unittest.TestCase):
+
+    def setUp(self):
+
+        torch.manual_seed(0)
+
+        # molecule
+        self.mol = Molecule(
+            atom='Li 0 0 -0.69; H 0 0 0.69',
+            unit='bohr',
+            calculator='pyscf',
+            basis='sto-3g')
+
+        self.wf = Orbital(self.mol, kinetic='jacobi',
+                          configs='single(2,2)',
+                          use_jastrow=True)
+
+        self.pos = 2 * torch.rand(10, self.mol.nelec * 3)
+
+    def test_potentials(self):
+        """Compare the potentials with an explicit loop."""
+
+        pos = self.pos.view(-1, self.wf.nelec, 3)
+        atom_coords = self.wf.ao.atom_coords
+
+        ven = torch.zeros(pos.shape[0])
+        vee = torch.zeros(pos.shape[0])
+        for i in range(self.wf.nelec):
+            for iat in range(self.wf.natom):
+                r = (pos[:, i, :] - atom_coords[iat]).norm(dim=1)
+                ven -= self.mol.atomic_number[iat] / r
+            for j in range(i + 1, self.wf.nelec):
+                vee += 1. / (pos[:, i, :] - pos[:, j, :]).norm(dim=1)
+
+        assert torch.allclose(
+            self.wf.nuclear_potential(self.pos).view(-1), ven)
+        assert torch.allclose(
+            self.wf.electronic_potential(self.pos).view(-1), vee)
+
+    def test_ao_values(self):
+        """Compare the AOs computed with the shared geometry."""
+
+        for der in [0, 1, 2]:
+            assert torch.allclose(
+                self.wf._get_ao_vals(self.pos, derivative=der),
+                self.wf.ao(self.pos, derivative=der))
+
+    def test_evaluation_scope(self):
+        """Check that the geometry is shared only within a scope."""
+
+        atom_coords = self.wf.ao.atom_coords
+        with self.wf.geom.evaluation(self.pos):
+            r1 = self.wf.geom.en_distances(self.pos, atom_coords)
+            r2 = self.wf.geom.en_distances(self.pos, atom_coords)
+            assert r1 is r2
+
+        assert len(self.wf.geom.data) == 0
+        r3 = self.wf.geom.en_distances(self.pos, atom_coords)
+        assert r3 is not r1
+        assert torch.allclose(r1, r3)
+
+
+if __name__ == "__main__":
+    unittest.main()
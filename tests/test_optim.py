@@ -0,0 +1,138 @@
+import torch
+from torch.autograd import grad
+
+from deepqmc.wavefunction.wf_orbital import Orbital
+from deepqmc.wavefunction.molecule import Molecule
+from deepqmc.optim.sr import StochasticReconfiguration
+from deepqmc.optim.linear_method import LinearMethod
+from deepqmc.utils.torch_utils import batch_jacobian
+
+import unittest
+
+
+class TestOptim(unittest.TestCase):
+
+    def setUp(self):
+
+        torch.manual_seed(0)
+
+        # molecule
+        self.mol = Molecule(
+            atom='H 0 0 -0.69; H 0 0 0.69',
+            unit='bohr',
+            calculator='pyscf',
+            basis='sto-3g')
+
+        # wave function
+        self.wf = Orbital(self.mol, kinetic='jacobi',
+                          configs='single(2,2)',
+                          use_jastrow=True)
+
+        self.pos = torch.rand(10, self.mol.nelec * 3)
+        self.params = [p for p in self.wf.parameters() if p.requires_grad]
+
+    def test_batch_jacobian(self):
+        """Compare the batched jacobian with a backward per walker."""
+
+        psi = self.wf(self.pos).view(-1)
+        jac = batch_jacobian(psi, self.params, chunk_size=3)
+
+        for iw in range(len(psi)):
+            g = grad(psi[iw], self.params, retain_graph=True,
+                     allow_unused=True)
+            g = torch.cat([torch.zeros(p.numel()) if gi is None
+                           else gi.view(-1)
+                           for gi, p in zip(g, self.params)])
+            assert torch.allclose(jac[iw], g)
+
+    def test_sr_conjugate_gradient(self):
+        """Compare the matrix free CG with a dense solve of the SR equations."""
+
+        opt = StochasticReconfiguration(
+            self.wf.parameters(), wf=self.wf, diag_shift=1E-2,
+            maxiter=500, tol=1E-10)
+
+        O = opt.get_log_derivatives(self.pos, self.params).detach()
+        O = O - O.mean(0)
+        b = torch.rand(O.shape[1])
+
+        x = opt.conjugate_gradient(O, b)
+
+        S = O.t() @ O / O.shape[0] + 1E-2 * torch.eye(O.shape[1])
+        assert torch.allclose(S @ x, b, atol=1E-5)
+
+    def test_sr_local_energy(self):
+        """The local energies of the loss give the same SR step."""
+
+        params = [p.detach().clone() for p in self.params]
+        opt = StochasticReconfiguration(self.wf.parameters(), wf=self.wf)
+
+        eloc = self.wf.local_energy(self.pos)
+        opt.step(self.pos, eloc)
+        new = [p.detach().clone() for p in self.params]
+
+        with torch.no_grad():
+            for p, p0 in zip(self.params, params):
+                p.copy_(p0)
+        opt.step(self.pos)
+
+        for p, pn in zip(self.params, new):
+            assert torch.allclose(p, pn)
+
+    def test_linear_method(self):
+        """Check the matrices of the linear method and its update."""
+
+        opt = LinearMethod(self.wf.parameters(), wf=self.wf)
+
+        eloc, O, dEl = opt.get_derivatives(self.pos, self.params)
+        H, S = opt.get_matrices(eloc, O, dEl)
+        nparam = O.shape[1]
+        assert H.shape == (nparam + 1, nparam + 1)
+        assert torch.allclose(S, S.t())
+        assert torch.allclose(H[0, 0], eloc.mean())
+
+        # lowest eigenvector of a rotated spectrum
+        V = torch.linalg.qr(torch.rand(3, 3))[0]
+        H = V @ torch.diag(torch.tensor([-1., 0., 1.])) @ V.t()
+        opt.max_update = 1E6
+        dp = opt.solve(H, torch.eye(3))
+        assert torch.allclose(opt._normalize_update(V[1:, 0] / V[0, 0],
+                                                    torch.eye(2)), dp)
+        assert torch.allclose(torch.tensor(opt.eigenvalue), torch.tensor(-1.))
+
+    def test_linear_method_normalization(self):
+        """Compare the xi normalization with its closed form."""
+
+        opt = LinearMethod(self.wf.parameters(), wf=self.wf)
+        dp = torch.tensor([0.3, -0.4])
+        S = torch.diag(torch.tensor([2., 1.]))
+
+        q = 2 * 0.3**2 + 0.4**2
+        D = (1 + q)**0.5
+        for xi, denom in [(0., 1. + q),
+                          (0.5, 1. + 0.5 * q / (0.5 + 0.5 * D)),
+                          (1., 1.)]:
+            opt.xi = xi
+            assert torch.allclose(opt._normalize_update(dp, S), dp / denom)
+
+    def test_linear_method_local_energy(self):
+        """The local energies of the loss give the same update."""
+
+        params = [p.detach().clone() for p in self.params]
+        opt = LinearMethod(self.wf.parameters(), wf=self.wf)
+
+        eloc = self.wf.local_energy(self.pos)
+        opt.step(self.pos, eloc)
+        new = [p.detach().clone() for p in self.params]
+
+        with torch.no_grad():
+            for p, p0 in zip(self.params, params):
+                p.copy_(p0)
+        opt.step(self.pos)
+
+        for p, pn in zip(self.params, new):
+            assert torch.allclose(p, pn, atol=1E-5)
+
+
+if __name__ == "__main__":
+    unittest.main()
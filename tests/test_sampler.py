@@ -0,0 +1,554 @@
+import os
+import tempfile
+import types
+
+import torch
+import torch.optim as optim
+from torch import nn
+
+from deepqmc.wavefunction.wf_base import WaveFunction
+from deepqmc.wavefunction.wf_orbital import Orbital
+from deepqmc.solver.solver_orbital import SolverOrbital
+
+from deepqmc.sampler.metropolis import Metropolis
+from deepqmc.sampler.generalized_metropolis import GeneralizedMetropolis
+from deepqmc.sampler.hamiltonian import Hamiltonian
+from deepqmc.sampler.parallel_sampler import ParallelSampler
+from deepqmc.sampler.walkers import Walkers
+from deepqmc.sampler.diagnostics import (
+    mser, integrated_autocorrelation_time)
+from deepqmc.wavefunction.molecule import Molecule
+
+import unittest
+
+
+class TestSampler(unittest.TestCase):
+
+    def setUp(self):
+
+        # molecule
+        self.mol = Molecule(
+            atom='H 0 0 -0.69; H 0 0 0.69',
+            unit='bohr',
+            calculator='pyscf',
+            basis='sto-3g')
+
+        # wave function
+        self.wf = Orbital(self.mol, kinetic='jacobi',
+                          configs='ground_state',
+                          use_jastrow=True)
+
+        kwargs = dict(nwalkers=10, nstep=50, step_size=0.5,
+                      ndim=self.wf.ndim, nelec=self.wf.nelec,
+                      init=self.mol.domain('normal'))
+
+        self.samplers = [Metropolis(**kwargs),
+                         GeneralizedMetropolis(**kwargs),
+                         Hamiltonian(**kwargs)]
+
+    def test_buffer(self):
+        """All the decorrelated positions are returned."""
+
+        for sampler in self.samplers:
+            pos = sampler.generate(self.wf.pdf, ntherm=5, ndecor=10,
+                                   with_tqdm=False)
+            assert pos.shape == (sampler.get_sampling_size(5, 10),
+                                 self.wf.nelec * self.wf.ndim)
+            assert pos.shape[0] == 5 * sampler.nwalkers
+
+    def test_stream(self):
+        """The streamed blocks are the positions of the buffer."""
+
+        sampler = self.samplers[0]
+
+        torch.manual_seed(0)
+        ref = sampler.generate(self.wf.pdf, ntherm=5, ndecor=10,
+                               with_tqdm=False)
+
+        torch.manual_seed(0)
+        blocks = sampler.generate(self.wf.pdf, ntherm=5, ndecor=10,
+                                  with_tqdm=False, stream=True)
+
+        pos = []
+        for block in blocks:
+            # the sampling does not disable the grad of the consumer
+            assert torch.is_grad_enabled()
+            pos.append(block)
+
+        assert torch.equal(torch.cat(pos), ref)
+
+    def test_adaptive_step_size(self):
+        """The step size reaches the target acceptance and is frozen
+        during the production steps."""
+
+        def pdf(pos):
+            return torch.exp(-(pos**2).sum(1))
+
+        torch.manual_seed(0)
+        for per_walker in [False, True]:
+
+            sampler = Metropolis(nwalkers=100, nstep=200, step_size=5.,
+                                 nelec=2, ndim=3, init={'min': -1, 'max': 1},
+                                 move={'type': 'all-elec', 'proba': 'normal'})
+            sampler.adaptive_step_size(target=0.5, per_walker=per_walker)
+            pos = sampler.generate(pdf, ntherm=150, ndecor=1,
+                                   with_tqdm=False)
+
+            step_size = torch.as_tensor(sampler.step_size)
+            assert step_size.numel() == (100 if per_walker else 1)
+            assert torch.all(step_size < 1.)
+
+            # acceptance during the production
+            pos = pos.view(-1, sampler.nwalkers, 6)
+            moved = ((pos[1:] - pos[:-1]) != 0).any(-1).float()
+            assert abs(moved.mean().item() - 0.5) < 0.1
+
+    def test_nuclear_scale(self):
+        """The nucleus-scaled moves sample the right distribution."""
+
+        atom_coords = torch.tensor([[0., 0., 0.], [0., 0., 3.]])
+
+        def pdf(pos):
+            pos = pos.view(-1, 2, 1, 3)
+            r = (pos - atom_coords).norm(dim=-1)
+            return torch.exp(-12 * r[:, 0, 0] - 2 * r[:, 1, 1])
+
+        torch.manual_seed(0)
+        for proba in ['uniform', 'normal']:
+            sampler = Metropolis(
+                nwalkers=200, nstep=600, step_size=1., nelec=2, ndim=3,
+                init={'min': -1, 'max': 1},
+                move={'type': 'all-elec-iter', 'proba': proba,
+                      'scale': 'nucleus', 'atom_coords': atom_coords})
+            pos = sampler.generate(pdf, ntherm=200, ndecor=5,
+                                   with_tqdm=False).view(-1, 2, 1, 3)
+
+            # <r> = 3/(2 zeta) for a density exp(-zeta r)
+            r = (pos - atom_coords).norm(dim=-1)
+            assert abs(r[:, 0, 0].mean().item() - 0.25) < 0.02
+            assert abs(r[:, 1, 1].mean().item() - 1.5) < 0.1
+
+        with self.assertRaises(ValueError):
+            Metropolis(nwalkers=10, nelec=2, ndim=3,
+                       move={'type': 'all-elec', 'proba': 'normal',
+                             'scale': 'nucleus'})
+
+    def test_multiple_try(self):
+        """The multiple-try moves sample the right distribution
+        with a smaller autocorrelation time per step."""
+
+        def pdf(pos):
+            r = pos.view(-1, 2, 3).norm(dim=-1)
+            return torch.exp(-2 * r.sum(1))
+
+        torch.manual_seed(0)
+        tau = []
+        for ntry in [1, 8]:
+            sampler = Metropolis(
+                nwalkers=200, nstep=500, step_size=1., nelec=2, ndim=3,
+                init={'min': -1, 'max': 1},
+                move={'type': 'all-elec', 'proba': 'normal', 'ntry': ntry})
+            pos = sampler.generate(pdf, ntherm=100, ndecor=1,
+                                   with_tqdm=False)
+
+            # <r> = 3/2 for a density exp(-2 r)
+            r = pos.view(-1, 200, 2, 3).norm(dim=-1).mean(-1)
+            assert abs(r.mean().item() - 1.5) < 0.05
+            tau.append(integrated_autocorrelation_time(r))
+
+        assert tau[1] < tau[0]
+
+        with self.assertRaises(ValueError):
+            Metropolis(nwalkers=10, nelec=2, ndim=3,
+                       move={'type': 'all-elec', 'proba': 'normal',
+                             'ntry': 4, 'scale': 'nucleus',
+                             'atom_coords': [[0., 0., 0.]]})
+
+    def test_scf_init(self):
+        """The walkers are drawn from the density of the SCF orbitals."""
+
+        torch.manual_seed(0)
+        walkers = Walkers(nwalkers=20000, nelec=self.mol.nelec, ndim=3,
+                          init=self.mol.domain('scf'))
+        walkers.initialize()
+        assert walkers.pos.shape == (20000, self.mol.nelec * 3)
+        assert torch.isfinite(walkers.pos).all()
+
+        # the rejection stops after max_rounds
+        with self.assertWarns(UserWarning):
+            pos = walkers._init_scf(100, max_rounds=0)
+        assert torch.isfinite(pos).all()
+
+        # single center : the mixture is the exact orbital density
+        mol = Molecule(atom='He 0 0 0', unit='bohr',
+                       calculator='pyscf', basis='6-31g')
+        walkers = Walkers(nwalkers=20000, nelec=mol.nelec, ndim=3,
+                          init=mol.domain('scf'))
+        walkers.initialize()
+        r = walkers.pos.view(-1, 3).norm(dim=-1)
+
+        # <r> of the 1s orbital on a radial grid
+        wf = Orbital(mol, configs='ground_state', use_jastrow=False)
+        mos = torch.as_tensor(mol.calculator.get_mo_coeffs()[:, 0])
+        grid = torch.linspace(1E-4, 10., 2000)
+        pos = torch.zeros(len(grid), mol.nelec * 3)
+        pos[:, 2::3] = grid.unsqueeze(-1)
+        with torch.no_grad():
+            phi = wf.ao(pos)[:, 0] @ mos.to(pos)
+        rho = grid**2 * phi**2
+        assert abs(r.mean() - (grid * rho).sum() / rho.sum()) < 0.01
+
+    def test_diagnostics(self):
+        """Equilibration and autocorrelation time of AR(1) processes."""
+
+        torch.manual_seed(0)
+        nstep, nwalkers, phi = 2000, 50, 0.9
+
+        noise = torch.randn(nstep, nwalkers)
+        trace = torch.zeros(nstep, nwalkers)
+        for t in range(1, nstep):
+            trace[t] = phi * trace[t - 1] + noise[t]
+
+        tau = integrated_autocorrelation_time(trace)
+        assert abs(tau - (1 + phi) / (1 - phi)) < 2.
+
+        # initial transient
+        trace += 10 * torch.exp(-torch.arange(nstep) / 50.).view(-1, 1)
+        ntrunc = mser(trace.mean(1))
+        assert 100 < ntrunc < nstep // 2
+
+        # drift along the whole trace
+        assert mser(torch.arange(nstep).double()) > nstep // 2
+
+    def test_auto_sampling(self):
+        """Thermalization and decorrelation detected during the sampling."""
+
+        def pdf(pos):
+            return torch.exp(-(pos**2).sum(1))
+
+        torch.manual_seed(0)
+        sampler = Metropolis(nwalkers=100, nstep=1500, step_size=0.5,
+                             nelec=2, ndim=3, init={'min': 1, 'max': 2},
+                             move={'type': 'all-elec', 'proba': 'normal'})
+        pos = sampler.generate(pdf, ntherm='auto', ndecor='auto',
+                               with_tqdm=False)
+
+        diag = sampler.diagnostics
+        assert diag.ntherm < sampler.nstep - 1
+        assert diag.ndecor > 1
+        assert pos.shape[0] == sampler.get_sampling_size(
+            diag.ntherm, diag.ndecor)
+
+        # the trace is only recorded until the detection
+        assert diag.log_pdf.shape[0] == diag.ntherm + 1
+        assert not diag.record
+
+        # autocorrelation time of the production steps of a new chain
+        chain = sampler.generate(pdf, ntherm=0, ndecor=1, with_tqdm=False)
+        assert sampler.diagnostics.log_pdf is None
+        log_pdf = torch.log(pdf(chain)).view(sampler.nstep, -1)
+        tau = integrated_autocorrelation_time(log_pdf[diag.ntherm:])
+        assert abs(diag.tau - tau) < 0.3 * tau
+
+        # <r^2> = ndim * nelec / 2
+        assert abs((pos**2).sum(1).mean().item() - 3.) < 0.1
+
+    def test_wave_function_pdf(self):
+        """Only the pdf of the wave function is replaced by its
+        single pass evaluation, not the other methods bound to it."""
+
+        pos = torch.rand(5, self.wf.nelec * 3)
+
+        def half_pdf(wf, x):
+            return 0.5 * wf.pdf(x)
+        custom = types.MethodType(half_pdf, self.wf)
+
+        rho, _ = self.samplers[1].get_pdf_drift(custom, pos.clone())
+        assert torch.allclose(rho, 0.5 * self.wf.pdf(pos).view(-1))
+        rho, _ = self.samplers[1].get_pdf_drift(self.wf.pdf, pos.clone())
+        assert torch.allclose(rho, self.wf.pdf(pos).view(-1))
+
+        log_pdf = Hamiltonian.get_log_pdf(custom)
+        assert torch.allclose(log_pdf(pos),
+                              torch.log(0.5 * self.wf.pdf(pos)).view(-1))
+        assert Hamiltonian.get_log_pdf(self.wf.pdf) == self.wf.log_pdf
+
+    def test_hamiltonian(self):
+        """HMC with dual averaging of the step size of each walker."""
+
+        def pdf(pos):
+            pos = pos.view(-1, 2, 3)
+            return torch.exp(-2 * (pos[..., :2]**2).sum((1, 2))
+                             - 3.5 * (pos[..., 2]**2).sum(1))
+
+        torch.manual_seed(0)
+        sampler = Hamiltonian(nwalkers=100, nstep=300, step_size=0.5,
+                              nelec=2, ndim=3, init={'min': -1, 'max': 1})
+        pos = sampler.generate(pdf, ntherm=150, ndecor=1,
+                               with_tqdm=False).view(-1, 2, 3)
+
+        assert sampler.step_size.shape == (100, 1)
+        rate = sampler.acceptance.accepted / sampler.acceptance.proposed
+        assert abs(rate - 0.65) < 0.1
+
+        # <x^2> = 1 / (2 alpha)
+        assert abs((pos[..., 0]**2).mean().item() - 0.25) < 0.02
+        assert abs((pos[..., 2]**2).mean().item() - 1 / 7.) < 0.015
+
+        # the gradients of the wave function are not accumulated
+        self.wf.zero_grad()
+        sampler = Hamiltonian(nwalkers=10, nstep=5, step_size=0.1, L=3,
+                              nelec=self.wf.nelec, ndim=self.wf.ndim,
+                              init=self.mol.domain('normal'))
+        sampler.generate(self.wf.pdf, ntherm=0, ndecor=1, with_tqdm=False)
+        assert all(p.grad is None for p in self.wf.parameters())
+
+    def test_recycling(self):
+        """The walkers trapped in a narrow peak are recycled."""
+
+        center = torch.full((6,), 4.)
+
+        def pdf(pos):
+            return torch.exp(-(pos**2).sum(1)) + \
+                1E3 * torch.exp(-200 * ((pos - center)**2).sum(1))
+
+        def trapped(pos):
+            return (((pos - center)**2).sum(1) < 1).sum().item()
+
+        kwargs = dict(nwalkers=100, nstep=200, step_size=0.5, nelec=2,
+                      ndim=3, init={'min': -1, 'max': 1},
+                      move={'type': 'all-elec', 'proba': 'normal'})
+
+        torch.manual_seed(0)
+        for source in ['walker', 'init']:
+            sampler = Metropolis(**kwargs)
+            sampler.recycling(max_age=50, source=source)
+
+            pos = sampler.walkers.sample_domain(100)
+            pos[:5] = center
+            pos = sampler.generate(pdf, ntherm=100, ndecor=10, pos=pos,
+                                   with_tqdm=False)
+
+            assert trapped(pos) == 0
+            assert sampler.recycle.count == 5
+            assert sampler.walkers.status.max() < 50
+
+        # exclusion of the samples without recycling
+        sampler = Metropolis(**kwargs)
+        sampler.recycling(max_age=None, exclude_age=20)
+
+        pos = sampler.walkers.sample_domain(100)
+        pos[:5] = center
+        pos = sampler.generate(pdf, ntherm=100, ndecor=10, pos=pos,
+                               with_tqdm=False)
+
+        assert trapped(pos) == 0
+        assert sampler.recycle.excluded == 50
+        assert pos.shape[0] == 950
+
+    def test_screening_pdf(self):
+        """The delayed acceptance samples the exact density even
+        with a biased screening density."""
+
+        class Gaussian(WaveFunction):
+
+            def __init__(self):
+                super().__init__(nelec=1, ndim=3)
+
+            def forward(self, pos):
+                return torch.exp(-0.5 * (pos**2).sum(1, keepdim=True))
+
+            def screening_pdf(self):
+                return lambda pos: torch.exp(-((pos - 1.)**2).sum(1))
+
+        torch.manual_seed(0)
+        gauss = Gaussian()
+        sampler = Metropolis(nwalkers=500, nstep=500, step_size=1.,
+                             nelec=1, ndim=3, init={'min': -1, 'max': 1},
+                             move={'type': 'all-elec', 'proba': 'normal'})
+        assert sampler._screening_pdf(gauss.pdf) is not None
+
+        pos = sampler.generate(gauss.pdf, ntherm=200, ndecor=10,
+                               with_tqdm=False)
+        assert pos.mean(0).abs().max() < 0.05
+        assert abs((pos**2).mean().item() - 0.5) < 0.05
+
+    def test_parallel(self):
+        """Sampling of the walkers by several processes."""
+
+        class Gaussian(nn.Module):
+
+            def __init__(self):
+                super().__init__()
+                self.center = nn.Parameter(torch.zeros(6))
+
+            def pdf(self, pos):
+                return torch.exp(-((pos - self.center)**2).sum(1))
+
+        gauss = Gaussian()
+        sampler = Metropolis(nwalkers=100, nstep=200, step_size=1.,
+                             nelec=2, ndim=3, init={'min': -1, 'max': 1},
+                             move={'type': 'all-elec', 'proba': 'normal'})
+        parallel = ParallelSampler(sampler, nprocs=2, seed=0)
+
+        pos = parallel.generate(gauss.pdf, ntherm=100, ndecor=10,
+                                with_tqdm=False)
+        assert pos.shape == (1000, 6)
+        assert abs((pos**2).sum(1).mean().item() - 3.) < 0.3
+        assert parallel.walkers.pos.shape == (100, 6)
+
+        # independent random streams
+        pos = pos.view(-1, 2, 50, 6)
+        assert not torch.allclose(pos[:, 0], pos[:, 1])
+
+        # in-place updates of the parameters are shared
+        pids = [proc.pid for proc in parallel.pool.procs]
+        with torch.no_grad():
+            gauss.center += 2.
+        pos = parallel.generate(gauss.pdf, ntherm=100, ndecor=10,
+                                with_tqdm=False)
+        assert abs(pos.mean().item() - 2.) < 0.2
+        assert pids == [proc.pid for proc in parallel.pool.procs]
+
+        # new parameters are sent to new processes
+        gauss.center = nn.Parameter(torch.ones(6))
+        pos = parallel.generate(gauss.pdf, ntherm=100, ndecor=10,
+                                with_tqdm=False)
+        assert abs(pos.mean().item() - 1.) < 0.2
+        assert pids != [proc.pid for proc in parallel.pool.procs]
+
+        parallel.close()
+
+    def test_parallel_state_dict(self):
+        """The state of the processes continues the chain exactly."""
+
+        def pdf(pos):
+            return torch.exp(-(pos**2).sum(1))
+
+        def parallel_sampler(seed):
+            sampler = Metropolis(nwalkers=20, nstep=20, step_size=1.,
+                                 nelec=2, ndim=3,
+                                 init={'min': -1, 'max': 1},
+                                 move={'type': 'all-elec',
+                                       'proba': 'normal'})
+            return ParallelSampler(sampler, nprocs=2, seed=seed)
+
+        parallel = parallel_sampler(0)
+        parallel.generate(pdf, ntherm=10, ndecor=5, with_tqdm=False)
+
+        with tempfile.TemporaryDirectory() as tmp:
+            fname = os.path.join(tmp, 'state.pth')
+            torch.save(parallel.state_dict(), fname)
+            state = torch.load(fname)
+
+        ref = parallel.generate(pdf, ntherm=0, ndecor=5,
+                                pos=parallel.walkers.pos, with_tqdm=False)
+        parallel.close()
+
+        parallel = parallel_sampler(1)
+        parallel.load_state_dict(state)
+        pos = parallel.generate(pdf, ntherm=0, ndecor=5,
+                                pos=parallel.walkers.pos, with_tqdm=False)
+        parallel.close()
+
+        assert torch.equal(pos, ref)
+
+    def test_parallel_caches(self):
+        """The processes clear the caches of the parameters (spline
+        tables, sparse MO weights) after an in-place update of the MOs."""
+
+        torch.manual_seed(0)
+        wf = Orbital(self.mol, kinetic='jacobi', configs='ground_state',
+                     use_jastrow=True, mo_threshold=1E-8)
+        wf.mo_scf.max_density = 1.
+        wf.use_spline_orbitals()
+
+        sampler = Metropolis(nwalkers=100, nstep=200, step_size=0.5,
+                             ndim=wf.ndim, nelec=wf.nelec,
+                             init=self.mol.domain('normal'),
+                             move={'type': 'all-elec', 'proba': 'normal'})
+        parallel = ParallelSampler(sampler, nprocs=2, seed=0)
+
+        pos = parallel.generate(wf.pdf, ntherm=100, ndecor=10,
+                                with_tqdm=False)
+        zmean = pos.view(-1, wf.nelec, 3)[..., 2].mean().item()
+        assert abs(zmean) < 0.2
+
+        # occupied MO = AO of the first atom
+        with torch.no_grad():
+            wf.mo_scf.weight[0] = torch.tensor([1., 0.])
+
+        pids = [proc.pid for proc in parallel.pool.procs]
+        pos = parallel.generate(wf.pdf, ntherm=100, ndecor=10,
+                                with_tqdm=False)
+        zmean = pos.view(-1, wf.nelec, 3)[..., 2].mean().item()
+        assert zmean < -0.4
+        assert pids == [proc.pid for proc in parallel.pool.procs]
+
+        parallel.close()
+
+    def test_single_point_stream(self):
+        """Streamed single point calculation."""
+
+        opt = optim.Adam(self.wf.parameters(), lr=0.01)
+        solver = SolverOrbital(wf=self.wf, sampler=self.samplers[0],
+                               optimizer=opt)
+
+        torch.manual_seed(0)
+        _, e, s = solver.single_point(ntherm=5, ndecor=10, prt=False,
+                                      with_tqdm=False)
+
+        torch.manual_seed(0)
+        pos, e_stream, s_stream = solver.single_point(
+            ntherm=5, ndecor=10, prt=False, with_tqdm=False, stream=True)
+
+        assert pos.shape[0] == self.samplers[0].nwalkers
+        assert torch.allclose(e, e_stream)
+        assert torch.allclose(s, s_stream)
+
+    def test_checkpoint(self):
+        """The chain of the sampler continues after a restart."""
+
+        def make_solver():
+            wf = Orbital(self.mol, kinetic='jacobi',
+                         configs='ground_state', use_jastrow=True)
+            sampler = Metropolis(nwalkers=10, nstep=20, step_size=0.5,
+                                 ndim=wf.ndim, nelec=wf.nelec,
+                                 init=self.mol.domain('normal'))
+            sampler.adaptive_step_size(target=0.5, per_walker=True)
+            opt = optim.Adam(wf.parameters(), lr=0.01)
+            solver = SolverOrbital(wf=wf, sampler=sampler, optimizer=opt)
+            solver.initial_sampling(ntherm=10, ndecor=5, resume=True)
+            return solver
+
+        torch.manual_seed(0)
+        solver = make_solver()
+        solver.single_point(ntherm=10, ndecor=5, prt=False, with_tqdm=False)
+        last = solver.sampler.walkers.pos.clone()
+
+        with tempfile.TemporaryDirectory() as tmp:
+            fname = os.path.join(tmp, 'model.pth')
+            solver.save_checkpoint(0, 0., fname)
+
+            # the chain continues from the last positions
+            ref = solver.sample(ntherm=10, ndecor=5, with_tqdm=False)
+            assert ref.shape[0] == solver.sampler.get_sampling_size(0, 5)
+            assert not torch.equal(ref[:10], last)
+
+            torch.manual_seed(1)
+            restart = make_solver()
+            epoch, _ = restart.load_checkpoint(fname)
+
+        assert epoch == 0
+        assert torch.equal(restart.sampler.walkers.pos, last)
+        assert torch.equal(restart.sampler.step_size,
+                           solver.sampler.step_size)
+
+        pos = restart.sample(ntherm=10, ndecor=5, with_tqdm=False)
+        assert torch.equal(pos, ref)
+        assert restart.sampler.acceptance.proposed == \
+            solver.sampler.acceptance.proposed
+
+
+if __name__ == "__main__":
+    unittest.main()
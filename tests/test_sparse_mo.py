@@ -0,0 +1,85 @@
+import torch
+
+from deepqmc.wavefunction.wf_orbital import Orbital
+from deepqmc.wavefunction.molecule import Molecule
+from deepqmc.wavefunction.sparse_linear import SparseLinear
+from deepqmc.wavefunction.localization import common_occupied_orbitals
+
+import unittest
+
+
+class TestSparseMO(unittest.TestCase):
+
+    def setUp(self):
+
+        torch.manual_seed(0)
+
+        # molecule
+        self.mol = Molecule(
+            atom='Li 0 0 -0.69; H 0 0 0.69',
+            unit='bohr',
+            calculator='pyscf',
+            basis='sto-3g')
+
+        self.pos = 2 * torch.rand(10, self.mol.nelec * 3)
+
+    def test_sparse_linear(self):
+        """Compare the sparse layer with the dense product."""
+
+        weight = torch.randn(30, 40)
+        weight[torch.rand(30, 40) > 0.05] = 0.
+        layer = SparseLinear(weight, max_density=1.)
+
+        x = torch.rand(5, 4, 40, requires_grad=True)
+        out = layer(x)
+        ref = x @ weight.t()
+        assert torch.allclose(out, ref, atol=1E-6)
+
+        grad = torch.autograd.grad(out.sum(), x)[0]
+        grad_ref = torch.autograd.grad(ref.sum(), x)[0]
+        assert torch.allclose(grad, grad_ref, atol=1E-6)
+
+    def test_localized_wf(self):
+        """Localizing the core orbitals must span the same space
+        and not change |psi|."""
+
+        mol = Molecule(
+            atom='N 0 0 -1.04; N 0 0 1.04',
+            unit='bohr',
+            calculator='pyscf',
+            basis='sto-3g')
+        pos = torch.rand(10, mol.nelec * 3)
+
+        wf = Orbital(mol, kinetic='jacobi',
+                     configs='single_double(2,2)',
+                     use_jastrow=True)
+
+        wf_loc = Orbital(mol, kinetic='jacobi',
+                         configs='single_double(2,2)',
+                         use_jastrow=True,
+                         localize=True, mo_threshold=1E-8)
+        wf_loc.mo_scf.max_density = 1.
+        assert isinstance(wf_loc.mo_scf, SparseLinear)
+
+        # the 1s, 2s and 2p_sigma orbitals are in all the determinants
+        index = common_occupied_orbitals(wf.configs)
+        assert len(index) > 1
+
+        mo = wf.mo_scf.weight.detach()
+        mo_loc = wf_loc.mo_scf.weight.detach()
+        assert not torch.allclose(mo[index], mo_loc[index], atol=1E-3)
+
+        # same projector on the localized space, other orbitals unchanged
+        assert torch.allclose(mo[index].t() @ mo[index],
+                              mo_loc[index].t() @ mo_loc[index], atol=1E-6)
+        other = [i for i in range(mo.shape[0]) if i not in index]
+        assert torch.allclose(mo[other], mo_loc[other])
+
+        assert torch.allclose(wf(pos).abs(), wf_loc(pos).abs(),
+                              rtol=1E-3, atol=0.)
+        assert torch.allclose(wf.local_energy(pos),
+                              wf_loc.local_energy(pos), rtol=1E-3)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,82 @@
+import torch
+
+from deepqmc.wavefunction.wf_orbital import Orbital
+from deepqmc.wavefunction.molecule import Molecule
+
+import unittest
+
+
+class TestSplineOrbitals(unittest.TestCase):
+
+    def setUp(self):
+
+        torch.manual_seed(0)
+
+        # molecule
+        self.mol = Molecule(
+            atom='Li 0 0 -0.69; H 0 0 0.69',
+            unit='bohr',
+            calculator='pyscf',
+            basis='sto-3g')
+
+        self.wf = Orbital(self.mol, kinetic='jacobi',
+                          configs='single(2,2)',
+                          use_jastrow=True)
+
+        self.pos = 4 * torch.rand(20, self.mol.nelec * 3) - 2
+
+        self.ref = self.wf._get_mo_vals(self.pos).detach()
+
+        self.wf.use_spline_orbitals(resolution=0.1)
+
+    def test_interpolation(self):
+        """Compare the interpolated MOs with the analytical ones."""
+
+        with torch.no_grad():
+            self.wf._update_spline_orbitals()
+            mo = self.wf.mo_spline(self.pos, self.wf._get_mo_points)
+
+        assert mo.shape == self.ref.shape
+        assert (mo - self.ref).abs().max() < 1E-2 * self.ref.abs().max()
+
+    def test_screening_only(self):
+        """The tables are only used by the screening density."""
+
+        psi = self.wf(self.pos).detach()
+
+        with torch.no_grad():
+            eloc = self.wf.local_energy(self.pos)
+            data = self.wf.get_ci_data(self.pos)
+            assert torch.equal(self.wf.pdf(self.pos), psi.view(-1)**2)
+            assert self.wf.mo_spline.coeffs is None
+
+            pdf = self.wf.screening_pdf()(self.pos)
+            assert self.wf.mo_spline.coeffs is not None
+            assert not torch.equal(pdf, psi.view(-1)**2)
+            assert torch.allclose(pdf, psi.view(-1)**2, rtol=5E-2)
+
+            assert torch.equal(self.wf(self.pos), psi)
+            assert torch.equal(self.wf.pdf(self.pos), psi.view(-1)**2)
+            assert torch.equal(self.wf.local_energy(self.pos), eloc)
+            assert torch.equal(self.wf.forward_from_ci_data(
+                self.wf.get_ci_data(self.pos)),
+                self.wf.forward_from_ci_data(data))
+
+    def test_update(self):
+        """The tables are rebuilt when the MOs change."""
+
+        with torch.no_grad():
+            pdf = self.wf.screening_pdf()
+            pdf(self.pos)
+            signature = self.wf.mo_spline.signature
+
+            self.wf.mo.weight.mul_(2.)
+            self.wf._update_spline_orbitals()
+            mo = self.wf.mo_spline(self.pos, self.wf._get_mo_points)
+
+        assert self.wf.mo_spline.signature != signature
+        assert (mo - 2 * self.ref).abs().max() < 1E-2 * self.ref.abs().max()
+
+
+if __name__ == "__main__":
+    unittest.main()
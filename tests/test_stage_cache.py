@@ -0,0 +1,62 @@
+import torch
+
+from deepqmc.wavefunction.wf_orbital import Orbital
+from deepqmc.wavefunction.molecule import Molecule
+
+import unittest
+
+
+class TestStageCache(unittest.TestCase):
+
+    def setUp(self):
+
+        torch.manual_seed(0)
+
+        # molecule
+        self.mol = Molecule(
+            atom='H 0 0 -0.69; H 0 0 0.69',
+            unit='bohr',
+            calculator='pyscf',
+            basis='sto-3g')
+
+        # wave function with frozen AOs
+        self.wf = Orbital(self.mol, kinetic='jacobi',
+                          configs='single(2,2)',
+                          use_jastrow=True)
+        self.wf.ao.bas_exp.requires_grad = False
+        self.wf.ao.bas_coeffs.requires_grad = False
+
+        self.data = torch.rand(20, self.mol.nelec * 3)
+        self.pos = self.data[:10]
+
+    def test_cached_values(self):
+        """Check that the cached values give the same local energy."""
+
+        eloc_ref = self.wf.local_energy(self.pos)
+        self.wf.use_stage_cache()
+
+        for _ in range(2):
+            with self.wf.stage_cache.batch(self.pos, self.data, 0,
+                                           self.wf.stage_signature()):
+                eloc = self.wf.local_energy(self.pos)
+            assert torch.allclose(eloc, eloc_ref)
+
+        assert self.wf.stage_cache.hits > 0
+
+    def test_invalidation(self):
+        """Check that the cache is cleared when the sample set changes."""
+
+        self.wf.use_stage_cache()
+        with self.wf.stage_cache.batch(self.pos, self.data, 0,
+                                       self.wf.stage_signature()):
+            self.wf.local_energy(self.pos)
+        assert len(self.wf.stage_cache.data) > 0
+
+        self.data += 0.1
+        with self.wf.stage_cache.batch(self.pos, self.data, 0,
+                                       self.wf.stage_signature()):
+            assert len(self.wf.stage_cache.data) == 0
+
+
+if __name__ == "__main__":
+    unittest.main()
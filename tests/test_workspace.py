@@ -0,0 +1,58 @@
+import torch
+
+from deepqmc.wavefunction.wf_orbital import Orbital
+from deepqmc.wavefunction.molecule import Molecule
+
+import unittest
+
+
+class TestWorkspace(unittest.TestCase):
+
+    def setUp(self):
+
+        torch.manual_seed(0)
+
+        # molecule
+        self.mol = Molecule(
+            atom='Li 0 0 -0.69; H 0 0 0.69',
+            unit='bohr',
+            calculator='pyscf',
+            basis='sto-3g')
+
+        self.wf = Orbital(self.mol, kinetic='jacobi',
+                          configs='single_double(2,2)',
+                          use_jastrow=True)
+
+        self.pos = 2 * torch.rand(10, self.mol.nelec * 3)
+
+    def test_no_grad(self):
+        """The buffers must not change the values."""
+
+        with torch.no_grad():
+            ref = self.wf(self.pos)
+            eref = self.wf.local_energy(self.pos)
+
+            self.wf.use_workspace()
+            for _ in range(3):
+                out = self.wf(self.pos)
+                eloc = self.wf.local_energy(self.pos)
+
+        assert torch.equal(out, ref)
+        assert torch.allclose(eloc, eref)
+
+        stats = self.wf.workspace.stats()
+        assert stats['reuses'] > 0
+        assert stats['allocations'] == stats['buffers']
+
+    def test_grad(self):
+        """No buffer is used when gradients are required."""
+
+        self.wf.use_workspace()
+        out = self.wf(self.pos)
+        out.sum().backward()
+
+        assert self.wf.workspace.stats()['buffers'] == 0
+
+
+if __name__ == "__main__":
+    unittest.main()